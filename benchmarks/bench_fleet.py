@@ -0,0 +1,36 @@
+"""
+Scaling of commands that go over every installed CLI.
+
+    pytest benchmarks/bench_fleet.py
+
+Each command is timed with 10, 100 and 1000 installed CLIs tracking a git
+remote. External tools are stand-ins (see conftest.py).
+"""
+import click.testing
+import pytest
+from dip import main
+
+SIZES = [10, 100, 1000]
+
+
+def invoke(*args):
+    """ Run dip command in-process and check it succeeded. """
+    result = click.testing.CliRunner().invoke(main.dip, list(args))
+    assert result.exit_code == 0, result.output
+    return result
+
+
+@pytest.mark.parametrize('size', SIZES)
+def bench_list(benchmark, fleet, size):
+    benchmark.group = 'dip list'
+    fleet(size)
+    invoke('list')
+    benchmark.pedantic(invoke, args=('list',), rounds=5)
+
+
+@pytest.mark.parametrize('size', SIZES)
+def bench_upgrade(benchmark, fleet, size):
+    benchmark.group = 'dip upgrade --all'
+    fleet(size)
+    invoke('upgrade', '--all')
+    benchmark.pedantic(invoke, args=('upgrade', '--all'), rounds=3)
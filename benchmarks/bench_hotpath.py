@@ -0,0 +1,98 @@
+"""
+Steps of `dip run`, and running an installed CLI end to end.
+
+    pytest benchmarks/bench_hotpath.py
+
+Save a run and compare later ones against it with:
+
+    pytest benchmarks --benchmark-autosave
+    pytest benchmarks --benchmark-compare
+
+External tools are stand-ins (see conftest.py), so neither network nor
+Docker daemon is needed: validation only loads the compose config.
+"""
+import os
+import subprocess
+from unittest import mock
+
+import pytest
+from dip import settings
+
+SIZES = [10, 100, 1000]
+
+
+@pytest.mark.parametrize('size', SIZES)
+def bench_settings_load(benchmark, fleet, size):
+    benchmark.group = 'settings load'
+    fleet(size)
+
+    def load():
+        with settings.load() as cfg:
+            return len(cfg)
+    assert benchmark(load) == size
+
+
+@pytest.mark.parametrize('size', SIZES)
+def bench_settings_getapp(benchmark, fleet, size):
+    benchmark.group = 'settings load (single app)'
+    fleet(size)
+
+    def load():
+        with settings.load(name='app0') as cfg:
+            return cfg['app0']
+    assert benchmark(load).name == 'app0'
+
+
+def bench_validate(benchmark, fleet):
+    benchmark.group = 'validate'
+    fleet(1)
+    with settings.load() as cfg:
+        app = cfg['app0']
+    benchmark(app.validate)
+
+
+def bench_diffs(benchmark, fleet):
+    benchmark.group = 'diffs'
+    fleet(1)
+    with settings.load() as cfg:
+        app = cfg['app0']
+    assert benchmark(lambda: list(app.repo.diffs(quiet=True))) == [0]
+
+
+def bench_command(benchmark, fleet):
+    benchmark.group = 'command'
+    fleet(1)
+    with settings.load() as cfg:
+        app = cfg['app0']
+    with mock.patch('dip.utils.notty', return_value=True):
+        assert benchmark(app.backend.command)[-1] == 'app0'
+
+
+@pytest.fixture
+def installed(home, repos):
+    """ Install an untracked CLI and return the path to its executable. """
+    with settings.saveonexit() as cfg:
+        app = cfg.install('app0', os.path.join(repos(1), 'app0'))
+        app.compile()
+    return os.path.join(settings.PATH, 'app0')
+
+
+def bench_shim_plan(benchmark, installed):
+    benchmark.group = 'end to end'
+    assert subprocess.call([installed]) == 0
+    benchmark.pedantic(subprocess.call, args=([installed],), rounds=20)
+
+
+def bench_shim_dip_run(benchmark, installed):
+    benchmark.group = 'end to end'
+    cmd = ['dip', 'run', 'app0']
+    assert subprocess.call(cmd) == 0
+    benchmark.pedantic(subprocess.call, args=(cmd,), rounds=20)
+
+
+def bench_shim_dip_run_tracked(benchmark, fleet):
+    benchmark.group = 'end to end'
+    fleet(1)
+    cmd = ['dip', 'run', 'app0']
+    assert subprocess.call(cmd) == 0
+    benchmark.pedantic(subprocess.call, args=(cmd,), rounds=20)
@@ -0,0 +1,57 @@
+"""
+Per-invocation overhead of each container runner.
+
+    pytest benchmarks/bench_runners.py
+
+Runs of the `noop` service need a reachable Docker daemon and are skipped
+for runners whose executable is not available.
+"""
+import os
+import shutil
+import subprocess
+import sys
+from unittest import mock
+
+import pytest
+from dip import runners
+from dip import settings
+
+NOOP = os.path.join(os.path.dirname(__file__), 'noop')
+
+AVAILABLE = {
+    'compose': ['docker-compose', 'version'],
+    'compose-v2': ['docker', 'compose', 'version'],
+    'docker': ['docker', 'version'],
+    'pool': ['docker', 'version'],
+    'service': ['docker-compose', 'version'],
+}
+
+
+def available(name):
+    """ Check whether a runner and the Docker daemon work here. """
+    for cmd in [['docker', 'info'], AVAILABLE[name]]:
+        if not shutil.which(cmd[0]) or subprocess.call(
+                cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL):
+            return False
+    return True
+
+
+@pytest.mark.parametrize('name', sorted(runners.RUNNERS))
+def bench_command(benchmark, name):
+    benchmark.group = 'runner command'
+    app = settings.Dip('noop', NOOP, runner=name)
+    with mock.patch('dip.utils.notty', return_value=True):
+        benchmark(app.backend.command)
+
+
+@pytest.mark.parametrize('name', sorted(runners.RUNNERS))
+def bench_run(benchmark, name):
+    if not available(name):
+        pytest.skip('{} runner is not available'.format(name))
+    benchmark.group = 'runner invocation'
+    app = settings.Dip('noop', NOOP, runner=name)
+    with open(os.devnull, 'r+') as null:
+        with mock.patch.multiple(sys, stdin=null, stdout=null, stderr=null):
+            with mock.patch('dip.utils.notty', return_value=True):
+                assert app.run() == 0
+                benchmark.pedantic(app.run, rounds=10)
@@ -0,0 +1,138 @@
+"""
+Fixtures shared by benchmarks.
+
+External tools are replaced by stand-in executables so that timings only
+depend on dip itself: `docker-compose` and `docker` exit at once, `git`
+skips commands that talk to remotes and `dip` runs this tree with the
+current interpreter.
+"""
+import os
+import shutil
+import subprocess
+import sys
+import textwrap
+
+import pytest
+from dip import settings
+from dip import storage
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GIT = shutil.which('git')
+
+STUBS = {
+    'docker': '#!/bin/sh\nexit 0\n',
+    'docker-compose': '#!/bin/sh\nexit 0\n',
+    'git': textwrap.dedent('''\
+        #!/bin/sh
+        case "$1" in
+          fetch|ls-remote|pull) exit 0 ;;
+        esac
+        exec {git} "$@"
+    '''),
+    'dip': '#!/bin/sh\nexec {python} -m dip.main "$@"\n',
+}
+
+COMPOSE = textwrap.dedent('''\
+    version: '3'
+    services:
+      {name}:
+        image: alpine
+        command: "true"
+''')
+
+
+def pytest_configure(config):
+    """ Collect bench_* modules and functions. """
+    config.addinivalue_line('python_files', 'bench_*.py')
+    config.addinivalue_line('python_functions', 'bench_*')
+
+
+def git(cwd, *args):
+    """ Run real git quietly. """
+    subprocess.run([GIT] + list(args),
+                   cwd=cwd,
+                   check=True,
+                   stdout=subprocess.DEVNULL,
+                   stderr=subprocess.DEVNULL)
+
+
+@pytest.fixture(scope='session')
+def repos(tmp_path_factory):
+    """ Get factory of git repos with one app per directory.
+
+        Each repo has N directories (app0, app1, ...) with a compose file
+        defining a service of the same name, and an origin remote whose
+        master branch matches the working tree.
+    """
+    cache = {}
+
+    def make(size):
+        if size not in cache:
+            root = str(tmp_path_factory.mktemp('repo{}'.format(size)))
+            work = os.path.join(root, 'work')
+            for i in range(size):
+                name = 'app{}'.format(i)
+                os.makedirs(os.path.join(work, name))
+                with open(os.path.join(work, name,
+                                       'docker-compose.yml'), 'w') as yml:
+                    yml.write(COMPOSE.format(name=name))
+            git(work, 'init', '-q')
+            git(work, 'checkout', '-q', '-b', 'master')
+            git(work, 'add', '.')
+            git(work, '-c', 'user.name=dip', '-c', 'user.email=dip@dip',
+                'commit', '-q', '-m', 'apps')
+            git(root, 'clone', '-q', '--bare', work, 'origin.git')
+            git(work, 'remote', 'add', 'origin',
+                os.path.join(root, 'origin.git'))
+            git(work, 'fetch', '-q', 'origin')
+            cache[size] = work
+        return cache[size]
+    return make
+
+
+@pytest.fixture
+def stubs(tmpdir, monkeypatch):
+    """ Put stand-in executables first on PATH and return their dir. """
+    bindir = tmpdir.mkdir('stubs')
+    for name, script in STUBS.items():
+        exe = bindir.join(name)
+        exe.write(script.format(git=GIT,
+                                python=sys.executable))
+        exe.chmod(0o755)
+    monkeypatch.setenv('PATH', os.pathsep.join([str(bindir),
+                                                os.environ['PATH']]))
+    monkeypatch.setenv('PYTHONPATH', ROOT)
+    return str(bindir)
+
+
+@pytest.fixture
+def home(tmpdir, monkeypatch, stubs):
+    """ Use an empty DIP_HOME with executables installed to a bin dir. """
+    dip_home = tmpdir.mkdir('diphome')
+    bindir = tmpdir.mkdir('bin')
+    monkeypatch.setenv('DIP_HOME', str(dip_home))
+    monkeypatch.setenv('DIP_PATH', str(bindir))
+    monkeypatch.setattr(settings, 'HOME', str(dip_home))
+    monkeypatch.setattr(settings, 'PATH', str(bindir))
+    return str(dip_home)
+
+
+@pytest.fixture
+def fleet(home, repos):
+    """ Get factory installing N apps tracking origin/master.
+
+        Only settings are written (as with `dip install --no-exe`).
+    """
+    def make(size, **options):
+        work = repos(size)
+        data = {}
+        for i in range(size):
+            name = 'app{}'.format(i)
+            app = settings.Dip(name, os.path.join(work, name),
+                               git=dict({'remote': 'origin',
+                                         'branch': 'master'}, **options))
+            data[name] = dict(app)
+        store = storage.get(storage.filepath(home, settings.STORAGE))
+        store.write(data)
+        return data
+    return make
@@ -1,11 +1,27 @@
 """
 dip CLI tool.
 """
-import pkg_resources
-
 from dip.settings import Dip  # noqa: F401
 
 try:
-    __version__ = pkg_resources.get_distribution(__package__).version
-except pkg_resources.DistributionNotFound:  # pragma: no cover
-    __version__ = '0.0.0'                   # pragma: no cover
+    from importlib import metadata
+except ImportError:  # pragma: no cover
+    metadata = None  # pragma: no cover
+
+
+def _version():
+    """ Get installed package version without importing pkg_resources. """
+    # pylint: disable=import-outside-toplevel
+    if metadata is not None:
+        try:
+            return metadata.version(__package__)
+        except metadata.PackageNotFoundError:  # pragma: no cover
+            return '0.0.0'                      # pragma: no cover
+    import pkg_resources                        # pragma: no cover
+    try:                                        # pragma: no cover
+        return pkg_resources.get_distribution(__package__).version
+    except pkg_resources.DistributionNotFound:  # pragma: no cover
+        return '0.0.0'                          # pragma: no cover
+
+
+__version__ = _version()
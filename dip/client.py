@@ -0,0 +1,63 @@
+"""
+Thin client running apps through the dip daemon.
+
+Usage: dip-client SOCKET NAME [ARGS...]
+
+Falls back to `dip run` when the daemon is not up, or when stdin is a
+terminal (the daemon's children are not in the terminal's foreground
+process group and so cannot read from it).
+"""
+import os
+import signal
+import socket
+import sys
+
+from dip import daemon
+
+SIGNALS = [signal.SIGINT, signal.SIGTERM, signal.SIGHUP, signal.SIGQUIT]
+
+
+def connect(path):
+    """ Connect to daemon socket, or return None if it is not up. """
+    if os.isatty(0):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except (OSError, IOError):
+        sock.close()
+        return None
+    return sock
+
+
+def forward(pid):
+    """ Forward signals received by the client to the child running app. """
+    def handler(signum, _):
+        try:
+            os.kill(pid, signum)
+        except (OSError, IOError):
+            pass
+    for signum in SIGNALS:
+        signal.signal(signum, handler)
+
+
+def main(argv=None):
+    """ Run app through daemon at SOCKET, or with `dip run`. """
+    path, name, *args = sys.argv[1:] if argv is None else argv
+    argv = ['run', name, '--'] + args
+    sock = connect(path)
+    if sock is None:
+        os.execvp('dip', ['dip'] + argv)
+    with sock:
+        try:
+            daemon.send(sock,
+                        {'argv': argv,
+                         'cwd': os.getcwd(),
+                         'env': dict(os.environ)},
+                        daemon.STDIO)
+            forward(daemon.recv(sock)[0]['pid'])
+            code = daemon.recv(sock)[0]['code']
+        except (OSError, IOError, KeyError, ValueError) as err:
+            sys.stderr.write('dip-client: {}\n'.format(err))
+            code = 1
+    sys.exit(code if code >= 0 else 128 - code)
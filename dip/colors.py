@@ -1,29 +1,33 @@
 """
 Terminal colors.
 """
-import colored
+AMBER = 'yellow'
+BLUE = 'blue'
+RED = 'red'
+TEAL = 'spring_green_1'
 
-AMBER = colored.fg('yellow')
-BLUE = colored.fg('blue')
-RED = colored.fg('red')
-TEAL = colored.fg('spring_green_1')
+
+def stylize(text, color):
+    """ Shortcut for colored.stylize() with a foreground color. """
+    import colored  # pylint: disable=import-outside-toplevel
+    return colored.stylize(text, colored.fg(color))
 
 
 def amber(text):
     """ Shortcut for colored.stylize(). """
-    return colored.stylize(text, AMBER)
+    return stylize(text, AMBER)
 
 
 def blue(text):
     """ Shortcut for colored.stylize(). """
-    return colored.stylize(text, BLUE)
+    return stylize(text, BLUE)
 
 
 def red(text):
     """ Shortcut for colored.stylize(). """
-    return colored.stylize(text, RED)
+    return stylize(text, RED)
 
 
 def teal(text):
     """ Shortcut for colored.stylize(). """
-    return colored.stylize(text, TEAL)
+    return stylize(text, TEAL)
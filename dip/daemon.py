@@ -0,0 +1,222 @@
+"""
+Warm dip server executing runs over a unix socket.
+
+The server imports dip's heavy dependencies once and forks a child for
+every request. The child takes over the client's stdio file descriptors,
+ENV and working directory and runs the requested dip command, which
+replaces it with the container runner. The server reports the child's
+pid (so the client can forward signals) and, without waiting on it,
+reaps it on SIGCHLD to report its exit code. So the only process left per
+run is the container runner itself.
+
+Between requests the server keeps the settings, the parsed compose config
+and dotenv file and the git repo of every installed app in its caches (see
+dip.settings),
+each keyed by a fingerprint of the files it came from. Children inherit
+them and only redo the work for what changed since.
+"""
+import array
+import json
+import os
+import signal
+import socket
+import socketserver
+import struct
+import time
+
+# pylint: disable=import-outside-toplevel
+
+HEADER = struct.Struct('!I')
+STDIO = [0, 1, 2]
+
+# Seconds between refreshes of the server's caches
+PRIME = 1.0
+
+
+def address(home):
+    """ Get path to daemon socket. """
+    return os.path.join(home, 'dip.sock')
+
+
+def warm():
+    """ Import heavy dependencies so forked children start warm. """
+    # pylint: disable=unused-import
+    import colored  # noqa: F401
+    import compose.cli.command  # noqa: F401
+    import compose.config  # noqa: F401
+    import docker  # noqa: F401
+    import dotenv  # noqa: F401
+    import git  # noqa: F401
+    from dip import main  # noqa: F401
+
+
+def prime():
+    """ Fill caches of this process for every installed app.
+
+        Errors are left for the runs of the apps to report.
+    """
+    from dip import errors
+    from dip import settings
+    try:
+        with settings.load() as cfg:
+            apps = list(cfg.values())
+    except errors.DipError:
+        return
+    for app in apps:
+        try:
+            assert app.config
+            app.defaults()
+            if app.repo:
+                assert app.repo.repo
+        except Exception:  # pylint: disable=broad-except
+            pass
+
+
+def send(sock, message, fds=None):
+    """ Send length-prefixed JSON message, optionally with file descriptors.
+    """
+    data = json.dumps(message).encode('utf8')
+    data = HEADER.pack(len(data)) + data
+    if fds:
+        anc = [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array.array('i', fds))]
+        sent = sock.sendmsg([data], anc)
+        data = data[sent:]
+    sock.sendall(data)
+
+
+def recv(sock, maxfds=0):
+    """ Receive length-prefixed JSON message and any file descriptors. """
+    fds = array.array('i')
+    size = socket.CMSG_SPACE(maxfds * fds.itemsize) if maxfds else 0
+    data, ancdata, _, _ = sock.recvmsg(HEADER.size, size)
+    for level, kind, cmsg in ancdata:
+        if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+            fds.frombytes(cmsg[:len(cmsg) - (len(cmsg) % fds.itemsize)])
+    while data and len(data) < HEADER.size:
+        data += sock.recv(HEADER.size - len(data))
+    if len(data) < HEADER.size:
+        raise ConnectionError('Connection closed')
+    length, = HEADER.unpack(data)
+    data = b''
+    while len(data) < length:
+        chunk = sock.recv(length - len(data))
+        if not chunk:
+            raise ConnectionError('Connection closed')
+        data += chunk
+    return json.loads(data.decode('utf8')), list(fds)
+
+
+def exitcode(status):
+    """ Convert wait status to exit code. """
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def execute(request, fds):
+    """ Run dip command for request in a forked child and exit. """
+    code = 1
+    try:
+        for target, fd in zip(STDIO, fds):
+            os.dup2(fd, target)
+        for fd in fds:
+            os.close(fd)
+        os.chdir(request['cwd'])
+        os.environ.clear()
+        os.environ.update(request['env'])
+
+        # Settings read from ENV at import time follow the client
+        from dip import main
+        from dip import settings
+        from dip import trace
+        settings.PATH = os.getenv('DIP_PATH') or '/usr/local/bin'
+        settings.RUNNER = os.getenv('DIP_RUNNER') or 'compose'
+        settings.STORAGE = os.getenv('DIP_STORAGE') or 'json'
+        trace.reset()
+        main.dip(request['argv'], prog_name='dip')
+    except SystemExit as exc:
+        code = exc.code if isinstance(exc.code, int) else int(bool(exc.code))
+    finally:
+        os._exit(code)  # pylint: disable=protected-access
+
+
+class Handler(socketserver.BaseRequestHandler):
+    """ Start a single run request; the server reports its exit code. """
+    def handle(self):
+        request, fds = recv(self.request, len(STDIO))
+
+        # The run must be registered before it can be reaped
+        signal.pthread_sigmask(signal.SIG_BLOCK, [signal.SIGCHLD])
+        try:
+            pid = os.fork()
+            if pid == 0:  # pragma: no cover
+                signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                signal.pthread_sigmask(signal.SIG_UNBLOCK, [signal.SIGCHLD])
+                execute(request, fds)
+            for fd in fds:
+                os.close(fd)
+            self.server.runs[pid] = self.request
+            send(self.request, {'pid': pid})
+        finally:
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, [signal.SIGCHLD])
+
+
+class Server(socketserver.UnixStreamServer):
+    """ Unix socket server forking runs and keeping its caches warm.
+
+        Connections stay open until their run exits, and runs are reaped
+        without blocking (see reap) so that any number can run at once.
+    """
+    primed = None
+
+    def __init__(self, *args, **kwargs):
+        self.runs = {}
+        super(Server, self).__init__(*args, **kwargs)
+
+    def reap(self, *_):
+        """ Report exit codes of finished runs and close their connections.
+        """
+        for pid in list(self.runs):
+            try:
+                done, status = os.waitpid(pid, os.WNOHANG)
+            except ChildProcessError:
+                done, status = pid, None
+            conn = self.runs.pop(pid, None) if done else None
+            if conn is None:
+                continue
+            try:
+                if status is not None:
+                    send(conn, {'code': exitcode(status)})
+            except (OSError, IOError):
+                pass
+            super(Server, self).shutdown_request(conn)
+
+    def shutdown_request(self, request):
+        # Connections of runs are closed once they are reaped
+        if request not in self.runs.values():
+            super(Server, self).shutdown_request(request)
+
+    def service_actions(self):
+        super(Server, self).service_actions()
+        now = time.monotonic()
+        if self.primed is None or now - self.primed >= PRIME:
+            prime()
+            self.primed = time.monotonic()
+
+
+def serve(home):
+    """ Serve requests on the daemon socket until interrupted. """
+    path = address(home)
+    warm()
+    try:
+        os.remove(path)
+    except (OSError, IOError):
+        pass
+    server = Server(path, Handler)
+    signal.signal(signal.SIGCHLD, server.reap)
+    os.chmod(path, 0o600)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.remove(path)
@@ -14,6 +14,14 @@ class SettingsError(DipError):
             "Unable to access dip settings at '{path}'".format(path=path))
 
 
+class ManifestError(DipError):
+    """ Invalid manifest of apps. """
+    def __init__(self, path, reason):
+        super(ManifestError, self).__init__(
+            "Invalid manifest '{path}': {reason}".format(path=path,
+                                                         reason=reason))
+
+
 class NotInstalledError(DipError):
     """ CLI not installed. """
     def __init__(self, name):
@@ -35,6 +43,13 @@ class NoSuchPathError(DipError):
             "Path does not exist '{path}'".format(path=path))
 
 
+class ContainerError(DipError):
+    """ Error starting container. """
+    def __init__(self, name):
+        super(ContainerError, self).__init__(
+            "Unable to start container '{name}'".format(name=name))
+
+
 class GitFetchError(DipError):
     """ Error fetching remote. """
     def __init__(self, remote):
@@ -42,6 +57,21 @@ class GitFetchError(DipError):
             "Error fetching remote '{remote}'".format(remote=remote))
 
 
+class GitFetchTimeout(GitFetchError):
+    """ Fetching remote took longer than allowed. """
+    def __init__(self, remote, timeout):
+        DipError.__init__(
+            self, "Timed out fetching remote '{remote}' after {timeout}s"
+            .format(remote=remote, timeout=timeout))
+
+
+class GitPullError(DipError):
+    """ Error pulling from remote. """
+    def __init__(self, remote):
+        super(GitPullError, self).__init__(
+            "Error pulling remote '{remote}'".format(remote=remote))
+
+
 class InvalidGitRepositoryError(DipError):
     """ Invalid git repository directory. """
     def __init__(self, path):
@@ -62,3 +92,33 @@ class NoSuchService(DipError):
         super(NoSuchService, self).__init__(
             "No service named '{name}' found in compose file"
             .format(name=name))
+
+
+class NoSuchRunnerError(DipError):
+    """ No such container runner. """
+    def __init__(self, name):
+        super(NoSuchRunnerError, self).__init__(
+            "No runner named '{name}'".format(name=name))
+
+
+class NoSuchRunnerOptionError(DipError):
+    """ Option not supported by container runner. """
+    def __init__(self, runner, key):
+        super(NoSuchRunnerOptionError, self).__init__(
+            "Runner '{runner}' has no option '{key}'".format(
+                runner=runner, key=key))
+
+
+class UnsupportedServiceError(DipError):
+    """ Service uses keys the container runner cannot apply. """
+    def __init__(self, runner, name, keys):
+        super(UnsupportedServiceError, self).__init__(
+            "Runner '{runner}' does not support '{keys}' of service '{name}'"
+            .format(runner=runner, keys="', '".join(keys), name=name))
+
+
+class NoSuchStorageError(DipError):
+    """ No such settings storage. """
+    def __init__(self, name):
+        super(NoSuchStorageError, self).__init__(
+            "No settings storage named '{name}'".format(name=name))
@@ -0,0 +1,71 @@
+"""
+Concurrent operations across many apps.
+"""
+import collections
+import threading
+import time
+from concurrent import futures
+
+JOBS = 8
+
+Outcome = collections.namedtuple('Outcome', 'item result error elapsed')
+
+
+def imap(func, items, jobs=JOBS):
+    """ Yield func(item) for each item, in order, running up to jobs at once.
+
+        Results are yielded as soon as they and all results before them are
+        ready, so callers can stream output. func is expected to handle its
+        own errors; an exception is raised when its result is reached.
+    """
+    items = list(items)
+    if not items:
+        return
+    workers = max(1, min(jobs, len(items)))
+    with futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        for future in [pool.submit(func, x) for x in items]:
+            yield future.result()
+
+
+def each(func, items, jobs=JOBS):
+    """ Yield an Outcome of func(item) for each item, in order.
+
+        Errors raised by func are recorded in the outcome instead of being
+        raised, along with the seconds it took.
+    """
+    def timed(item):
+        start = time.perf_counter()
+        try:
+            result, error = func(item), None
+        except Exception as err:  # pylint: disable=broad-except
+            result, error = None, err
+        return Outcome(item, result, error, time.perf_counter() - start)
+    return imap(timed, items, jobs)
+
+
+class Once:
+    """ Run functions once per key across threads and share the outcome.
+
+        Calls with the same key get the result of the first (or have its
+        error raised) instead of running again. Calls in the same group run
+        one at a time; the group is the key by default.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.groups = {}
+        self.outcomes = {}
+
+    def __call__(self, key, func, group=None):
+        with self.lock:
+            lock = self.groups.setdefault(key if group is None else group,
+                                          threading.Lock())
+        with lock:
+            if key not in self.outcomes:
+                try:
+                    self.outcomes[key] = (func(), None)
+                except Exception as err:  # pylint: disable=broad-except
+                    self.outcomes[key] = (None, err)
+        result, error = self.outcomes[key]
+        if error is not None:
+            raise error
+        return result
@@ -0,0 +1,65 @@
+"""
+Cross-process single-flight calls.
+"""
+import json
+import time
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None     # pragma: no cover
+
+
+def call(lockpath, func):
+    """ Call func unless another process completes it while we wait.
+
+        The first caller takes an exclusive lock on lockpath and runs func.
+        Callers that were already waiting on the lock when it finished skip
+        the call and reuse its outcome, recorded in the lock file.
+
+        Returns the recorded outcome, a dict with the completion time, the
+        error message of the call (None if it succeeded) and the class name
+        of its error. Outcomes reused from another caller have shared set.
+        Exceptions raised by func are only propagated to the caller that
+        ran it.
+    """
+    start = time.time()
+    try:
+        lock = open(lockpath, 'a+')
+    except (OSError, IOError):
+        lock = None
+    if lock is None or fcntl is None:
+        return record(func)
+    with lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            lock.seek(0)
+            try:
+                last = json.loads(lock.read())
+                if last['time'] >= start:
+                    return dict(last, shared=True)
+            except (KeyError, TypeError, ValueError):
+                pass
+            outcome = {'time': None, 'error': None}
+            try:
+                return record(func, outcome)
+            finally:
+                lock.seek(0)
+                lock.truncate()
+                lock.write(json.dumps(outcome))
+                lock.flush()
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def record(func, outcome=None):
+    """ Call func and record its outcome. """
+    outcome = {'time': None, 'error': None} if outcome is None else outcome
+    try:
+        func()
+    except Exception as err:
+        outcome['error'] = str(err) or err.__class__.__name__
+        outcome['kind'] = err.__class__.__name__
+        raise
+    finally:
+        outcome['time'] = time.time()
+    return outcome
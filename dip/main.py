@@ -1,17 +1,34 @@
 """
 dip CLI tool main entrypoint
 """
+import collections
+import contextlib
 import json
+import os
 import subprocess
+import sys
+import tempfile
+import time
 
 import click
-import docker
 from dip import __version__
 from dip import colors
+from dip import daemon
 from dip import errors
+from dip import fleet
+from dip import manifest
 from dip import options
+from dip import plans
+from dip import runners
 from dip import settings
+from dip import state
+from dip import sync
+from dip import trace
 from dip import utils
+from dip import warm
+
+# The `import` span of traced runs ends here
+trace.ready()
 
 
 def clickerr(func):
@@ -76,19 +93,338 @@ def warnupgrade(app):
     app.repo.pull()
 
 
+def warnstale(app):
+    """ Warn that app was checked against its remote as last fetched. """
+    warn = '\n{stale}\nContinuing with the remote as last fetched.'\
+        .format(stale=app.stale)
+    click.echo(colors.amber(warn), err=True)
+
+
+def echosync(app, diff, err):
+    """ Echo result of syncing an app with its remote. """
+    name = colors.teal(app.name)
+    if err is not None:
+        status = colors.red('[error] {}'.format(err))
+    elif diff:
+        status = colors.amber('[diverged]')
+    else:
+        status = '[up to date]'
+    if err is None and app.stale:
+        status += colors.amber(' [stale]')
+    click.echo("{name} {remote} {status}".format(name=name,
+                                                 remote=app.tracking,
+                                                 status=status))
+
+
+@contextlib.contextmanager
+def quietly():
+    """ Send stdio of runs to a temporary file instead of the terminal. """
+    with open(os.devnull) as null, tempfile.TemporaryFile('w+') as out:
+        stdio = sys.stdin, sys.stdout, sys.stderr
+        sys.stdin, sys.stdout, sys.stderr = null, out, out
+        try:
+            yield out
+        finally:
+            sys.stdin, sys.stdout, sys.stderr = stdio
+
+
+def benchrun(name, args, quick=False, runner=None):
+    """ Run app once with `dip run` in a new process.
+
+        Returns the exit code, elapsed seconds (interpreter start and
+        imports included) and seconds spent in the container.
+    """
+    cmd = [sys.executable, '-m', 'dip.main', 'run', '--no-exec']
+    if quick:
+        cmd.append('--quick')
+    if runner:
+        cmd += ['--runner', runner]
+    cmd += [name, '--'] + list(args)
+    with tempfile.TemporaryDirectory() as tmp:
+        spans = os.path.join(tmp, 'trace.jsonl')
+        start = time.perf_counter()
+        with quietly() as out:
+            code = subprocess.call(cmd,
+                                   env=dict(os.environ, DIP_TRACE=spans),
+                                   stdin=subprocess.DEVNULL,
+                                   stdout=out,
+                                   stderr=out)
+        elapsed = time.perf_counter() - start
+        try:
+            with open(spans) as stream:
+                records = [json.loads(x) for x in stream]
+        except (OSError, IOError, ValueError):
+            records = []
+    container = sum(x['ms'] for x in records if x['span'] == 'container')
+    return code, elapsed, container / 1000
+
+
+def benchexe(exe, args):
+    """ Run app once through its executable.
+
+        Returns the exit code, elapsed seconds and None (the time spent in
+        the container is not known).
+    """
+    start = time.perf_counter()
+    with quietly() as out:
+        code = subprocess.call([exe] + list(args),
+                               stdin=subprocess.DEVNULL,
+                               stdout=out,
+                               stderr=out)
+    return code, time.perf_counter() - start, None
+
+
+def benchrow(runs):
+    """ Summarize runs, the first of which is cold, as milliseconds. """
+    def msec(seconds):
+        return '-' if seconds is None else '{:.1f}ms'.format(seconds * 1000)
+    warm = runs[1:]
+    elapsed = [x[1] for x in warm]
+    inner = [x[2] for x in warm if x[2] is not None]
+    overhead = [x[1] - x[2] for x in warm if x[2] is not None]
+    return [msec(runs[0][1]),
+            msec(utils.percentile(elapsed, 50)),
+            msec(utils.percentile(elapsed, 95)),
+            msec(utils.percentile(elapsed, 99)),
+            msec(utils.percentile(overhead, 50)),
+            msec(utils.percentile(inner, 50)),
+            str(sum(bool(x[0]) for x in runs))]
+
+
+def tracks(app):
+    """ Get key of git lookups shared by apps in the same home. """
+    return app.home, app.git.get('remote'), app.git.get('branch')
+
+
+def trackingname(app):
+    """ Get remote/branch tracked by app, or None on git errors. """
+    try:
+        return "{remote}/{branch}".format(remote=app.repo.remotename,
+                                          branch=app.repo.branch)
+    except Exception:  # pylint:  disable=broad-except
+        return None
+
+
+def checkstatus(app, now=None):
+    """ Get status of app from its last recorded remote check. """
+    with state.load(app.name, settings.HOME) as app_state:
+        check = app_state.lastcheck(app.tracking)
+    if check is None:
+        return '[unchecked]'
+    now = time.time() if now is None else now
+    try:
+        age = now - check['time']
+        status = colors.amber('[diverged]') if check['diff'] \
+            else '[up to date]'
+    except (KeyError, TypeError):
+        return '[unchecked]'
+    ago = "{} ago".format(utils.since(age))
+    if not app.check_interval or age >= app.check_interval:
+        ago = colors.amber(ago)
+    return "{status} {ago}".format(status=status, ago=ago)
+
+
+def selectapps(names, everything=False):
+    """ Get installed apps by name, or all of them. """
+    if not names and not everything:
+        raise click.UsageError('Missing argument "NAMES..." or "--all"')
+    with settings.load() as cfg:
+        try:
+            return [cfg[x] for x in (sorted(cfg) if everything else names)]
+        except KeyError as err:
+            raise errors.NotInstalledError(err.args[0])
+
+
+def fanout(func, names, everything=False, jobs=fleet.JOBS):
+    """ Run func for installed apps concurrently and echo its outcomes.
+
+        Settings are loaded once.
+    """
+    return echoeach(func, selectapps(names, everything), jobs)
+
+
+def echoeach(func, apps, jobs=fleet.JOBS):
+    """ Run func for apps concurrently and echo its outcomes.
+
+        A row with the status returned by func (or the error it raised) and
+        its timing is echoed for each app as soon as it is ready, followed
+        by a summary.
+    """
+    if not apps:
+        return []
+    start = time.perf_counter()
+    maxname = max(len(x.name) for x in apps)
+    outcomes = []
+    for outcome in fleet.each(func, apps, jobs):
+        outcomes.append(outcome)
+        if outcome.error is not None:
+            status = colors.red('[error] {}'.format(outcome.error))
+        elif outcome.result == 'diverged':
+            status = colors.amber('[diverged]')
+        else:
+            status = '[{}]'.format(outcome.result)
+        click.echo("{name} {status} {elapsed:.2f}s".format(
+            name=colors.teal(outcome.item.name.ljust(maxname)),
+            status=status,
+            elapsed=outcome.elapsed))
+    counts = collections.Counter('error' if x.error else x.result
+                                 for x in outcomes)
+    click.echo("\n{total} apps in {elapsed:.2f}s: {counts}".format(
+        total=len(outcomes),
+        elapsed=time.perf_counter() - start,
+        counts=', '.join('{} {}'.format(counts[x], x)
+                         for x in sorted(counts))))
+    return outcomes
+
+
+def installone(app, exe=True):
+    """ Validate app and write its executable and run plan. """
+    app.validate()
+    if exe:
+        app.install()
+    app.compile()
+    return 'installed'
+
+
+def diffone(app):
+    """ Check app remote. """
+    app.validate()
+    diff = app.diff(quiet=True)
+    if diff is None:
+        return 'not tracked'
+    status = 'diverged' if diff else 'up to date'
+    return status + ' (stale)' if app.stale else status
+
+
+def pullone(app):
+    """ Pull app image. """
+    app.validate()
+    app.service.pull(silent=True)
+    return 'pulled'
+
+
+def upgradeone(app, pulls=None):
+    """ Pull app from its remote.
+
+        Concurrent pulls of one working tree collide on its git locks, so
+        with pulls (a fleet.Once) each working tree is pulled once per
+        remote and branch, one pull at a time, and the apps sharing it
+        report that pull.
+    """
+    app.validate()
+    repo = app.repo
+    status = 'not tracked'
+    if repo:
+        def pull():
+            return repo.pull(quiet=True)
+        root = settings.gitroot(app.home) or app.home
+        if pulls is None:
+            code = pull()
+        else:
+            code = pulls((root,) + tracks(app)[1:], pull, root)
+        if code:
+            raise errors.GitPullError(repo.remotename)
+        status = 'upgraded'
+    app.compile()
+    return status
+
+
+def fillone(app):
+    """ Fill app standby pool. """
+    app.validate()
+    if not isinstance(app.backend, runners.Pool):
+        return 'no pool'
+    return '{} created'.format(app.backend.fill())
+
+
+def stopone(app):
+    """ Stop app service container. """
+    return 'stopped' if app.backend.stop() else 'not running'
+
+
+def warmone(app, jobs=fleet.JOBS):
+    """ Pull app images, echoing progress as layers complete. """
+    def echoprogress(progress):
+        click.echo("{name} {progress}".format(name=colors.teal(app.name),
+                                              progress=progress))
+    app.validate()
+    warm.warm(app, echoprogress, jobs)
+    return 'warm'
+
+
 @click.group(context_settings={'help_option_names': ['-h', '--help']})
 @click.version_option(__version__, '-v', '--version')
-def dip():
+@options.TRACE
+def dip(trace_):
     """ Install CLIs using docker-compose.
 
         The following ENV variables are supported by `dip`:
 
         \b
+        :DIP_FETCH_TIMEOUT: Default seconds to wait for a fetch (none)
         :DIP_HOME: The location of the dip settings.json file
         :DIP_PATH: The default location of installed executables
+        :DIP_RUNNER: The default container runner (compose, compose-v2,
+                     docker, pool, service)
+        :DIP_STORAGE: The settings storage (json, sqlite)
+        :DIP_TRACE: Write timed spans of each run to stderr (1) or append
+                    them to a JSON-lines file (path)
 
         See https://github.com/amancevice/dip for more information.
     """
+    if trace_:
+        trace.enable()
+    trace.emit('import', trace.START, trace.READY)
+
+
+@dip.command('bench')
+@options.NAME
+@options.RUNS
+@options.MODES
+@options.RUNNERS
+@options.ARGS
+@clickerr
+def dip_bench(name, runs, modes, runners, args):
+    """ Time runs of CLI to compare wrapper overhead and configurations.
+
+        Each configuration (mode and runner) runs the CLI the given number
+        of times. The first, cold, run is reported apart from the
+        percentiles of the warm ones. Overhead is the time spent outside
+        the container.
+
+        Modes are `quick` (`dip run --quick`), `full` (`dip run`, checking
+        the remote) and `exe` (through the installed executable, with its
+        fast path and the warm daemon when they apply). Every run is a new
+        process, so timings include starting Python and imports. Output of
+        the runs is discarded.
+
+        \b
+        dip bench fizz -- --help             # quick and full, 10 runs each
+        dip bench fizz -n 50 -m quick -R compose -R service -- --help
+    """
+    with settings.getapp(name, skipgit=True) as app:
+        default = app.backend.name
+        exe = os.path.join(app.path, app.name)
+    if 'exe' in modes and not os.path.exists(exe):
+        raise click.UsageError("No executable at {}".format(exe))
+    header = ['RUNNER', 'MODE', 'COLD', 'P50', 'P95', 'P99',
+              'OVERHEAD', 'CONTAINER', 'ERRORS']
+    rows = []
+    for mode in modes:
+        for runner in [default] if mode == 'exe' else runners or [default]:
+            if mode == 'exe':
+                results = [benchexe(exe, args) for _ in range(runs)]
+            else:
+                results = [benchrun(name, args, mode == 'quick', runner)
+                           for _ in range(runs)]
+            rows.append([runner, mode] + benchrow(results))
+    widths = [max(len(x[i]) for x in [header] + rows)
+              for i in range(len(header))]
+    click.echo()
+    for row in [header] + rows:
+        click.echo('  '.join(x.ljust(w) for x, w in zip(row, widths))
+                   .rstrip())
+    click.echo()
 
 
 @dip.command('completion')
@@ -117,9 +453,13 @@ def dip_config(edit, keys):
     with settings.load() as cfg:
         if edit:
             try:
-                subprocess.call([utils.editor(), cfg.filepath])
+                cfg.storage.edit(utils.editor())
             except KeyError:
                 raise click.ClickException('EDITOR value not defined in ENV')
+
+            # Run plans may be out of date
+            for name in cfg:
+                plans.remove(name, settings.HOME)
         else:
             working = cfg.data
             for key in keys:
@@ -134,20 +474,91 @@ def dip_config(edit, keys):
                 click.echo(working)
 
 
+@dip.command('daemon')
+@clickerr
+def dip_daemon():
+    """ Serve app runs from a warm process.
+
+        Listens on a unix socket in DIP_HOME until interrupted. While it
+        is up, executables hand their runs to it instead of starting dip.
+    """
+    try:
+        daemon.serve(settings.HOME)
+    except KeyboardInterrupt:
+        pass
+
+
 @dip.command('diff')
-@options.NAME
+@options.NAMES
+@options.ALL
+@options.JOBS
 @options.QUIET
-def dip_diff(name, quiet):
-    """ Run diff against remote. """
-    with settings.diffapp(name, quiet=quiet) as app_diff:
-        _, diff = app_diff
-        if diff:
-            raise SystemExit(1)
+@clickerr
+def dip_diff(names, everything, jobs, quiet):
+    """ Run diff against remote.
+
+        With several CLIs (or --all) remotes are checked concurrently and a
+        summary is shown instead of the diff.
+
+        \b
+        dip diff fizz               # Show diff of one CLI
+        dip diff fizz buzz          # Check several CLIs
+        dip diff --all --jobs 16    # Check every CLI, 16 at a time
+    """
+    if len(names) == 1 and not everything:
+        with settings.diffapp(names[0], quiet=quiet) as app_diff:
+            app, diff = app_diff
+            if app.stale:
+                warnstale(app)
+            if diff:
+                raise SystemExit(1)
+        return
+    outcomes = fanout(diffone, names, everything, jobs)
+    if any(x.error or x.result == 'diverged' for x in outcomes):
+        raise SystemExit(1)
+
+
+@dip.command('gc')
+@clickerr
+def dip_gc():
+    """ Remove idle, stale or orphaned containers.
+
+        Containers of the service and pool runners are removed when their
+        app is no longer installed with that runner, or when they would be
+        replaced on the next run anyway.
+    """
+    def removed(container):
+        click.echo("Removed {container}".format(
+            container=colors.red(container)))
+
+    with settings.load() as cfg:
+        for container, name in runners.Service.containers():
+            app = cfg.get(name)
+            backend = app.backend if app else None
+            if isinstance(backend, runners.Service) \
+                    and backend.container == container:
+                if not backend.expired():
+                    continue
+                backend.stop()
+            else:
+                runners.Service.remove(container)
+            removed(container)
+
+        # Standby containers; claimed ones are no longer 'created'
+        for container, name in runners.Pool.containers('status=created'):
+            app = cfg.get(name)
+            backend = app.backend if app else None
+            if isinstance(backend, runners.Pool) \
+                    and backend.pooled(container):
+                continue
+            runners.Pool.remove(container)
+            removed(container)
 
 
 @dip.command('install')
-@options.NAME
-@options.HOME
+@options.INSTALL_NAME
+@options.INSTALL_HOME
+@options.SOURCE
 @options.PATH
 @options.REMOTE
 @options.DOTENV
@@ -155,18 +566,42 @@ def dip_diff(name, quiet):
 @options.SECRET
 @options.SLEEP
 @options.AUTO_UPGRADE
+@options.CHECK
+@options.CHECK_INTERVAL
+@options.FETCH_TIMEOUT
+@options.RUNNER
+@options.OPT
 @options.NO_EXE
+@options.WARM
+@options.JOBS
 @clickerr
-def dip_install(name, home, path, remote, dotenv, env, secret, sleep,
-                auto_upgrade, no_exe):
+def dip_install(name, home, source, path, remote, dotenv, env, secret, sleep,
+                auto_upgrade, check, check_interval, fetch_timeout, runner,
+                opts, no_exe, prewarm, jobs):
     """ Install CLI by name.
 
         \b
         dip install fizz .                   # Relative path
         dip install fizz /path/to/dir        # Absolute path
         dip install fizz . -r origin/master  # Tracking git remote/branch
+        dip install fizz . -r origin -c 300  # Check remote every 5 minutes
+        dip install fizz . -r origin -t 3    # Give up fetching after 3s
+        dip install fizz . -r origin -k ls-remote  # Fetch only on change
+        dip install fizz . -R service -O idle=600  # Keep container up
+        dip install --from apps.yml          # Install CLIs of a manifest
+
+        With --from, the CLIs of the manifest (see dip.manifest) are
+        validated and written concurrently and settings are saved once;
+        only --path (as default), --no-exe, --warm and --jobs apply.
     """
-    # pylint: disable=too-many-arguments
+    # pylint: disable=too-many-arguments,too-many-locals
+    if source:
+        if name or home:
+            raise click.UsageError('NAME and HOME cannot be used with --from')
+        return installmany(source, path, no_exe, prewarm, jobs)
+    if not name or not home:
+        raise click.UsageError('Missing argument "NAME" and "HOME" '
+                               'or option "--from"')
     with settings.saveonexit() as cfg:
         # Interactively set ENV
         for sec in secret:
@@ -177,60 +612,139 @@ def dip_install(name, home, path, remote, dotenv, env, secret, sleep,
         git = {'remote': remote,
                'branch': branch,
                'sleep': sleep,
-               'auto_upgrade': auto_upgrade}
+               'auto_upgrade': auto_upgrade,
+               'check': check,
+               'check_interval': check_interval,
+               'fetch_timeout': fetch_timeout}
 
         # Install
         if no_exe:
-            app = cfg[name] = settings.Dip(name, home, path, env, git, dotenv)
+            app = cfg[name] = settings.Dip(name, home, path, env, git, dotenv,
+                                           runner, opts)
         else:
-            app = cfg.install(name, home, path, env, git, dotenv)
+            app = cfg.install(name, home, path, env, git, dotenv, runner,
+                              opts)
 
         # Validate configuration
         app.validate()
+        app.compile()
 
         # Finish
         click.echo("Installed {name} to {path}".format(
             name=colors.teal(app.name),
             path=colors.blue(app.path)))
 
+    # Pull images in the background
+    if prewarm:
+        warm.background(name, settings.HOME)
+
+
+def installmany(source, path=None, no_exe=False, prewarm=False,
+                jobs=fleet.JOBS):
+    """ Install CLIs of manifest, saving settings once. """
+    apps = manifest.apps(source, path)
+    outcomes = echoeach(lambda x: installone(x, not no_exe), apps, jobs)
+    installed = [x.item for x in outcomes if x.error is None]
+    with settings.saveonexit() as cfg:
+        for app in installed:
+            cfg[app.name] = app
+
+    # Pull images in the background
+    if prewarm:
+        for app in installed:
+            warm.background(app.name, settings.HOME)
+    if len(installed) < len(outcomes):
+        raise SystemExit(1)
+
 
 @dip.command('list')
+@options.STATUS
+@options.JOBS
 @clickerr
-def dip_list():
-    """ List installed CLIs. """
+def dip_list(status, jobs):
+    """ List installed CLIs.
+
+        Git repositories are inspected concurrently, once per home.
+
+        \b
+        dip list            # List CLIs and their tracked remotes
+        dip list --status   # Include the last recorded remote check
+    """
     with settings.load() as cfg:
-        if any(cfg):
-            click.echo()
-            homes = [utils.contractuser(cfg[x].home) for x in cfg]
-            maxname = max(len(x) for x in cfg)
-            maxhome = max(len(x) for x in homes)
-            for key in sorted(cfg):
-                app = cfg[key]
-                name = colors.teal(app.name.ljust(maxname))
-                home = colors.blue(utils.contractuser(app.home).ljust(maxhome))
-                remote = branch = None
-                tpl = "{name} {home}"
-                if app.repo:
-                    try:
-                        remote = app.repo.remotename
-                        branch = app.repo.branch
-                        tpl += " {remote}/{branch}"
-                    except Exception:  # pylint:  disable=broad-except
-                        tpl += colors.red(' [git error]')
-                click.echo(tpl.format(name=name,
-                                      home=home,
-                                      remote=remote,
-                                      branch=branch))
-            click.echo()
+        apps = [cfg[x] for x in sorted(cfg)]
+    if not apps:
+        return
+    click.echo()
+    maxname = max(len(x.name) for x in apps)
+    maxhome = max(len(utils.contractuser(x.home)) for x in apps)
+
+    # Resolve tracked branches in the background, in order of first use
+    keys = list({tracks(x): x for x in apps if x.repo}.items())
+    lookups = zip([k for k, _ in keys],
+                  fleet.imap(lambda x: trackingname(x[1]), keys, jobs))
+    tracked = {}
+
+    # Stream rows as soon as their lookups resolve
+    now = time.time()
+    for app in apps:
+        name = colors.teal(app.name.ljust(maxname))
+        home = colors.blue(utils.contractuser(app.home).ljust(maxhome))
+        row = "{name} {home}".format(name=name, home=home)
+        if app.repo:
+            while tracks(app) not in tracked:
+                key, val = next(lookups)
+                tracked[key] = val
+            if tracked[tracks(app)] is None:
+                row += colors.red(' [git error]')
+            else:
+                row += " " + tracked[tracks(app)]
+            if status:
+                row += " " + checkstatus(app, now)
+        click.echo(row)
+    click.echo()
+
+
+@dip.command('pool')
+@options.NAMES
+@options.ALL
+@options.JOBS
+@clickerr
+def dip_pool(names, everything, jobs):
+    """ Fill standby pools of CLIs using the pool runner.
+
+        Stale standby containers are removed and missing ones created.
+        Runs refill their pool in the background, so this is only needed
+        to fill a pool ahead of the first run.
+
+        \b
+        dip pool fizz       # Fill the pool of fizz
+        dip pool --all      # Fill every pool
+    """
+    outcomes = fanout(fillone, names, everything, jobs)
+    if any(x.error for x in outcomes):
+        raise SystemExit(1)
 
 
 @dip.command('pull')
-@options.NAME
+@options.NAMES
+@options.ALL
+@options.JOBS
 @clickerr
-def dip_pull(name):
-    """ Pull updates from docker-compose. """
-    with settings.diffapp(name) as app_diff:
+def dip_pull(names, everything, jobs):
+    """ Pull updates from docker-compose.
+
+        With several CLIs (or --all) images are pulled concurrently,
+        without checking remotes first.
+    """
+    import docker  # pylint: disable=import-outside-toplevel
+    if len(names) != 1 or everything:
+        if any(x.error for x in fanout(pullone, names, everything, jobs)):
+            raise SystemExit(1)
+        return
+    with settings.diffapp(names[0]) as app_diff:
         app, diff = app_diff
+        if app.stale:
+            warnstale(app)
         if diff and app.git.get('sleep'):
             warnsleep(app)
         elif diff:
@@ -238,7 +752,7 @@ def dip_pull(name):
         try:
             return app.service.pull()
         except docker.errors.APIError:
-            err = "Could not pull '{}' image".format(name)
+            err = "Could not pull '{}' image".format(app.name)
             click.echo(colors.red(err), err=True)
         raise SystemExit(1)
 
@@ -255,23 +769,41 @@ def dip_reset(force):
 @dip.command('run')
 @options.NAME
 @options.QUICK
+@options.EXEC
+@options.RUN_RUNNER
 @options.ARGS
 @clickerr
-def dip_run(name, quick, args):
-    """ Run dip CLI. """
+def dip_run(name, quick, replace, runner, args):
+    """ Run dip CLI.
+
+        By default dip replaces itself with the container runner once its
+        checks are done; use --no-exec to keep dip running until the
+        container exits. Runs with another --runner leave the run plan of
+        the executable alone.
+    """
     if quick:
         with settings.getapp(name) as app:
-            app.run(*args)
+            app.runner = runner or app.runner
+            if not runner:
+                app.compile()
+            code = app.run(*args, replace=replace)
     else:
         with settings.diffapp(name) as app_diff:
             app, diff = app_diff
+            if app.stale:
+                warnstale(app)
             if diff and app.sleep:
                 warnsleep(app)
             elif diff and app.auto_upgrade:
                 warnupgrade(app)
             elif diff:
                 warnask(app)
-            app.run(*args)
+            app.runner = runner or app.runner
+            if not runner:
+                app.compile()
+            code = app.run(*args, replace=replace)
+    if not replace and code:
+        raise SystemExit(code)
 
 
 @dip.command('show')
@@ -281,6 +813,8 @@ def dip_show(name):
     """ Show service configuration. """
     with settings.diffapp(name) as app_diff:
         app, diff = app_diff
+        if app.stale:
+            warnstale(app)
         if diff and app.git.get('sleep'):
             warnsleep(app)
         elif diff:
@@ -289,31 +823,133 @@ def dip_show(name):
             click.echo("\n{}\n".format(definition.strip()))
 
 
+@dip.command('stop')
+@options.NAMES
+@options.ALL
+@options.JOBS
+@clickerr
+def dip_stop(names, everything, jobs):
+    """ Stop service containers and standby pools of CLIs.
+
+        \b
+        dip stop fizz       # Stop the containers kept for fizz
+        dip stop --all      # Stop every kept container
+    """
+    outcomes = fanout(stopone, names, everything, jobs)
+    if any(x.error for x in outcomes):
+        raise SystemExit(1)
+
+
+@dip.command('sync')
+@options.NAMES
+@options.DAEMON
+@options.INTERVAL
+@clickerr
+def dip_sync(names, daemon, interval):
+    """ Check git remotes and record their state in DIP_HOME.
+
+        Runs inside an app's check interval reuse the recorded state
+        instead of fetching from the remote.
+
+        \b
+        dip sync                # Check all tracked remotes once
+        dip sync fizz buzz      # Check some tracked remotes once
+        dip sync --daemon       # Keep checking on a jittered schedule
+    """
+    if daemon:
+        try:
+            sync.forever(names, interval, echosync)
+        except KeyboardInterrupt:
+            pass
+    elif not all(err is None for _, err in sync.once(names, echosync)):
+        raise SystemExit(1)
+
+
 @dip.command('uninstall')
 @options.NAMES
+@options.SOURCE
+@options.JOBS
 @clickerr
-def dip_uninstall(names):
-    """ Uninstall CLI by name. """
-    for name in names:
-        with settings.saveonexit() as cfg:
-            try:
-                cfg.uninstall(name)
+def dip_uninstall(names, source, jobs):
+    """ Uninstall CLIs by name, or those of a manifest.
+
+        Executables are removed and networks brought down concurrently and
+        settings are saved once.
+
+        \b
+        dip uninstall fizz buzz
+        dip uninstall --from apps.yml
+    """
+    names = list(names) + (manifest.names(source) if source else [])
+    failed = False
+    with settings.saveonexit() as cfg:
+        apps = [cfg[x] for x in dict.fromkeys(names) if x in cfg]
+        for outcome in fleet.each(lambda x: x.uninstall(), apps, jobs):
+            name = outcome.item.name
+            if outcome.error is None:
+                del cfg[name]
                 click.echo("Uninstalled {name}".format(name=colors.red(name)))
-            except KeyError:
-                pass
+            else:
+                failed = True
+                click.echo(colors.red("Unable to uninstall {name}: {err}"
+                                      .format(name=name, err=outcome.error)),
+                           err=True)
+    if failed:
+        raise SystemExit(1)
 
 
 @dip.command('upgrade')
 @options.NAMES
+@options.ALL
+@options.JOBS
+@options.WARM
 @clickerr
-def dip_upgrade(names):
-    """ Upgrade CLI by pulling from git remote. """
-    for name in names:
-        with settings.getapp(name) as app:
+def dip_upgrade(names, everything, jobs, prewarm):
+    """ Upgrade CLI by pulling from git remote.
+
+        With several CLIs (or --all) remotes are pulled concurrently and a
+        summary is shown instead of the output of `git pull`.
+    """
+    if len(names) != 1 or everything:
+        pulls = fleet.Once()
+        outcomes = fanout(lambda x: upgradeone(x, pulls),
+                          names, everything, jobs)
+        upgraded = [x.item.name for x in outcomes if x.error is None]
+    else:
+        with settings.getapp(names[0]) as app:
             try:
                 app.repo.pull()
             except AttributeError:
                 pass
+            app.compile()
+        outcomes, upgraded = [], [app.name]
+
+    # Pull images in the background
+    if prewarm:
+        for name in upgraded:
+            warm.background(name, settings.HOME)
+    if any(x.error for x in outcomes):
+        raise SystemExit(1)
+
+
+@dip.command('warm')
+@options.NAMES
+@options.ALL
+@options.JOBS
+@clickerr
+def dip_warm(names, everything, jobs):
+    """ Pull images of CLIs and their dependencies.
+
+        Images are pulled concurrently, showing progress as layers
+        complete, so that the next run does not have to pull them.
+
+        \b
+        dip warm fizz       # Pull images used by fizz
+        dip warm --all      # Pull images of every CLI
+    """
+    outcomes = fanout(lambda x: warmone(x, jobs), names, everything, jobs)
+    if any(x.error for x in outcomes):
+        raise SystemExit(1)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,98 @@
+"""
+Manifests of CLIs to install or uninstall in bulk.
+
+A manifest is a YAML mapping of CLI names to their install options, named
+as the long options of `dip install`:
+
+    fizz:
+      home: ~/src/fizz        # Relative to the manifest
+      remote: origin/master
+      check_interval: 300
+      env:
+        FIZZ: buzz
+    buzz:
+      home: ../buzz
+      runner: service
+      opts:
+        idle: 600
+"""
+import os
+
+from dip import errors
+from dip import settings
+
+# pylint: disable=import-outside-toplevel
+
+GIT = ['sleep', 'auto_upgrade', 'check', 'check_interval', 'fetch_timeout']
+KEYS = {'home', 'path', 'remote', 'env', 'dotenv', 'runner', 'opts'}\
+    | set(GIT)
+
+
+def read(filepath):
+    """ Read manifest into a dict of app name to install options. """
+    import yaml
+    try:
+        with open(filepath) as stream:
+            data = yaml.safe_load(stream) or {}
+    except (OSError, IOError):
+        raise errors.ManifestError(filepath, 'unable to read file')
+    except yaml.YAMLError:
+        raise errors.ManifestError(filepath, 'invalid YAML')
+    if not isinstance(data, dict):
+        raise errors.ManifestError(filepath, 'expected a mapping of names')
+    for name, config in data.items():
+        if not isinstance(config, dict):
+            raise errors.ManifestError(
+                filepath, "expected a mapping for '{}'".format(name))
+    return {str(k): v for k, v in data.items()}
+
+
+def names(filepath):
+    """ Get names of apps in manifest. """
+    return sorted(read(filepath))
+
+
+def apps(filepath, path=None):
+    """ Get apps of manifest.
+
+        Homes are relative to the manifest; executables go to the path of
+        each app, or to path (DIP_PATH by default).
+    """
+    root = os.path.dirname(os.path.abspath(filepath))
+    ret = []
+    for name, config in sorted(read(filepath).items()):
+        unknown = sorted(set(config) - KEYS)
+        if unknown:
+            raise errors.ManifestError(
+                filepath, "unknown key '{}' for '{}'".format(unknown[0],
+                                                             name))
+        if not config.get('home'):
+            raise errors.ManifestError(
+                filepath, "missing home for '{}'".format(name))
+
+        # Same as `dip install` options, where git options need a remote
+        gitopts = sorted(x for x in GIT if config.get(x))
+        if gitopts and not config.get('remote'):
+            reason = "'{}' for '{}' requires a remote"
+            raise errors.ManifestError(filepath,
+                                       reason.format(gitopts[0], name))
+        remote, _, branch = str(config.get('remote') or '').partition('/')
+        git = {'remote': remote, 'branch': branch}
+        git.update((x, config.get(x)) for x in GIT)
+        env = {str(k): str(v) for k, v in (config.get('env') or {}).items()}
+        ret.append(settings.Dip(name,
+                                expand(root, config['home']),
+                                expand(root, config.get('path')) or path,
+                                env,
+                                git,
+                                config.get('dotenv'),
+                                config.get('runner'),
+                                config.get('opts')))
+    return ret
+
+
+def expand(root, value):
+    """ Expand user and make path relative to root absolute. """
+    if not value:
+        return None
+    return os.path.abspath(os.path.join(root, os.path.expanduser(value)))
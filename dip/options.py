@@ -5,6 +5,8 @@ import os
 import re
 
 import click
+from dip import fleet
+from dip import runners
 
 
 def validate_env(ctx, param, value):
@@ -29,6 +31,19 @@ def validate_env(ctx, param, value):
     return environment
 
 
+def validate_opts(ctx, param, value):
+    """ Validate --opt option. """
+    # pylint: disable=unused-argument
+    opts = {}
+    for val in value:
+        match = re.match(r'^([a-z_]+)=(.*)$', val)
+        if not match:
+            raise click.BadParameter("Use 'key=value'")
+        key, val = match.groups()
+        opts[key] = int(val) if re.match(r'^[0-9]+$', val) else val
+    return opts
+
+
 def validate_secret(ctx, param, value):
     """ Validate --secret option. """
     # pylint: disable=unused-argument
@@ -78,13 +93,33 @@ class Name(click.types.StringParamType):
 
 ARGS = click.argument('ARGS', nargs=-1)
 HOME = click.argument('HOME', callback=expand_home)
+INSTALL_HOME = click.argument('HOME', callback=expand_home, required=False)
+INSTALL_NAME = click.argument('NAME', required=False, type=Name())
 KEYS = click.argument('KEYS', is_eager=True, nargs=-1)
 NAME = click.argument('NAME', type=Name())
 NAMES = click.argument('NAMES', nargs=-1, type=Name())
+ALL = click.option('-a', '--all', 'everything',
+                   help='Process all installed apps',
+                   is_flag=True)
 AUTO_UPGRADE = click.option('-a', '--auto-upgrade',
                             callback=ensure_remote,
                             help='Auto-upgrade out-of-date remotes',
                             is_flag=True)
+CHECK = click.option('-k', '--check',
+                     callback=ensure_remote,
+                     help='Strategy used to check remote for changes',
+                     type=click.Choice(['fetch', 'ls-remote']))
+CHECK_INTERVAL = click.option('-c', '--check-interval',
+                              callback=ensure_remote,
+                              help='Seconds to reuse the last remote check',
+                              type=click.INT)
+FETCH_TIMEOUT = click.option('-t', '--fetch-timeout',
+                             callback=ensure_remote,
+                             help='Seconds to wait for a fetch of the remote',
+                             type=click.FLOAT)
+DAEMON = click.option('-d', '--daemon',
+                      help='Keep running and sync on a jittered schedule',
+                      is_flag=True)
 DOTENV = click.option('-d', '--dotenv',
                       help='Load ENV variables from file in HOME')
 EDIT = click.option('-e', '--edit',
@@ -95,19 +130,69 @@ ENV = click.option('-e', '--env',
                    help='Runtime ENV variable',
                    multiple=True,
                    type=NameVal())
+EXEC = click.option('--exec/--no-exec', 'replace',
+                    default=True,
+                    help='Replace dip with the container runner or wait '
+                         'for it and exit with its exit code',
+                    show_default=True)
 FORCE = click.option('-f', '--force',
                      help='Do not prompt',
                      is_flag=True,
                      prompt='Are you sure?')
+INTERVAL = click.option('-i', '--interval',
+                        default=300,
+                        help='Seconds between syncs of apps without a '
+                             'check interval',
+                        show_default=True,
+                        type=click.INT)
+JOBS = click.option('-j', '--jobs',
+                    default=fleet.JOBS,
+                    help='Number of apps to process at once',
+                    show_default=True,
+                    type=click.IntRange(1))
 NO_EXE = click.option('-o', '--no-exe',
                       help='Install without executable',
                       is_flag=True)
+WARM = click.option('-w', '--warm', 'prewarm',
+                    help='Pull images in the background afterwards',
+                    is_flag=True)
+MODES = click.option('-m', '--mode', 'modes',
+                     default=['quick', 'full'],
+                     help='How runs are made (default: quick and full)',
+                     multiple=True,
+                     type=click.Choice(['exe', 'full', 'quick']))
 QUICK = click.option('-q', '--quick',
                      help='Do not check remote before running',
                      is_flag=True)
 QUIET = click.option('-q', '--quiet',
                      help='Do not show output',
                      is_flag=True)
+RUNNER = click.option('-R', '--runner',
+                      help='Container runner (default: DIP_RUNNER or compose)',
+                      type=click.Choice(sorted(runners.RUNNERS)))
+TRACE = click.option('--trace', 'trace_',
+                     help='Write timed spans of this run to stderr',
+                     is_flag=True)
+STATUS = click.option('-s', '--status',
+                      help='Show result of the last recorded remote check',
+                      is_flag=True)
+RUN_RUNNER = click.option('-R', '--runner',
+                          help='Run with this container runner instead of '
+                               'the app runner',
+                          type=click.Choice(sorted(runners.RUNNERS)))
+RUNNERS = click.option('-R', '--runner', 'runners',
+                       help='Container runner to compare (default: the '
+                            'app runner)',
+                       multiple=True,
+                       type=click.Choice(sorted(runners.RUNNERS)))
+RUNS = click.option('-n', '--runs',
+                    default=10,
+                    help='Number of runs of each configuration',
+                    show_default=True,
+                    type=click.IntRange(1))
+SOURCE = click.option('--from', 'source',
+                      help='Manifest of CLIs (YAML)',
+                      type=click.Path(exists=True, dir_okay=False))
 SECRET = click.option('-x', '--secret',
                       callback=validate_secret,
                       help='Set secret ENV',
@@ -117,6 +202,11 @@ SLEEP = click.option('-s', '--sleep',
                      callback=ensure_remote,
                      help='Number of seconds to sleep when remote differs',
                      type=click.INT)
+OPT = click.option('-O', '--opt', 'opts',
+                   callback=validate_opts,
+                   help='Runner option (eg. idle=600 for the service runner)',
+                   multiple=True,
+                   type=NameVal())
 PATH = click.option('-p', '--path',
                     callback=expand_home,
                     help='Path to write executable')
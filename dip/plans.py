@@ -0,0 +1,226 @@
+"""
+Precompiled run plans for the fast-path shim.
+
+A plan is a bash function written to DIP_HOME/plans/NAME.sh that runs the
+fully resolved container command for an app. The shim sources it and
+execs the command directly as long as the compose files and dotenv it was
+compiled from, and the ENV variables they reference, are unchanged (and,
+for apps tracking a remote, the last remote check is still fresh) and the
+run is not traced; otherwise it falls back to `dip run`.
+"""
+import hashlib
+import json
+import os
+import shlex
+import subprocess
+import tempfile
+import time
+
+from dip import errors
+from dip import utils
+
+# pylint: disable=import-outside-toplevel
+
+TEMPLATE = '''\
+{header}\
+dip_plan() {{
+  [ -z "$DIP_TRACE" ] || return 1
+  [ "$(cksum {files} 2>/dev/null)" = {fingerprint} ] || return 1
+{environ}\
+{fresh}\
+  cd {home} || return 1
+{exports}\
+  if {notty}; then
+    [ $# -eq 0 ] && exec {commands[notty]}
+    exec {commands[notty_args]}
+  else
+    [ $# -eq 0 ] && exec {commands[tty]}
+    exec {commands[tty_args]}
+  fi
+}}
+'''
+
+FRESH = '''\
+  [ "$(date +%s)" -lt "$(cat {stamp} 2>/dev/null || echo 0)" ] || return 1
+'''
+
+HEADER = '# dip run plan for {name} {digest} (generated by dip; do not edit)\n'
+
+# ENV read by compose besides the variables the files reference
+PREFIXES = ('COMPOSE_', 'DOCKER_')
+PREFIXED = '  local prefixed=(${{!COMPOSE_*}} ${{!DOCKER_*}})\n'\
+    '  [ ${{#prefixed[@]}} -eq {count} ] || return 1\n'
+SET = '  [ -n "${{{key}+x}}" ] && [ "${key}" = {val} ] || return 1\n'
+UNSET = '  [ -z "${{{key}+x}}" ] || return 1\n'
+
+# Stands in for "$@" when resolving commands
+ARGS = object()
+
+# Shell version of dip.utils.notty()
+NOTTY = '{ [ ! -p /dev/stdin ] && [ ! -f /dev/stdin ]; } && '\
+        '{ [ -p /dev/stdout ] || [ -f /dev/stdout ]; }'
+
+
+def path(name, home):
+    """ Get path to app plan. """
+    return os.path.join(home, 'plans', '{}.sh'.format(name))
+
+
+def stamp(name, home):
+    """ Get path to file holding the time until which app checks are fresh.
+    """
+    return os.path.join(home, 'state', '{}.fresh'.format(name))
+
+
+def files(app):
+    """ Get files whose contents determine the run command of an app. """
+    paths = utils.composefiles(app.home)
+    dirs = {os.path.dirname(x) for x in paths} | {app.home}
+    names = list(utils.COMPOSE_FILES + utils.COMPOSE_OVERRIDES) + ['.env']
+    paths += [os.path.join(x, y) for x in sorted(dirs) for y in names]
+    if app.dotenv:
+        paths.append(os.path.join(app.home, app.dotenv))
+    return sorted(set(paths))
+
+
+def variables(paths):
+    """ Get names of ENV variables referenced in files. """
+    from dip import settings  # settings imports plans
+    names = set()
+    for filepath in paths:
+        try:
+            with open(filepath, 'rb') as stream:
+                data = stream.read().decode('utf8', 'replace')
+        except (OSError, IOError):
+            continue
+        names.update(settings.VARIABLE.findall(data))
+    return names
+
+
+def environ(paths):
+    """ Render checks that the ENV the command is resolved with is unchanged.
+
+        Variables referenced in paths and those read by compose itself must
+        be set to the same values, or unset, as when the plan was compiled.
+    """
+    prefixed = {k for k in os.environ if k.startswith(PREFIXES)}
+    checks = PREFIXED.format(count=len(prefixed))
+    for key in sorted(variables(paths) | prefixed):
+        if key in os.environ:
+            checks += SET.format(key=key, val=shlex.quote(os.environ[key]))
+        else:
+            checks += UNSET.format(key=key)
+    return checks
+
+
+def header(app, home):
+    """ Get first line of plan, with a digest of all it is rendered from. """
+    import dip
+    paths = files(app)
+    data = [dip.__version__, TEMPLATE, FRESH, home, dict(app),
+            fingerprint(paths), environ(paths)]
+    digest = hashlib.sha1(json.dumps(data, sort_keys=True).encode('utf8'))
+    return HEADER.format(name=app.name, digest=digest.hexdigest())
+
+
+def fingerprint(paths):
+    """ Get cksum output for paths, exactly as the shim computes it. """
+    proc = subprocess.run(['cksum'] + list(paths),
+                          stdout=subprocess.PIPE,
+                          stderr=subprocess.DEVNULL)
+    return proc.stdout.decode('utf8').rstrip('\n')
+
+
+def render(app, home):
+    """ Render plan for app. """
+    paths = files(app)
+
+    # ENV from dotenv file and app env is only exported when not already set
+    exports = ''
+    for key, val in sorted(app.defaults().items()):
+        exports += '  [ -n "${{{key}+x}}" ] || export {key}={val}\n'\
+            .format(key=key, val=shlex.quote(val))
+
+    # Resolve command for both TTY modes, with and without args
+    commands = {}
+    for key, notty, args in [('notty', True, []),
+                             ('notty_args', True, [ARGS]),
+                             ('tty', False, []),
+                             ('tty_args', False, [ARGS])]:
+        cmd = app.backend.command(*args, notty=notty)
+        commands[key] = ' '.join('"$@"' if x is ARGS else shlex.quote(x)
+                                 for x in cmd)
+
+    # Remote checks must be fresh
+    fresh = ''
+    if app.repo:
+        fresh = FRESH.format(stamp=shlex.quote(stamp(app.name, home)))
+
+    return TEMPLATE.format(header=header(app, home),
+                           files=' '.join(shlex.quote(x) for x in paths),
+                           fingerprint=shlex.quote(fingerprint(paths)),
+                           environ=environ(paths),
+                           fresh=fresh,
+                           home=shlex.quote(app.home),
+                           exports=exports,
+                           notty=NOTTY,
+                           commands=commands)
+
+
+def write(app, home):
+    """ Write plan for app, or remove it if the app cannot use one.
+
+        Apps tracking a remote without a check interval must check the
+        remote on every run, and runners that prepare containers before
+        each run cannot be compiled, so these always go through `dip run`.
+        A plan rendered from the same files, ENV and settings is kept;
+        others are replaced atomically, so shims never source half a plan.
+    """
+    if app.repo and not app.check_interval or not app.backend.compiled:
+        return remove(app.name, home)
+    plan = path(app.name, home)
+    try:
+        with open(plan) as stream:
+            if stream.readline() == header(app, home):
+                return plan
+    except (OSError, IOError):
+        pass
+    dirname = os.path.dirname(plan)
+    try:
+        text = render(app, home)
+        os.makedirs(dirname, exist_ok=True)
+        with tempfile.NamedTemporaryFile('w', dir=dirname,
+                                         prefix='.{}.'.format(app.name),
+                                         delete=False) as tmp:
+            tmp.write(text)
+        utils.replace(tmp.name, plan)
+    except (OSError, IOError, errors.DipError):
+        return remove(app.name, home)
+    return plan
+
+
+def remove(name, home):
+    """ Remove plan and freshness stamp of app. """
+    for filepath in [path(name, home), stamp(name, home)]:
+        try:
+            os.remove(filepath)
+        except (OSError, IOError):
+            pass
+
+
+def refresh(name, home, diff, interval, now=None):
+    """ Record until when the last remote check of an app is fresh. """
+    filepath = stamp(name, home)
+    if diff or not interval:
+        try:
+            os.remove(filepath)
+        except (OSError, IOError):
+            pass
+        return
+    now = time.time() if now is None else now
+    try:
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        with open(filepath, 'w') as stream:
+            stream.write('{}\n'.format(int(now + interval)))
+    except (OSError, IOError):
+        pass
@@ -0,0 +1,696 @@
+"""
+Container runners for dip apps.
+"""
+import contextlib
+import hashlib
+import json
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import time
+
+from dip import errors
+from dip import plans
+from dip import utils
+
+# Heavy dependencies are imported where they are used
+# pylint: disable=import-outside-toplevel
+
+RUNNERS = {}
+
+
+def runner(name):
+    """ Register runner class by name. """
+    def wrapper(cls):
+        cls.name = name
+        RUNNERS[name] = cls
+        return cls
+    return wrapper
+
+
+def get(name, app):
+    """ Get runner for app by name. """
+    try:
+        return RUNNERS[name](app)
+    except KeyError:
+        raise errors.NoSuchRunnerError(name)
+
+
+def resolve(home, env=None):
+    """ Load compose configuration without contacting the Docker daemon.
+
+        Variables are interpolated from env (the current ENV by default)
+        and the .env file in home. Returns the project name and the loaded
+        config.
+    """
+    import compose.cli.command
+    import compose.config.config
+    import compose.config.environment
+    environment = compose.config.environment.Environment.from_env_file(home)
+    if env is not None:
+        environment.update(env)
+    details = compose.config.config.find(home, None, environment)
+    name = compose.cli.command.get_project_name(details.working_dir,
+                                                None,
+                                                environment)
+    return name, compose.config.config.load(details)
+
+
+def findservice(config, name):
+    """ Get resolved service by name. """
+    try:
+        return next(x for x in config.services if x['name'] == name)
+    except StopIteration:
+        raise errors.NoSuchService(name)
+
+
+def namespaced(project, definitions, name):
+    """ Get name of a volume or network of the project by its definition.
+
+        Definitions may name it or make it external; otherwise it is
+        prefixed with the project name as docker-compose does.
+    """
+    definition = definitions.get(name) or {}
+    external = definition.get('external')
+    if definition.get('name'):
+        return definition['name']
+    if isinstance(external, dict) and external.get('name'):
+        return external['name']
+    if external:
+        return name
+    return "{project}_{name}".format(project=project, name=name)
+
+
+def split(value):
+    """ Split string entrypoint or command into a list. """
+    return shlex.split(value) if isinstance(value, str) else value
+
+
+class Runner:
+    """ Base container runner. """
+    name = None
+
+    # Supported keys of the app's runner options
+    OPTIONS = ()
+
+    # Whether the command can be compiled into a run plan
+    compiled = True
+
+    def __init__(self, app):
+        self.app = app
+
+    def __str__(self):
+        return self.name
+
+    def __repr__(self):
+        return "{cls}({self})".format(cls=type(self).__name__, self=self)
+
+    def command(self, *args, notty=None):
+        """ Get command that runs app with args.
+
+            Whether a TTY is allocated follows dip.utils.notty() unless
+            notty is given.
+        """
+        raise NotImplementedError
+
+    def envopts(self):
+        """ Get -e options for app ENV. """
+        return [x for i in self.app.env.items() for x in ['-e', '='.join(i)]]
+
+    def prepare(self):
+        """ Get ready to run the command. """
+
+    def stop(self):
+        """ Release resources held for the app; return True if any were. """
+        return False
+
+
+@runner('compose')
+class Compose(Runner):
+    """ Run app with `docker-compose run` (compose v1). """
+    executable = ['docker-compose']
+
+    def command(self, *args, notty=None):
+        cmd = self.executable + ['run', '--rm']
+        if utils.notty() if notty is None else notty:
+            cmd.append('-T')
+        cmd += self.envopts()
+        return cmd + [self.app.name] + list(args)
+
+
+@runner('compose-v2')
+class ComposeV2(Compose):
+    """ Run app with `docker compose run` (compose v2 plugin). """
+    executable = ['docker', 'compose']
+
+
+@runner('docker')
+class Docker(Runner):
+    """ Run app with `docker run` built from the resolved service.
+
+        Only the service itself is started, attached to its networks (the
+        project's default network unless it lists some): dependencies,
+        networks and named volumes are expected to exist already (eg. from
+        a previous `docker-compose up`). Service keys without a `docker run`
+        equivalent are refused rather than dropped.
+    """
+    # Service keys mapped to `docker run` options
+    FLAGS = {'cap_add': '--cap-add',
+             'cap_drop': '--cap-drop',
+             'devices': '--device',
+             'dns': '--dns',
+             'dns_search': '--dns-search',
+             'extra_hosts': '--add-host',
+             'group_add': '--group-add',
+             'hostname': '--hostname',
+             'init': '--init',
+             'labels': '--label',
+             'privileged': '--privileged',
+             'read_only': '--read-only',
+             'security_opt': '--security-opt',
+             'shm_size': '--shm-size',
+             'tmpfs': '--tmpfs',
+             'user': '--user',
+             'working_dir': '--workdir'}
+
+    # Service keys handled below, or left out as `docker-compose run` does
+    KEYS = {'build', 'command', 'container_name', 'depends_on', 'entrypoint',
+            'environment', 'image', 'name', 'network_mode', 'networks',
+            'ports', 'restart', 'stdin_open', 'tty', 'volumes'}
+
+    def command(self, *args, notty=None):
+        opts, entrypoint, image, command = self.resolve()
+        cmd = ['docker', 'run', '--rm', '-i']
+        if not (utils.notty() if notty is None else notty):
+            cmd.append('-t')
+        cmd += opts
+        if entrypoint:
+            cmd += ['--entrypoint', entrypoint[0]]
+        return cmd + [image] + (entrypoint or [])[1:] \
+            + (list(args) or command or [])
+
+    def resolve(self):
+        """ Get container options, entrypoint, image and command of the
+            resolved service.
+        """
+        project, config = resolve(self.app.home, self.app.environ())
+        service = findservice(config, self.app.name)
+        unsupported = set(service) - self.KEYS - set(self.FLAGS)
+        if unsupported:
+            raise errors.UnsupportedServiceError(self, self.app.name,
+                                                 sorted(unsupported))
+
+        # Service options
+        opts = []
+        for key, val in sorted(service.get('environment', {}).items()):
+            opts += ['-e', key if val is None else '='.join([key, str(val)])]
+        opts += self.envopts()
+        for vol in service.get('volumes', []):
+            opts += ['-v', self.volume(project, config, vol)]
+        if service.get('network_mode'):
+            opts += ['--network', str(service['network_mode'])]
+        else:
+            for net in self.networks(project, config, service):
+                opts += ['--network', net]
+        for key, opt in sorted(self.FLAGS.items()):
+            opts += self.flag(opt, service.get(key),
+                              ':' if key == 'extra_hosts' else '=')
+
+        # Entrypoint & command
+        image = service.get('image') or "{project}_{name}".format(
+            project=project, name=self.app.name)
+        return (opts,
+                split(service.get('entrypoint')),
+                image,
+                split(service.get('command')))
+
+    @staticmethod
+    def flag(opt, val, sep='='):
+        """ Get options for service value: repeated for lists and mappings,
+            alone for true booleans.
+        """
+        if val is None or val is False:
+            return []
+        if val is True:
+            return [opt]
+        if isinstance(val, dict):
+            val = [sep.join([str(k), str(v)]) for k, v in sorted(val.items())]
+        if not isinstance(val, list):
+            val = [val]
+        return [x for item in val for x in [opt, str(item)]]
+
+    def networks(self, project, config, service):
+        """ Get names of the networks of the service.
+
+            Like `docker-compose run`, aliases are not applied to the
+            container; other network options are refused. Version 1 files
+            have no networks, their services use the default bridge.
+        """
+        import compose.const
+        if config.version == compose.const.COMPOSEFILE_V1:
+            return []
+        names = []
+        for net, opts in sorted((service.get('networks')
+                                 or {'default': None}).items()):
+            unsupported = set(opts or {}) - {'aliases'}
+            if unsupported:
+                keys = ['networks.{}.{}'.format(net, x) for x in unsupported]
+                raise errors.UnsupportedServiceError(self, self.app.name,
+                                                     sorted(keys))
+            names.append(namespaced(project, config.networks, net))
+        return names
+
+    @staticmethod
+    def volume(project, config, vol):
+        """ Get -v value for volume spec, namespacing named volumes. """
+        if not vol.is_named_volume:
+            return vol.repr()
+        name = namespaced(project, config.volumes, vol.external)
+        return ':'.join([name, vol.internal, vol.mode])
+
+
+class Managed:
+    """ Helpers for runners that keep containers between runs.
+
+        Their state is kept in DIP_HOME and their containers are labelled
+        with LABEL=<app name>.
+    """
+    LABEL = None
+    kind = None
+
+    @property
+    def statepath(self):
+        """ Path to state of app containers. """
+        from dip import settings  # settings imports runners
+        return os.path.join(settings.HOME, 'state', '{name}.{kind}.json'
+                            .format(name=self.app.name, kind=self.kind))
+
+    def fingerprint(self):
+        """ Fingerprint of the files and ENV containers are created from.
+
+            Containers bake in the ENV they were resolved with, so the ENV
+            checks of the run plan and the app's env are part of it.
+        """
+        paths = plans.files(self.app)
+        data = [plans.fingerprint(paths), plans.environ(paths),
+                sorted(self.app.env.items())]
+        return hashlib.sha1(json.dumps(data).encode('utf8')).hexdigest()
+
+    @contextlib.contextmanager
+    def lock(self):
+        """ Hold exclusive access to app containers. """
+        from dip import storage
+        os.makedirs(os.path.dirname(self.statepath), exist_ok=True)
+        with storage.Json(self.statepath).lock():
+            yield
+
+    def load(self):
+        """ Load state of app containers. """
+        try:
+            with open(self.statepath) as stream:
+                return json.loads(stream.read())
+        except (OSError, IOError, ValueError):
+            return {}
+
+    def save(self, data):
+        """ Save state of app containers. """
+        try:
+            os.makedirs(os.path.dirname(self.statepath), exist_ok=True)
+            with open(self.statepath, 'w') as stream:
+                stream.write(json.dumps(data, sort_keys=True))
+        except (OSError, IOError):
+            pass
+
+    def unlink(self):
+        """ Remove state of app containers. """
+        try:
+            os.remove(self.statepath)
+        except (OSError, IOError):
+            pass
+
+    @staticmethod
+    def inspect(fmt, target):
+        """ Get formatted `docker inspect` output, or None on error. """
+        proc = subprocess.run(['docker', 'inspect', '--format', fmt, target],
+                              stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL)
+        if proc.returncode:
+            return None
+        return proc.stdout.decode('utf8').strip()
+
+    @classmethod
+    def defaults(cls, image):
+        """ Get entrypoint and command of image. """
+        ret = cls.inspect('{{json .Config.Entrypoint}}\n'
+                          '{{json .Config.Cmd}}', image) or ''
+        try:
+            entrypoint, command = [json.loads(x) for x in ret.splitlines()]
+        except ValueError:
+            entrypoint, command = None, None
+        return entrypoint, command
+
+    @staticmethod
+    def remove(container):
+        """ Remove container; return True if it existed. """
+        proc = subprocess.run(['docker', 'rm', '-f', container],
+                              stdout=subprocess.DEVNULL,
+                              stderr=subprocess.DEVNULL)
+        return proc.returncode == 0
+
+    @classmethod
+    def containers(cls, *filters):
+        """ Yield name and app of containers of this runner. """
+        cmd = ['docker', 'ps', '-a', '--filter', 'label={}'.format(cls.LABEL)]
+        for filt in filters:
+            cmd += ['--filter', filt]
+        cmd += ['--format',
+                '{{{{.Names}}}} {{{{.Label "{}"}}}}'.format(cls.LABEL)]
+        proc = subprocess.run(cmd,
+                              stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL)
+        for line in proc.stdout.decode('utf8').splitlines():
+            container, _, app = line.partition(' ')
+            yield container, app
+
+
+@runner('service')
+class Service(Managed, Runner):
+    """ Run app with `docker exec` in a long-lived container of the service.
+
+        The container is started on first use with an idle process in
+        place of its entrypoint, and replaced when the compose files or ENV
+        it was started from change or when it has not been used for `idle`
+        seconds (a runner option, one hour by default).
+    """
+    OPTIONS = ('idle',)
+    IDLE = 3600
+    LABEL = 'dip.service'
+    kind = 'service'
+    compiled = False
+
+    @property
+    def container(self):
+        """ Name of service container. """
+        return 'dip-{}'.format(self.app.name)
+
+    @property
+    def idle(self):
+        """ Seconds after which an unused container is replaced. """
+        return int(self.app.opts.get('idle') or self.IDLE)
+
+    def running(self):
+        """ Get fingerprint of the running container, or None. """
+        ret = self.inspect('{{.State.Running}} '
+                           '{{index .Config.Labels "dip.fingerprint"}}',
+                           self.container)
+        running, _, fingerprint = (ret or '').partition(' ')
+        return fingerprint if running == 'true' else None
+
+    def expired(self, now=None):
+        """ Whether the container is gone, stale or idle. """
+        now = time.time() if now is None else now
+        data = self.load()
+        return now - data.get('used', 0) >= self.idle \
+            or self.running() != self.fingerprint()
+
+    def start(self, fingerprint):
+        """ Start container and return its state. """
+        cmd = ['docker-compose', 'run', '-d',
+               '--name', self.container,
+               '-l', '{}={}'.format(self.LABEL, self.app.name),
+               '-l', 'dip.fingerprint={}'.format(fingerprint),
+               '--entrypoint', 'tail',
+               self.app.name, '-f', '/dev/null']
+        proc = subprocess.run(cmd,
+                              cwd=self.app.home,
+                              env=self.app.environ(),
+                              stdout=subprocess.DEVNULL)
+        if proc.returncode:
+            raise errors.ContainerError(self.container)
+
+        # Entrypoint and command are those of the service, or of its image
+        _, config = resolve(self.app.home, self.app.environ())
+        service = findservice(config, self.app.name)
+        entrypoint = split(service.get('entrypoint'))
+        command = split(service.get('command'))
+        if entrypoint is None:
+            image = self.inspect('{{.Image}}', self.container)
+            entrypoint, default = self.defaults(image)
+            if command is None:
+                command = default
+        return {'command': command or [],
+                'entrypoint': entrypoint or [],
+                'fingerprint': fingerprint}
+
+    def prepare(self):
+        """ Make sure a fresh container is running and mark it used. """
+        fingerprint = self.fingerprint()
+        with self.lock():
+            now = time.time()
+            data = self.load()
+            if data.get('fingerprint') != fingerprint \
+                    or now - data.get('used', 0) >= self.idle \
+                    or self.running() != fingerprint:
+                self.stop()
+                data = self.start(fingerprint)
+            data['used'] = now
+            self.save(data)
+
+    def command(self, *args, notty=None):
+        data = self.load()
+        cmd = ['docker', 'exec', '-i']
+        if not (utils.notty() if notty is None else notty):
+            cmd.append('-t')
+        cmd += self.envopts()
+        cmd += [self.container] + data.get('entrypoint', [])
+        return cmd + (list(args) or data.get('command', []))
+
+    def stop(self):
+        self.unlink()
+        return self.remove(self.container)
+
+
+@runner('pool')
+class Pool(Managed, Docker):
+    """ Run app in a fresh container claimed from a pool of standby ones.
+
+        Containers are created (stopped) ahead of time from the resolved
+        service, with a shell wrapper as entrypoint that reads the command
+        line from a file in DIP_HOME mounted into the container. A run
+        writes its command line, starts a container attached and has the
+        pool refilled in the background; it falls back to `docker run`
+        when the pool is empty.
+
+        The pool holds `size` containers (a runner option, 2 by default)
+        and is emptied when the compose files, their ENV or the image
+        change; runs check the image ID before claiming a container.
+        Containers older than `ttl` seconds (one hour by default) are
+        replaced. The image must have /bin/sh.
+    """
+    OPTIONS = ('size', 'ttl')
+    SIZE = 2
+    TTL = 3600
+    LABEL = 'dip.pool'
+    MOUNT = '/.dip'
+    WRAPPER = 'eval "set -- $(cat {mount}/argv)" && exec "$@"'.format(
+        mount=MOUNT)
+    kind = 'pool'
+    compiled = False
+
+    def __init__(self, app):
+        super(Pool, self).__init__(app)
+        self.claimed = None
+
+    @property
+    def size(self):
+        """ Number of standby containers. """
+        return int(self.app.opts.get('size', self.SIZE))
+
+    @property
+    def ttl(self):
+        """ Seconds after which a standby container is replaced. """
+        return int(self.app.opts.get('ttl') or self.TTL)
+
+    def container(self, key):
+        """ Get name of standby container by key (or its prefix). """
+        return 'dip-{app}-{key}'.format(app=self.app.name, key=key or '')
+
+    def slot(self, container):
+        """ Get directory mounted into container. """
+        from dip import settings  # settings imports runners
+        return os.path.join(settings.HOME, 'pool', container)
+
+    def fresh(self, entry, now=None):
+        """ Whether a standby container is still young enough. """
+        now = time.time() if now is None else now
+        return now - entry.get('created', 0) < self.ttl
+
+    def prepare(self):
+        """ Claim a standby container for the current TTY mode. """
+        tty = not utils.notty()
+        fingerprint = self.fingerprint()
+
+        # Containers of an image pulled or built since are not claimed
+        data = self.load()
+        imageid = None
+        if data.get('containers') and data.get('ref'):
+            imageid = self.inspect('{{.Id}}', data['ref'])
+
+        with self.lock():
+            data = self.load()
+            pool = data.get('containers', [])
+            ready = [x for x in pool if x['tty'] == tty and self.fresh(x)]
+            if ready and data.get('fingerprint') == fingerprint \
+                    and imageid and data.get('image') == imageid:
+                self.claimed = ready.pop(0)['name']
+                pool.remove(next(x for x in pool
+                                 if x['name'] == self.claimed))
+            else:
+                ready = []
+            data['tty'] = tty
+            self.save(data)
+
+        # Refill unless the pool is still full
+        if len(ready) < self.size:
+            self.background()
+
+    def command(self, *args, notty=None):
+        if self.claimed is None:
+            return super(Pool, self).command(*args, notty=notty)
+        data = self.load()
+        argv = data.get('entrypoint', []) \
+            + (list(args) or data.get('command', []))
+        with open(os.path.join(self.slot(self.claimed), 'argv'), 'w') as fd:
+            fd.write(' '.join(shlex.quote(x) for x in argv))
+        return ['docker', 'start', '-a', '-i', self.claimed]
+
+    def create(self, tty, image):
+        """ Create a stopped standby container and return its name. """
+        opts, _, _, _ = self.resolve()
+        name = self.container(os.urandom(4).hex())
+        slot = self.slot(name)
+        os.makedirs(slot, exist_ok=True)
+        cmd = ['docker', 'create', '--rm', '-i']
+        if tty:
+            cmd.append('-t')
+        cmd += ['--name', name,
+                '-l', '{}={}'.format(self.LABEL, self.app.name),
+                '-v', '{}:{}:ro'.format(slot, self.MOUNT)]
+        cmd += opts + ['--entrypoint', '/bin/sh', image, '-c', self.WRAPPER]
+        proc = subprocess.run(cmd,
+                              stdout=subprocess.DEVNULL,
+                              stderr=subprocess.DEVNULL)
+        if proc.returncode:
+            shutil.rmtree(slot, ignore_errors=True)
+            raise errors.ContainerError(name)
+        return name
+
+    def discard(self, container):
+        """ Remove standby container and its directory. """
+        shutil.rmtree(self.slot(container), ignore_errors=True)
+        return self.remove(container)
+
+    def fill(self):
+        """ Replace stale standby containers and create missing ones.
+
+            Returns the number of containers created.
+        """
+        fingerprint = self.fingerprint()
+        _, entrypoint, image, command = self.resolve()
+        imageid = self.inspect('{{.Id}}', image)
+
+        # Entrypoint and command are those of the service, or of its image
+        if entrypoint is None:
+            entrypoint, default = self.defaults(image)
+            if command is None:
+                command = default
+
+        with self.lock():
+            data = self.load()
+            stale = data.get('fingerprint') != fingerprint \
+                or data.get('image') != imageid
+            now = time.time()
+            keep, drop = [], []
+            for entry in data.get('containers', []):
+                if stale or not self.fresh(entry, now):
+                    drop.append(entry)
+                else:
+                    keep.append(entry)
+            # Concurrent refills may have overfilled the pool
+            tty = data.get('tty', False)
+            ready = [x for x in keep if x['tty'] == tty]
+            drop += ready[self.size:]
+            keep = [x for x in keep if x not in drop]
+            missing = self.size - len(ready)
+            data.update(command=command or [],
+                        containers=keep,
+                        entrypoint=entrypoint or [],
+                        fingerprint=fingerprint,
+                        image=imageid,
+                        ref=image)
+            self.save(data)
+        for entry in drop:
+            self.discard(entry['name'])
+        self.sweep(keep)
+
+        # Create outside the lock so that runs can claim in the meantime
+        created = [{'name': self.create(tty, image),
+                    'created': time.time(),
+                    'tty': tty} for _ in range(max(missing, 0))]
+        if created:
+            with self.lock():
+                data = self.load()
+                data['containers'] = data.get('containers', []) + created
+                self.save(data)
+        return len(created)
+
+    def sweep(self, keep, age=60):
+        """ Remove directories left by containers that are gone.
+
+            Directories younger than age seconds may belong to containers
+            still being created and are kept.
+        """
+        prefix = self.container(None)
+        pooldir = os.path.dirname(self.slot(prefix))
+        names = {x['name'] for x in keep}
+        try:
+            entries = os.listdir(pooldir)
+        except (OSError, IOError):
+            return
+        now = time.time()
+        for name in entries:
+            slot = os.path.join(pooldir, name)
+            try:
+                young = now - os.stat(slot).st_mtime < age
+            except (OSError, IOError):
+                continue
+            if name.startswith(prefix) and name not in names and not young \
+                    and self.inspect('{{.Id}}', name) is None:
+                shutil.rmtree(slot, ignore_errors=True)
+
+    def pooled(self, container):
+        """ Whether container is a fresh standby container of the app. """
+        data = self.load()
+        if data.get('fingerprint') != self.fingerprint():
+            return False
+        return any(x['name'] == container and self.fresh(x)
+                   for x in data.get('containers', []))
+
+    def background(self):
+        """ Start `dip pool NAME` in a detached process. """
+        cmd = [sys.executable, '-m', 'dip.main', 'pool', self.app.name]
+        return subprocess.Popen(cmd,
+                                stdin=subprocess.DEVNULL,
+                                stdout=subprocess.DEVNULL,
+                                stderr=subprocess.DEVNULL,
+                                start_new_session=True)
+
+    def stop(self):
+        with self.lock():
+            data = self.load()
+            self.unlink()
+        removed = [self.discard(x['name'])
+                   for x in data.get('containers', [])]
+        return any(removed)
@@ -3,26 +3,63 @@
 dip contexts.
 """
 import contextlib
+import copy
+import hashlib
 import json
+import math
 import os
 import re
+import shlex
+import signal
 import subprocess
 import sys
+import threading
 import time
 try:
     from collections import abc as collections
 except ImportError:  # pragma: no cover
     import collections
 
-import compose.cli.command
-import compose.config
-import dotenv as dot_env
-import git as pygit
+from dip import daemon
 from dip import errors
+from dip import flight
+from dip import plans
+from dip import runners
+from dip import state
+from dip import storage
+from dip import trace
 from dip import utils
 
+# Heavy dependencies (compose, docker, dotenv, git) are imported where they
+# are used so that invoking an installed CLI stays cheap.
+# pylint: disable=import-outside-toplevel
+
 HOME = utils.dip_home('DIP_HOME')
 PATH = os.getenv('DIP_PATH') or '/usr/local/bin'
+RUNNER = os.getenv('DIP_RUNNER') or 'compose'
+FETCH_TIMEOUT = float(os.getenv('DIP_FETCH_TIMEOUT') or 0) or None
+
+# Seconds a git command that timed out gets to clean up before it is killed
+KILL_GRACE = 2
+
+# Failed fetches in a row before fetches of a remote are skipped, and the
+# first and longest number of seconds they are skipped for
+FAILURES = 3
+BACKOFF = 300
+BACKOFF_LIMIT = 3600
+STORAGE = os.getenv('DIP_STORAGE') or 'json'
+
+# Parsed dotenv files by path, with the (mtime, size) they were parsed at
+DOTENVS = {}
+
+# Git repos by path and thread, with the gitkey they were opened at
+REPOS = {}
+
+# Parsed compose configs and projects by home, with the projectkey they
+# were parsed at
+CONFIGS = {}
+PROJECTS = {}
+VARIABLE = re.compile(r'\$\{?([A-Za-z_][A-Za-z0-9_]*)')
 
 
 class Settings(collections.MutableMapping):
@@ -30,7 +67,9 @@ class Settings(collections.MutableMapping):
     # pylint: disable=super-init-not-called
     def __init__(self, *args, **kwargs):
         self.data = dict(*args, **kwargs)
-        self.filepath = os.path.join(HOME, 'settings.json')
+        self.filepath = storage.filepath(HOME, STORAGE)
+        self.loaded = None
+        self._storage = None
 
     def __str__(self):
         return utils.contractuser(self.filepath)
@@ -54,35 +93,51 @@ class Settings(collections.MutableMapping):
     def __len__(self):
         return len(self.data)
 
-    def install(self, name, home, path=None, env=None, git=None, dotenv=None):
+    def install(self, name, home, path=None, env=None, git=None, dotenv=None,
+                runner=None, opts=None):
         """ Install applicaton. """
         # pylint: disable=too-many-arguments
-        app = Dip(name, home, path, env, git, dotenv)
+        app = Dip(name, home, path, env, git, dotenv, runner, opts)
         try:
             app.install()
         finally:
             self[name] = app
         return app
 
-    def load(self, filepath=None):
-        """ Load settings. """
-        filepath = filepath or self.filepath
-        try:
-            with open(filepath) as settings:
-                self.data = json.loads(settings.read())
-        except (OSError, IOError):
-            self.save(filepath)
-        except ValueError:
-            raise errors.SettingsError(filepath)
+    @property
+    def storage(self):
+        """ Get storage backend of settings file. """
+        if self._storage is None or self._storage.filepath != self.filepath:
+            self._storage = storage.get(self.filepath)
+        return self._storage
+
+    def load(self, filepath=None, name=None):
+        """ Load settings, or only those of app name. """
+        self.filepath = filepath or self.filepath
+        if name is None:
+            self.data = self.storage.read()
+        else:
+            config = self.storage.readapp(name)
+            self.data = {} if config is None else {name: config}
+        self.loaded = copy.deepcopy(self.data)
 
     def save(self, filepath=None):
-        """ Save settings. """
-        filepath = filepath or self.filepath
-        try:
-            with open(filepath, 'w') as settings:
-                settings.write(json.dumps(self.data, indent=4, sort_keys=True))
-        except (OSError, IOError, ValueError):
-            raise errors.SettingsError(filepath)
+        """ Save settings.
+
+            Only apps changed since loading are written.
+        """
+        if filepath and filepath != self.filepath:
+            return storage.get(filepath).write(self.data)
+        self.storage.write(self.data, self.loaded)
+        self.loaded = copy.deepcopy(self.data)
+        return None
+
+    @contextlib.contextmanager
+    def lock(self, filepath=None):
+        """ Hold exclusive write access to settings. """
+        self.filepath = filepath or self.filepath
+        with self.storage.lock():
+            yield self
 
     def uninstall(self, name):
         """ Uninstall applicaton. """
@@ -94,7 +149,8 @@ class Settings(collections.MutableMapping):
 class Dip(collections.Mapping):
     """ Dip app. """
     # pylint: disable=super-init-not-called
-    def __init__(self, name, home, path=None, env=None, git=None, dotenv=None):
+    def __init__(self, name, home, path=None, env=None, git=None, dotenv=None,
+                 runner=None, opts=None):
         # pylint: disable=too-many-arguments
         self.name = str(name)
         self.home = str(home)
@@ -102,6 +158,11 @@ class Dip(collections.Mapping):
         self.env = {k: v for k, v in (env or {}).items() if v}
         self.git = {k: v for k, v in (git or {}).items() if v}
         self.dotenv = dotenv
+        self.runner = runner
+        self.opts = {k: v for k, v in (opts or {}).items() if v is not None}
+
+        # Why the last remote check used the remote as last fetched, if so
+        self.stale = None
 
     def __str__(self):
         return self.name
@@ -126,22 +187,50 @@ class Dip(collections.Mapping):
             yield 'git'
         if self.dotenv:
             yield 'dotenv'
+        if self.runner:
+            yield 'runner'
+        if self.opts:
+            yield 'opts'
 
     def __len__(self):
-        return 3 + bool(self.env) + bool(self.git)
+        return 3 + bool(self.env) + bool(self.git) + bool(self.dotenv) \
+            + bool(self.runner) + bool(self.opts)
 
     @property
     def auto_upgrade(self):
         """ Get auto-upgrade True/False value. """
         return self.git.get('auto_upgrade')
 
+    @property
+    def check_interval(self):
+        """ Get number of seconds to reuse a remote check. """
+        return self.git.get('check_interval') or 0
+
+    @property
+    def fetch_timeout(self):
+        """ Get number of seconds a fetch of the remote may take, if bounded.
+        """
+        return self.git.get('fetch_timeout') or FETCH_TIMEOUT
+
     @property
     def definitions(self):
         """ Get compose file contents as string. """
+        import compose.config
         for cfg in compose.config.config.get_default_config_files(self.home):
             with open(cfg) as compose_file:
                 yield compose_file.read()
 
+    @property
+    def backend(self):
+        """ Get container runner (app runner or DIP_RUNNER). """
+        return runners.get(self.runner or RUNNER, self)
+
+    @property
+    def tracking(self):
+        """ Get tracked remote/branch name. """
+        remote = [self.git.get('remote'), self.git.get('branch')]
+        return '/'.join(x for x in remote if x)
+
     @property
     def repo(self):
         """ Get git repository object. """
@@ -149,13 +238,24 @@ class Dip(collections.Mapping):
         if remote:
             branch = self.git.get('branch')
             sleep = self.git.get('sleep')
-            return Repo(self.home, remote, branch, sleep)
+            check = self.git.get('check')
+            return Repo(self.home, remote, branch, sleep, check,
+                        self.fetch_timeout)
         return None
 
+    @property
+    def config(self):
+        """ Get compose project name and config.
+
+            The config is loaded without contacting the Docker daemon.
+        """
+        return parsed(CONFIGS, self.home, runners.resolve)
+
     @property
     def project(self):
-        """ Get docker-compose project object. """
-        return compose.cli.command.get_project(self.home)
+        """ Get docker-compose project object (connected to the daemon). """
+        import compose.cli.command
+        return parsed(PROJECTS, self.home, compose.cli.command.get_project)
 
     @property
     def service(self):
@@ -169,57 +269,203 @@ class Dip(collections.Mapping):
 
     def diff(self, quiet=False):
         """ Diff remote configuration. """
-        return self.repo and any(self.repo.diffs(quiet))
+        repo = self.repo
+        if not repo:
+            return repo
+
+        # Reuse the last check of this remote while it is still fresh, or
+        # without a check interval, while `dip sync --daemon` keeps it fresh
+        with state.load(self.name, HOME) as app_state:
+            check = app_state.lastcheck(self.tracking) or {}
+            diff = None
+            if self.check_interval or check.get('ttl'):
+                diff = app_state.getcheck(self.tracking, repo.head,
+                                          self.check_interval)
+
+        # Cached divergence is still shown, against the remote as last fetched
+        if diff and not quiet:
+            list(repo.diffs(quiet, fetch=False))
+        if diff is None and not self.check_interval:
+            diff = any(self.diffs(repo, quiet))
+        elif diff is None:
+            diff = self.sync(quiet)
+        return diff
+
+    def compile(self):
+        """ Write run plan used by the executable's fast path. """
+        if os.path.exists(os.path.join(self.path, self.name)):
+            return plans.write(self, HOME)
+        return None
 
     def install(self):
-        """ Write executable. """
+        """ Write executable.
+
+            The executable runs the app's precompiled plan when it is still
+            valid, hands the run to `dip daemon` when it is up and falls
+            back to `dip run` otherwise.
+        """
         fullpath = os.path.join(self.path, self.name)
         hashbang = "#!/bin/bash"
-        command = "dip run {self} -- $@\n".format(self=self)
+        plan = "plan={}".format(shlex.quote(plans.path(self.name, HOME)))
+        fastpath = '[ -r "$plan" ] && . "$plan" && dip_plan "$@"'
+        sock = "sock={}".format(shlex.quote(daemon.address(HOME)))
+        warmpath = '[ -S "$sock" ] && command -v dip-client >/dev/null && '\
+            'exec dip-client "$sock" {self} "$@"'.format(self=self)
+        command = 'exec dip run {self} -- "$@"\n'.format(self=self)
+        lines = [hashbang, plan, fastpath, sock, warmpath, command]
         with open(fullpath, 'w') as exe:
-            exe.write("\n".join([hashbang, command]))
+            exe.write("\n".join(lines))
         os.chmod(fullpath, 0o755)
 
-    def run(self, *args):
-        """ Run app. """
-        # Build CMD
-        cmd = ['docker-compose', 'run', '--rm']
-        if utils.notty():
-            cmd.append('-T')
-
-        # Get options for docker-compose
-        cmd += [x for i in self.env.items() for x in ['-e', '='.join(i)]]
-
-        # Call docker-compose run --rm <args> <svc> $*
-        with indir(self.home):
-
-            # Source .env file
-            if self.dotenv:
-                dot_env.load_dotenv(self.dotenv)
-
-            return subprocess.call(cmd + [self.name] + list(args),
+    def run(self, *args, replace=False):
+        """ Run app.
+
+            With replace, the current process is replaced by the runner
+            (so nothing is left waiting on the container) instead of
+            waiting for it and returning its exit code.
+        """
+        # Call <runner> <args> <svc> $*
+        env = self.environ()
+        backend = self.backend
+        with trace.span('prepare', app=self.name):
+            backend.prepare()
+        with trace.span('command', app=self.name):
+            cmd = backend.command(*args)
+
+        # Traced runs wait for the container to record its runtime
+        if replace and not trace.enabled():
+            sys.stdout.flush()
+            sys.stderr.flush()
+
+            # Nothing else runs in this process once it is replaced
+            os.chdir(self.home)
+            return os.execvpe(cmd[0], cmd, env)
+        with trace.span('container', app=self.name, runner=backend.name):
+            return subprocess.call(cmd,
+                                   cwd=self.home,
+                                   env=env,
                                    stdout=sys.stdout,
                                    stderr=sys.stderr,
                                    stdin=sys.stdin)
 
+    def environ(self):
+        """ Get ENV for the runner.
+
+            The app's defaults are added to a copy of the current ENV
+            without overriding it; the ENV of dip itself is left untouched.
+        """
+        env = dict(os.environ)
+        for key, val in self.defaults().items():
+            env.setdefault(key, val)
+        return env
+
+    def defaults(self):
+        """ Get ENV values of the app's dotenv file, overridden by its env. """
+        env = {}
+        if self.dotenv:
+            with trace.span('dotenv', app=self.name):
+                env.update(readenv(os.path.join(self.home, self.dotenv)))
+        env.update(self.env)
+        return env
+
+    def sync(self, quiet=True, ttl=None):
+        """ Check remote and record the result in app state.
+
+            Pass ttl when the remote is checked again within ttl seconds,
+            so runs without a check interval reuse the result until then.
+        """
+        repo = self.repo
+        if not repo:
+            return None
+        head = repo.head
+        diff = any(self.diffs(repo, quiet))
+
+        # Stale results are not reused as remote checks
+        if self.stale:
+            return diff
+        with state.saveonexit(self.name, HOME) as app_state:
+            app_state.setcheck(self.tracking, head, diff, ttl)
+        plans.refresh(self.name, HOME, diff, self.check_interval)
+        return diff
+
+    def diffs(self, repo, quiet=False):
+        """ Fetch remote and diff compose files against it (see Repo.diffs).
+
+            When the fetch times out, or fetches of the remote are backing
+            off after failing repeatedly, files are compared with the remote
+            as last fetched and the reason is kept in self.stale.
+        """
+        self.stale = None
+        remote = self.tracking
+        with state.load(self.name, HOME) as app_state:
+            wait = app_state.backoff(remote)
+            failing = remote in app_state.get('breakers', {})
+        if wait:
+            wait = utils.since(math.ceil(wait))
+            self.stale = "Skipped fetching remote '{remote}' for {wait} "\
+                "after repeated failures".format(remote=repo.remotename,
+                                                 wait=wait)
+            return repo.diffs(quiet, fetch=False)
+
+        # Failures trip the breaker, successes reset it. Only the process
+        # that ran a coalesced fetch counts it; the others reuse its outcome
+        try:
+            with trace.span('fetch', remote=repo.remotename):
+                fetched = repo.fetch()
+        except errors.GitFetchError as err:
+            if not getattr(err, 'shared', False):
+                with state.saveonexit(self.name, HOME) as app_state:
+                    app_state.setfailure(remote, FAILURES, BACKOFF,
+                                         BACKOFF_LIMIT)
+            if not isinstance(err, errors.GitFetchTimeout):
+                raise
+            self.stale = str(err)
+        else:
+            if failing and fetched:
+                with state.saveonexit(self.name, HOME) as app_state:
+                    app_state.setsuccess(remote)
+        return repo.diffs(quiet, fetch=False)
+
     def uninstall(self):
         """ Uninstall executable and bring down network. """
+        import compose.config
         try:
             os.remove(os.path.join(self.path, self.name))
         except (OSError, IOError):
             pass
+        plans.remove(self.name, HOME)
+        self.backend.stop()
         try:
             self.project.networks.remove()
         except compose.config.errors.ConfigurationError:
             pass
 
     def validate(self, skipgit=False):
-        """ Validate git repo and compose project. """
-        if not skipgit and self.repo:
+        """ Validate git repo, compose config and runner options.
+
+            Only the compose config is loaded, so the Docker daemon is not
+            contacted. The git repo and compose config are only checked
+            again once the git metadata or the compose files and the ENV
+            they use have changed since they were last found valid.
+        """
+        for key in sorted(self.opts):
+            if key not in self.backend.OPTIONS:
+                raise errors.NoSuchRunnerOptionError(self.backend.name, key)
+
+        with state.load(self.name, HOME) as app_state:
+            checked = {'git': gitkey(self.home) if self.repo else None,
+                       'compose': projectkey(self.home)}
+            valid = {x for x, y in checked.items()
+                     if app_state.getvalid(x, y)}
+
+        # Heavy imports are left out when both are still valid
+        if not skipgit and self.repo and 'git' not in valid:
             # pylint: disable=no-member
+            import git as pygit
             try:
-                assert self.repo.repo
-                assert self.repo.remote
+                with trace.span('validate.git', app=self.name):
+                    assert self.repo.repo
+                    assert self.repo.remote
             except pygit.exc.NoSuchPathError:
                 raise errors.NoSuchPathError(self.home)
             except pygit.exc.InvalidGitRepositoryError:
@@ -227,22 +473,37 @@ class Dip(collections.Mapping):
             except ValueError:
                 raise errors.NoSuchRemoteError(self.repo.remotename)
 
-        try:
-            assert self.project
-            assert self.service
-        except compose.config.errors.ComposeFileNotFound:
-            raise errors.ComposeFileNotFound(self.home)
-        except compose.project.NoSuchService:
-            raise errors.NoSuchService(self.name)
+        if 'compose' not in valid:
+            import compose.config
+            try:
+                with trace.span('validate.compose', app=self.name):
+                    _, config = self.config
+                    runners.findservice(config, self.name)
+            except compose.config.errors.ComposeFileNotFound:
+                raise errors.ComposeFileNotFound(self.home)
+
+        # Record what was checked in this call
+        if skipgit:
+            checked.pop('git')
+        fresh = {x: y for x, y in checked.items()
+                 if y is not None and x not in valid}
+        if fresh:
+            with state.saveonexit(self.name, HOME) as app_state:
+                for part, key in fresh.items():
+                    app_state.setvalid(part, key)
 
 
 class Repo:
     """ Git repository for dip app. """
-    def __init__(self, path, remote=None, branch=None, sleep=None):
+    # pylint: disable=too-many-arguments
+    def __init__(self, path, remote=None, branch=None, sleep=None,
+                 check=None, timeout=None):
         self.path = os.path.abspath(path)
         self._remote = remote
         self._branch = branch
         self._sleep = sleep
+        self._check = check
+        self.timeout = timeout
 
     def __str__(self):
         return self.path
@@ -257,11 +518,26 @@ class Repo:
             yield 'branch', self._branch
         if self._sleep:
             yield 'sleep', self._sleep
+        if self._check:
+            yield 'check', self._check
 
     @property
     def repo(self):
-        """ Git repo object. """
-        return pygit.Repo(self.path, search_parent_directories=True)
+        """ Git repo object.
+
+            Repos are reused (within a thread) until the HEAD or config of
+            the repository changes.
+        """
+        import git as pygit
+        key = gitkey(self.path)
+        ident = (self.path, threading.get_ident())
+        cached = REPOS.get(ident)
+        if key is None or cached is None or cached[0] != key:
+            cached = (key, pygit.Repo(self.path,
+                                      search_parent_directories=True))
+            if key is not None:
+                REPOS[ident] = cached
+        return cached[1]
 
     @property
     def remote(self):
@@ -271,6 +547,15 @@ class Repo:
         except ValueError:
             raise ValueError(self._remote)
 
+    @property
+    def head(self):
+        """ Hex SHA of checked-out commit.
+
+            Read from the files under .git (see githead) where possible, so
+            cached remote checks are looked up without importing GitPython.
+        """
+        return githead(self.path) or self.repo.head.commit.hexsha
+
     @property
     def remotename(self):
         """ Name of remote. """
@@ -281,50 +566,319 @@ class Repo:
         """ Git branch name. """
         return self._branch or self.repo.active_branch.name
 
+    @property
+    def check(self):
+        """ Strategy used to check remote for changes. """
+        return self._check or 'fetch'
+
     @property
     def sleeptime(self):
         """ Time to sleep. """
         return self._sleep or 0
 
-    def diffs(self, quiet=False):
-        """ Echo diff output and sleep. """
+    def diffs(self, quiet=False, fetch=True):
+        """ Yield 1 for each compose file that differs from the remote.
+
+            Blob IDs of the remote and working-tree versions are compared
+            in-process; `git diff` is only spawned to show the output of
+            files that actually differ. Without fetch, files are compared
+            with the remote as last fetched.
+        """
+        import compose.config
+        import git as pygit
+
         # Fetch remote
+        if fetch:
+            with trace.span('fetch', remote=self.remotename):
+                self.fetch()
+
+        # Get remote tree
+        repo = self.repo
+        ref = "{remote}/{branch}".format(remote=self.remotename,
+                                         branch=self.branch)
+        try:
+            tree = repo.commit(ref).tree
+        except (pygit.exc.BadName, ValueError):
+            tree = None
+
+        # Iterate through docker-compose configurations
+        paths = compose.config.config.get_default_config_files(self.path)
+        for loc in paths:
+            rel = os.path.relpath(loc, repo.working_dir)
+            try:
+                diff = (tree / rel).hexsha != blobid(loc)
+            except (KeyError, TypeError):
+                diff = True
+
+            # Show diff output
+            if diff and not quiet:
+                rem = "{ref}:{rel}".format(ref=ref, rel=rel)
+                with trace.span('diff', file=rel):
+                    subprocess.call(['git', 'diff', rem, loc], cwd=self.path)
+            yield int(diff)
+
+    def fetch(self):
+        """ Fetch remote, coalescing concurrent fetches across processes.
+
+            Every app tracking this repository and remote shares one lock
+            file in the git directory, so a burst of invocations results in
+            a single fetch whose outcome the others wait for and reuse.
+
+            Returns whether this process contacted the remote, rather than
+            reusing the outcome of a concurrent fetch. Raises GitFetchTimeout
+            once the timeout of the repo has passed; errors reused from a
+            concurrent fetch are marked as shared.
+        """
+        import git as pygit
+        deadline = None
+        if self.timeout:
+            deadline = time.monotonic() + self.timeout
+
+        # Skip fetch if remote branch has not moved
+        if self.check == 'ls-remote' and not self.moved(deadline):
+            return True
+
+        def fetch():
+            try:
+                self.output('fetch', '--quiet', remote.name,
+                            timeout=remaining(deadline))
+            except subprocess.TimeoutExpired:
+                raise errors.GitFetchTimeout(self.remotename, self.timeout)
+            except subprocess.CalledProcessError:
+                raise errors.GitFetchError(self.remotename)
+
         # pylint: disable=no-member
         try:
-            self.remote.fetch()
+            remote = self.remote
+            lockname = remote.name.replace('/', '-')
+            lockpath = os.path.join(self.repo.git_dir,
+                                    'dip-fetch-{}.lock'.format(lockname))
+            outcome = flight.call(lockpath, fetch)
         except pygit.exc.GitCommandError:
             raise errors.GitFetchError(self.remotename)
+        err = None
+        if outcome.get('kind') == errors.GitFetchTimeout.__name__:
+            err = errors.GitFetchTimeout(self.remotename, self.timeout)
+        elif outcome['error']:
+            err = errors.GitFetchError(self.remotename)
+        if err is not None:
+            err.shared = outcome.get('shared', False)
+            raise err
+        return not outcome.get('shared')
+
+    def moved(self, deadline=None):
+        """ Look up remote branch head and compare with local remote ref.
+
+            Only the advertised head of the tracked branch is transferred,
+            which is much cheaper than negotiating a fetch. Any failure
+            (including running past deadline) is treated as movement so that
+            the fetch reports it.
+        """
+        import git as pygit
 
-        # Move inside git directory
-        paths = compose.config.config.get_default_config_files(self.path)
-        # Iterate through docker-compose configurations
-        for loc in paths:
-            exp = r"^({dir})?/".format(dir=self.repo.working_dir)
-            rel = re.sub(exp, '', loc)
-            rem = "{remote}/{branch}:{rel}".format(remote=self.remote.name,
-                                                   branch=self.branch,
-                                                   rel=rel)
-            # Yield diff exit code
-            cmd = ['git', 'diff', '--exit-code', rem, loc]
-            with indir(self.path):
-                if quiet:
-                    with devnull() as null:
-                        yield subprocess.call(cmd, stderr=null, stdout=null)
-                else:
-                    yield subprocess.call(cmd)
-
-    def pull(self):
-        """ Pull from remote. """
+        # pylint: disable=no-member
+        repo = self.repo
+        ref = "{remote}/{branch}".format(remote=self.remotename,
+                                         branch=self.branch)
+        try:
+            heads = self.output('ls-remote', self.remotename,
+                                'refs/heads/{}'.format(self.branch),
+                                timeout=remaining(deadline))
+            local = repo.commit(ref).hexsha
+        except (subprocess.SubprocessError, pygit.exc.BadName, ValueError):
+            return True
+        return local not in [x.split()[0] for x in heads.splitlines()]
+
+    def output(self, *args, timeout=None):
+        """ Get output of git command.
+
+            The command runs in a process group of its own so that it can
+            be stopped along with its helpers (ssh, remote-https) once
+            timeout seconds have passed, which raises TimeoutExpired. It is
+            sent SIGTERM first so that git can remove its lock files, and
+            only killed if it has not exited KILL_GRACE seconds later.
+        """
+        if timeout is not None and timeout <= 0:
+            raise subprocess.TimeoutExpired(['git'] + list(args), timeout)
+        proc = subprocess.Popen(['git'] + list(args),
+                                cwd=self.path,
+                                stdin=subprocess.DEVNULL,
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL,
+                                start_new_session=True)
+        try:
+            out, _ = proc.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            stop(proc, KILL_GRACE)
+            raise
+        if proc.returncode:
+            raise subprocess.CalledProcessError(proc.returncode, proc.args)
+        return out.decode('utf8')
+
+    def pull(self, quiet=False):
+        """ Pull from remote and return the exit code of `git pull`. """
         # Pull remote
-        with indir(self.path):
-            cmd = ['git', 'pull', self.remotename, self.branch]
-            subprocess.call(cmd)
+        cmd = ['git', 'pull', self.remotename, self.branch]
+        if quiet:
+            return subprocess.call(cmd,
+                                   cwd=self.path,
+                                   stdout=subprocess.DEVNULL,
+                                   stderr=subprocess.DEVNULL)
+        return subprocess.call(cmd, cwd=self.path)
 
     def sleep(self):
         """ Sleep. """
         time.sleep(self.sleeptime)
 
 
+def stop(proc, grace):
+    """ Terminate process group of proc, and kill it after grace seconds. """
+    for sig, timeout in [(signal.SIGTERM, grace), (signal.SIGKILL, None)]:
+        try:
+            os.killpg(proc.pid, sig)
+        except ProcessLookupError:
+            pass
+        try:
+            proc.communicate(timeout=timeout)
+            return
+        except subprocess.TimeoutExpired:
+            continue
+
+
+def blobid(path):
+    """ Get git blob ID of a file in the working tree. """
+    with open(path, 'rb') as blob:
+        data = blob.read()
+    header = "blob {size}\0".format(size=len(data)).encode('utf8')
+    return hashlib.sha1(header + data).hexdigest()
+
+
+def gitroot(path):
+    """ Get working tree of the git repo containing path, or None. """
+    path = os.path.abspath(path)
+    if not os.path.isdir(path):
+        return None
+    while not os.path.exists(os.path.join(path, '.git')):
+        if os.path.dirname(path) == path:
+            return None
+        path = os.path.dirname(path)
+    return path
+
+
+def gitkey(path):
+    """ Get digest of the HEAD and config of the git repo containing path.
+
+        Returns None when there is no such repo.
+    """
+    root = gitroot(path)
+    if root is None:
+        return None
+    gitdir = os.path.join(root, '.git')
+    digest = hashlib.sha1(gitdir.encode('utf8'))
+    for name in ['HEAD', 'config']:
+        try:
+            with open(os.path.join(gitdir, name), 'rb') as stream:
+                digest.update(b'\0' + stream.read())
+        except (OSError, IOError):
+            return None
+    return digest.hexdigest()
+
+
+def githead(path):
+    """ Get hex SHA of the commit checked out in the git repo containing path.
+
+        Returns None when HEAD cannot be resolved from the loose or packed
+        refs of the repo.
+    """
+    root = gitroot(path)
+    if root is None:
+        return None
+    gitdir = os.path.join(root, '.git')
+    try:
+        with open(os.path.join(gitdir, 'HEAD')) as stream:
+            head = stream.read().strip()
+        if not head.startswith('ref: '):
+            return head or None
+        ref = head[len('ref: '):]
+        try:
+            with open(os.path.join(gitdir, ref)) as stream:
+                return stream.read().strip() or None
+        except FileNotFoundError:
+            pass
+        with open(os.path.join(gitdir, 'packed-refs')) as stream:
+            for line in stream:
+                sha, _, name = line.strip().partition(' ')
+                if name == ref:
+                    return sha
+    except (OSError, IOError):
+        pass
+    return None
+
+
+def projectkey(home):
+    """ Get digest of the compose files of home and the ENV they use.
+
+        Returns None when the project cannot be keyed by its files, ie.
+        there are no compose files or COMPOSE_FILE names them instead.
+    """
+    if 'COMPOSE_FILE' in os.environ:
+        return None
+    paths = utils.composefiles(home)
+    if not paths:
+        return None
+    digest = hashlib.sha1()
+    names = set()
+    dirs = sorted({os.path.dirname(x) for x in paths} | {home})
+    for path in paths + [os.path.join(x, '.env') for x in dirs]:
+        try:
+            with open(path, 'rb') as stream:
+                data = stream.read()
+        except (OSError, IOError):
+            continue
+        digest.update(path.encode('utf8') + b'\0' + data + b'\0')
+        names.update(VARIABLE.findall(data.decode('utf8', 'replace')))
+    env = {k: v for k, v in os.environ.items()
+           if k in names or k.startswith(('COMPOSE_', 'DOCKER_'))}
+    digest.update(json.dumps(env, sort_keys=True).encode('utf8'))
+    return digest.hexdigest()
+
+
+def parsed(cache, home, load):
+    """ Get load(home), reused from cache until the projectkey changes.
+
+        Results are shared by apps installed from the same home.
+    """
+    key = projectkey(home)
+    cached = cache.get(home)
+    if key is None or cached is None or cached[0] != key:
+        cached = (key, load(home))
+        if key is not None:
+            cache[home] = cached
+    return cached[1]
+
+
+def remaining(deadline):
+    """ Get seconds left until deadline (a time.monotonic value), if any. """
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def readenv(filepath):
+    """ Get values of dotenv file, parsing it only when it has changed. """
+    try:
+        stat = os.stat(filepath)
+        key = (stat.st_mtime_ns, stat.st_size)
+    except (OSError, IOError):
+        key = None
+    cached = DOTENVS.get(filepath)
+    if key is None or cached is None or cached[0] != key:
+        import dotenv as dot_env
+        values = dot_env.dotenv_values(filepath)
+        cached = (key, {k: v for k, v in values.items() if v is not None})
+        if key is not None:
+            DOTENVS[filepath] = cached
+    return dict(cached[1])
+
+
 @contextlib.contextmanager
 def devnull():
     """ Helper to yield /dev/null file pointer. """
@@ -333,26 +887,23 @@ def devnull():
 
 
 @contextlib.contextmanager
-def indir(path):
-    """ Helper to execute git commands in the git project's home. """
-    curdir = os.path.abspath(os.path.curdir)
-    os.chdir(path)
-    yield
-    os.chdir(curdir)
-
-
-@contextlib.contextmanager
-def load(filename=None):
+def load(filename=None, name=None):
     """ Yield read-only settings. """
     settings = Settings()
-    settings.load(filename)
+    with trace.span('settings', app=name):
+        settings.load(filename, name)
     yield settings
 
 
 @contextlib.contextmanager
 def saveonexit(filename=None):
-    """ Yield read-only settings. """
-    with load(filename) as settings:
+    """ Yield settings, saved on exit.
+
+        Writers are serialized from load to save so that concurrent
+        installs do not lose each other's changes.
+    """
+    with Settings().lock(filename) as settings:
+        settings.load()
         yield settings
         settings.save()
 
@@ -360,7 +911,7 @@ def saveonexit(filename=None):
 @contextlib.contextmanager
 def getapp(name, filename=None, skipgit=False):
     """ Yield read-only settings. """
-    with load(filename) as settings:
+    with load(filename, name) as settings:
         try:
             app = settings[name]
         except KeyError:
@@ -379,8 +930,4 @@ def diffapp(name, filename=None, quiet=False):
 
 def reset(filepath=None):
     """ Remove settings. """
-    filepath = filepath or os.path.join(HOME, 'settings.json')
-    try:
-        os.remove(filepath)
-    except (OSError, IOError):
-        raise errors.SettingsError(filepath)
+    storage.get(filepath or storage.filepath(HOME, STORAGE)).remove()
@@ -0,0 +1,155 @@
+"""
+dip app state persisted between invocations.
+"""
+import contextlib
+import json
+import os
+import tempfile
+import time
+try:
+    from collections import abc as collections
+except ImportError:  # pragma: no cover
+    import collections
+
+from dip import utils
+
+
+class State(collections.MutableMapping):
+    """ Dip app runtime state. """
+    # pylint: disable=super-init-not-called
+    def __init__(self, name, home):
+        self.name = str(name)
+        self.data = {}
+        self.filepath = os.path.join(home, 'state', '{}.json'.format(name))
+
+    def __str__(self):
+        return self.filepath
+
+    def __repr__(self):
+        return "State({self})".format(self=self)
+
+    def __delitem__(self, key):
+        del self.data[key]
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __setitem__(self, key, item):
+        self.data[key] = item
+
+    def __iter__(self):
+        for key in self.data:
+            yield key
+
+    def __len__(self):
+        return len(self.data)
+
+    def getcheck(self, remote, head, interval, now=None):
+        """ Get cached remote check result if still fresh.
+
+            Without an interval, a check is fresh for the ttl it was
+            recorded with, if any.
+        """
+        check = self.get('checks', {}).get(remote)
+        now = time.time() if now is None else now
+        try:
+            interval = interval or check['ttl']
+            if check['head'] == head and now - check['time'] < interval:
+                return check['diff']
+        except (KeyError, TypeError):
+            pass
+        return None
+
+    def lastcheck(self, remote):
+        """ Get last recorded remote check, regardless of its age. """
+        check = self.get('checks', {}).get(remote)
+        return check if isinstance(check, dict) else None
+
+    def setcheck(self, remote, head, diff, ttl=None, now=None):
+        """ Record remote check result.
+
+            A ttl is the time within which the caller promises to check
+            again (eg. `dip sync --daemon`).
+        """
+        checks = self.setdefault('checks', {})
+        checks[remote] = {'diff': bool(diff),
+                          'head': head,
+                          'time': time.time() if now is None else now}
+        if ttl:
+            checks[remote]['ttl'] = ttl
+
+    def backoff(self, remote, now=None):
+        """ Get seconds left before fetching remote again, if backing off. """
+        breaker = self.get('breakers', {}).get(remote)
+        now = time.time() if now is None else now
+        try:
+            if breaker['until'] > now:
+                return breaker['until'] - now
+        except (KeyError, TypeError):
+            pass
+        return None
+
+    def setfailure(self, remote, threshold, backoff, limit, now=None):
+        """ Record failed fetch of remote.
+
+            Once threshold fetches in a row have failed, fetches are skipped
+            for backoff seconds, doubling with each further failure up to
+            limit seconds.
+        """
+        now = time.time() if now is None else now
+        breakers = self.setdefault('breakers', {})
+        breaker = breakers.get(remote)
+        failures = (breaker['failures'] if isinstance(breaker, dict) else 0)
+        failures += 1
+        until = None
+        if failures >= threshold:
+            until = now + min(backoff * 2 ** (failures - threshold), limit)
+        breakers[remote] = {'failures': failures, 'until': until}
+
+    def setsuccess(self, remote):
+        """ Record successful fetch of remote, resetting its breaker. """
+        return self.get('breakers', {}).pop(remote, None) is not None
+
+    def getvalid(self, part, key):
+        """ Whether part of the app was last found valid at key. """
+        return key is not None and self.get('valid', {}).get(part) == key
+
+    def setvalid(self, part, key):
+        """ Record that part of the app was found valid at key. """
+        self.setdefault('valid', {})[part] = key
+
+    def load(self):
+        """ Load state, ignoring missing or corrupt files. """
+        try:
+            with open(self.filepath) as state:
+                self.data = json.loads(state.read())
+        except (OSError, IOError, ValueError):
+            self.data = {}
+
+    def save(self):
+        """ Save state atomically, ignoring unwritable homes. """
+        dirname = os.path.dirname(self.filepath)
+        try:
+            os.makedirs(dirname, exist_ok=True)
+            with tempfile.NamedTemporaryFile('w', dir=dirname,
+                                             delete=False) as tmp:
+                tmp.write(json.dumps(self.data, indent=4, sort_keys=True))
+            utils.replace(tmp.name, self.filepath)
+        except (OSError, IOError):
+            pass
+
+
+@contextlib.contextmanager
+def load(name, home):
+    """ Yield app state. """
+    state = State(name, home)
+    state.load()
+    yield state
+
+
+@contextlib.contextmanager
+def saveonexit(name, home):
+    """ Yield app state and save it on exit. """
+    with load(name, home) as state:
+        yield state
+        state.save()
@@ -0,0 +1,298 @@
+"""
+Settings storage backends.
+
+Settings are stored as one config dict per installed app, keyed by name.
+Writes are given the data as it was loaded so that only changed apps are
+written, on top of whatever other processes saved in the meantime.
+"""
+import contextlib
+import copy
+import json
+import os
+import subprocess
+import tempfile
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None     # pragma: no cover
+
+from dip import errors
+from dip import utils
+
+# pylint: disable=import-outside-toplevel
+
+STORAGES = {}
+
+# Parsed JSON settings files by path, with the stat key they were read at
+READS = {}
+
+
+def storage(name, extension):
+    """ Register storage class by name and settings file extension. """
+    def wrapper(cls):
+        cls.name = name
+        cls.extension = extension
+        STORAGES[name] = cls
+        return cls
+    return wrapper
+
+
+def filepath(home, name):
+    """ Get path to settings file of storage in home. """
+    try:
+        return os.path.join(home, 'settings' + STORAGES[name].extension)
+    except KeyError:
+        raise errors.NoSuchStorageError(name)
+
+
+def get(path):
+    """ Get storage for settings file, by extension. """
+    for cls in STORAGES.values():
+        if path.endswith(cls.extension):
+            return cls(path)
+    return Json(path)
+
+
+def changes(data, before=None):
+    """ Get apps updated and names of apps removed since before. """
+    before = before or {}
+    updated = {k: v for k, v in data.items() if before.get(k) != v}
+    removed = sorted(set(before) - set(data))
+    return updated, removed
+
+
+class Storage:
+    """ Base settings storage. """
+    name = None
+    extension = None
+
+    def __init__(self, path):
+        self.filepath = path
+
+    def __str__(self):
+        return self.filepath
+
+    def __repr__(self):
+        return "{cls}({self})".format(cls=type(self).__name__, self=self)
+
+    def read(self):
+        """ Read config of all apps. """
+        raise NotImplementedError
+
+    def readapp(self, name):
+        """ Read config of a single app, or None if it is not installed. """
+        return self.read().get(name)
+
+    def write(self, data, before=None):
+        """ Write config of all apps.
+
+            Given the data as it was read, only apps changed since then are
+            written; apps saved by others in the meantime are kept.
+        """
+        raise NotImplementedError
+
+    @contextlib.contextmanager
+    def lock(self):
+        """ Hold exclusive write access to settings. """
+        raise NotImplementedError
+
+    def edit(self, editor):
+        """ Edit settings with editor. """
+        subprocess.call([editor, self.filepath])
+
+    def remove(self):
+        """ Remove settings. """
+        try:
+            os.remove(self.filepath)
+        except (OSError, IOError):
+            raise errors.SettingsError(self.filepath)
+
+
+@storage('json', '.json')
+class Json(Storage):
+    """ Settings stored in a single JSON file.
+
+        The parsed file is kept until the file changes (it is only ever
+        replaced), so a long-lived process reads it once.
+    """
+    def read(self):
+        return copy.deepcopy(self.parsed())
+
+    def readapp(self, name):
+        return copy.deepcopy(self.parsed().get(name))
+
+    def parsed(self):
+        """ Get parsed settings, shared between reads; do not modify. """
+        try:
+            stat = os.stat(self.filepath)
+            key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            cached = READS.get(self.filepath)
+            if cached is not None and cached[0] == key:
+                return cached[1]
+            with open(self.filepath) as stream:
+                data = json.loads(stream.read())
+        except FileNotFoundError:
+            return {}
+        except (OSError, IOError, ValueError):
+            raise errors.SettingsError(self.filepath)
+        READS[self.filepath] = (key, data)
+        return data
+
+    def write(self, data, before=None):
+        if before is not None:
+            updated, removed = changes(data, before)
+            try:
+                with open(self.filepath) as stream:
+                    data = json.loads(stream.read())
+            except FileNotFoundError:
+                data = {}
+            except (OSError, IOError, ValueError):
+                raise errors.SettingsError(self.filepath)
+            data.update(updated)
+            for name in removed:
+                data.pop(name, None)
+
+        # Replace atomically so readers never see a partial file
+        dirname = os.path.dirname(self.filepath) or os.path.curdir
+        try:
+            text = json.dumps(data, indent=4, sort_keys=True)
+            with tempfile.NamedTemporaryFile('w',
+                                             dir=dirname,
+                                             prefix='.settings.',
+                                             delete=False) as stream:
+                stream.write(text)
+            utils.replace(stream.name, self.filepath)
+        except (OSError, IOError, ValueError):
+            raise errors.SettingsError(self.filepath)
+
+    @contextlib.contextmanager
+    def lock(self):
+        try:
+            lock = open(self.filepath + '.lock', 'a')
+        except (OSError, IOError):
+            lock = None
+        if lock is None or fcntl is None:
+            yield
+            return
+        with lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+@storage('sqlite', '.db')
+class SQLite(Storage):
+    """ Settings stored as one row per app in a SQLite database (WAL mode).
+
+        A new database is populated from the JSON settings file next to it,
+        if there is one.
+    """
+    SCHEMA = 'CREATE TABLE IF NOT EXISTS apps '\
+             '(name TEXT PRIMARY KEY, config TEXT NOT NULL)'
+
+    def __init__(self, path):
+        super(SQLite, self).__init__(path)
+        self.conn = None
+
+    def connect(self):
+        """ Get connection to database, creating it if needed. """
+        import sqlite3
+        if self.conn is None:
+            new = not os.path.exists(self.filepath)
+            try:
+                conn = sqlite3.connect(self.filepath,
+                                       timeout=30,
+                                       isolation_level=None)
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.execute(self.SCHEMA)
+            except sqlite3.Error:
+                raise errors.SettingsError(self.filepath)
+            self.conn = conn
+            if new:
+                self.migrate()
+        return self.conn
+
+    def migrate(self):
+        """ Import apps from the JSON settings file next to the database. """
+        legacy = os.path.splitext(self.filepath)[0] + Json.extension
+        if os.path.exists(legacy):
+            self.write(Json(legacy).read())
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """ Run statements in a write transaction, unless already in one. """
+        import sqlite3
+        conn = self.connect()
+        if conn.in_transaction:
+            yield conn
+            return
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            yield conn
+            conn.execute('COMMIT')
+        except sqlite3.Error:
+            conn.execute('ROLLBACK')
+            raise errors.SettingsError(self.filepath)
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def read(self):
+        import sqlite3
+        try:
+            rows = self.connect().execute('SELECT name, config FROM apps')
+            return {name: json.loads(config) for name, config in rows}
+        except (sqlite3.Error, ValueError):
+            raise errors.SettingsError(self.filepath)
+
+    def readapp(self, name):
+        import sqlite3
+        try:
+            row = self.connect().execute(
+                'SELECT config FROM apps WHERE name = ?', (name,)).fetchone()
+            return None if row is None else json.loads(row[0])
+        except (sqlite3.Error, ValueError):
+            raise errors.SettingsError(self.filepath)
+
+    def write(self, data, before=None):
+        updated, removed = changes(data, before)
+        with self.transaction() as conn:
+            if before is None:
+                conn.execute('DELETE FROM apps')
+            conn.executemany(
+                'INSERT OR REPLACE INTO apps (name, config) VALUES (?, ?)',
+                [(k, json.dumps(v, sort_keys=True))
+                 for k, v in sorted(updated.items())])
+            conn.executemany('DELETE FROM apps WHERE name = ?',
+                             [(x,) for x in removed])
+
+    @contextlib.contextmanager
+    def lock(self):
+        with self.transaction():
+            yield
+
+    def edit(self, editor):
+        """ Edit settings as JSON with editor. """
+        with tempfile.NamedTemporaryFile('w+', suffix='.json') as stream:
+            json.dump(self.read(), stream, indent=4, sort_keys=True)
+            stream.flush()
+            subprocess.call([editor, stream.name])
+            try:
+                with open(stream.name) as edited:
+                    data = json.loads(edited.read())
+            except ValueError:
+                raise errors.SettingsError(self.filepath)
+        self.write(data)
+
+    def remove(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+        super(SQLite, self).remove()
+        for suffix in ['-wal', '-shm']:
+            try:
+                os.remove(self.filepath + suffix)
+            except (OSError, IOError):
+                pass
@@ -0,0 +1,69 @@
+"""
+Background sync of tracked git remotes.
+"""
+import random
+import time
+
+from dip import errors
+from dip import settings
+
+# Fraction of an app's check interval after which it is synced again
+JITTER = (0.5, 0.9)
+
+
+def jitter(period):
+    """ Get a randomized delay that lands before period expires. """
+    return period * random.uniform(*JITTER)
+
+
+def tracked(cfg, names=None):
+    """ Yield installed apps tracking a git remote. """
+    for name in sorted(names or cfg):
+        try:
+            app = cfg[name]
+        except KeyError:
+            raise errors.NotInstalledError(name)
+        if app.repo:
+            yield app
+
+
+def syncapp(app, callback=None, ttl=None):
+    """ Check app remote, record the result and report it to callback. """
+    try:
+        diff, err = app.sync(ttl=ttl), None
+    except Exception as exc:  # pylint: disable=broad-except
+        diff, err = None, exc
+    if callback:
+        callback(app, diff, err)
+    return diff, err
+
+
+def once(names=None, callback=None):
+    """ Sync every tracked app once. """
+    with settings.load() as cfg:
+        return [syncapp(app, callback) for app in tracked(cfg, names)]
+
+
+def forever(names=None, interval=300, callback=None):
+    """ Sync tracked apps on a jittered schedule until interrupted.
+
+        Each app is synced again at a random point in the second half of
+        its check interval (or the given interval if it has none) so that
+        its recorded state never expires while the daemon is running.
+        Checks are recorded with that period as ttl, so runs of apps
+        without a check interval reuse them too.
+        Settings are re-read on every pass to pick up new installs.
+    """
+    due = {}
+    while True:
+        with settings.load() as cfg:
+            apps = list(tracked(cfg, names))
+        for app in apps:
+            if due.get(app.name, 0) <= time.time():
+                period = app.check_interval or interval
+                syncapp(app, callback, period)
+                due[app.name] = time.time() + jitter(period)
+        for name in set(due) - {x.name for x in apps}:
+            del due[name]
+        wait = min(due.values(), default=time.time() + interval)
+        time.sleep(max(wait - time.time(), 1))
@@ -0,0 +1,77 @@
+"""
+Timed spans of the phases of an invocation.
+
+Tracing is enabled by setting DIP_TRACE (or with `dip --trace`). Spans are
+written as JSON lines to stderr when DIP_TRACE is `1` or `stderr`, and are
+otherwise appended to the file DIP_TRACE names.
+"""
+import contextlib
+import json
+import os
+import sys
+import time
+
+STDERR = {'1', 'stderr'}
+
+TARGET = os.getenv('DIP_TRACE') or None
+START = READY = time.perf_counter()
+
+
+def reset():
+    """ Follow DIP_TRACE of the current ENV and restart the clock. """
+    global TARGET, START, READY  # pylint: disable=global-statement
+    TARGET = os.getenv('DIP_TRACE') or None
+    START = READY = time.perf_counter()
+
+
+def enable(target='stderr'):
+    """ Enable tracing to target. """
+    global TARGET  # pylint: disable=global-statement
+    TARGET = target
+
+
+def enabled():
+    """ Whether spans are recorded. """
+    return bool(TARGET)
+
+
+def ready():
+    """ Mark the end of imports. """
+    global READY  # pylint: disable=global-statement
+    READY = time.perf_counter()
+
+
+def emit(name, start, end=None, **attrs):
+    """ Write span that ran from start to end (perf_counter values). """
+    if not TARGET:
+        return
+    end = time.perf_counter() if end is None else end
+    record = dict(attrs,
+                  span=name,
+                  pid=os.getpid(),
+                  at=round(start - START, 6),
+                  ms=round((end - start) * 1000, 3))
+    line = json.dumps(record, sort_keys=True) + '\n'
+    try:
+        if TARGET in STDERR:
+            sys.stderr.write(line)
+            sys.stderr.flush()
+        else:
+            # A single append keeps lines of concurrent runs whole
+            with open(TARGET, 'a') as stream:
+                stream.write(line)
+    except (OSError, IOError, ValueError):
+        pass
+
+
+@contextlib.contextmanager
+def span(name, **attrs):
+    """ Record the time spent in the block as a span. """
+    if not TARGET:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        emit(name, start, **attrs)
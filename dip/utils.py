@@ -5,7 +5,38 @@ import os
 import re
 import stat
 import sys
-import pkg_resources
+
+# Mask at import, before any thread may create files
+UMASK = os.umask(0)
+os.umask(UMASK)
+
+# Compose files as docker-compose looks them up
+COMPOSE_FILES = ('docker-compose.yml', 'docker-compose.yaml',
+                 'compose.yml', 'compose.yaml')
+COMPOSE_OVERRIDES = ('docker-compose.override.yml',
+                     'docker-compose.override.yaml',
+                     'compose.override.yml',
+                     'compose.override.yaml')
+
+
+def composefiles(home):
+    """ Helper to find the default compose files of home without compose.
+
+        Like docker-compose, looks in home and then each parent directory
+        for the first that has a compose file, and adds its override files.
+        Returns an empty list when there is none.
+    """
+    path = os.path.abspath(home)
+    while True:
+        found = [os.path.join(path, x) for x in COMPOSE_FILES
+                 if os.path.exists(os.path.join(path, x))]
+        if found:
+            return found[:1] + [os.path.join(path, x)
+                                for x in COMPOSE_OVERRIDES
+                                if os.path.exists(os.path.join(path, x))]
+        if os.path.dirname(path) == path:
+            return []
+        path = os.path.dirname(path)
 
 
 def contractuser(path):
@@ -47,10 +78,53 @@ def piped_redirected(stream):
     return stat.S_ISFIFO(mode) or stat.S_ISREG(mode)
 
 
+def percentile(values, pct):
+    """ Helper to get the nearest-rank percentile of values. """
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    rank = max(int(-(-len(ordered) * pct // 100)), 1)
+    return ordered[rank - 1]
+
+
 def pkgpath():
-    """ Helper to return abspath of dip file. """
-    root = pkg_resources.Requirement.parse(__package__)
+    """ Helper to return abspath of dip package directory. """
+    return os.path.dirname(os.path.abspath(__file__))
+
+
+def replace(src, dst):
+    """ Helper to move file src over dst atomically.
+
+        The file keeps the mode of dst, or gets the mode of a newly created
+        file when dst does not exist yet.
+    """
+    try:
+        mode = stat.S_IMODE(os.stat(dst).st_mode)
+    except FileNotFoundError:
+        mode = 0o666 & ~umask()
+    os.chmod(src, mode)
+    os.replace(src, dst)
+
+
+def since(seconds):
+    """ Helper to format elapsed seconds, eg. 90 => '1m'. """
+    for unit, size in [('d', 86400), ('h', 3600), ('m', 60)]:
+        if seconds >= size:
+            return '{}{}'.format(int(seconds // size), unit)
+    return '{}s'.format(max(int(seconds), 0))
+
+
+def umask():
+    """ Helper to get the file mode creation mask of the process.
+
+        Setting the mask to read it back races with threads creating files,
+        so it is read from /proc, falling back to the mask dip started with.
+    """
     try:
-        return pkg_resources.resource_filename(root, __package__)
-    except pkg_resources.DistributionNotFound:
-        return os.path.join(os.path.abspath('.'), __package__)
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('Umask:'):
+                    return int(line.split()[1], 8)
+    except (OSError, ValueError, IndexError):
+        pass
+    return UMASK
@@ -0,0 +1,93 @@
+"""
+Pre-pulling of app images so that runs never pay for a cold pull.
+"""
+import os
+import subprocess
+import sys
+
+from dip import fleet
+
+# Layer statuses of a docker pull after which the layer is available
+DONE = {'Already exists', 'Pull complete'}
+
+
+class Progress:
+    """ Layer-level progress of an image pull. """
+    def __init__(self, image):
+        self.image = image
+        self.layers = {}
+
+    def __str__(self):
+        return "{self.image} {self.done}/{self.total} layers".format(
+            self=self)
+
+    def __repr__(self):
+        return "Progress({self})".format(self=self)
+
+    @property
+    def done(self):
+        """ Number of layers pulled. """
+        return sum(x in DONE for x in self.layers.values())
+
+    @property
+    def total(self):
+        """ Number of layers seen. """
+        return len(self.layers)
+
+    def update(self, event):
+        """ Record pull event and return True if it completed a layer. """
+        layer = event.get('id')
+        status = event.get('status') or ''
+        if not layer or status.startswith('Pulling from'):
+            return False
+        before = self.layers.get(layer)
+        self.layers[layer] = status
+        return status in DONE and before not in DONE
+
+
+def services(app):
+    """ Get services of app and its dependencies that have images to pull.
+    """
+    project = app.project
+    return [x for x in project.get_services([app.name], include_deps=True)
+            if 'image' in x.options]
+
+
+def pull(service, callback=None):
+    """ Pull image of service, reporting each completed layer to callback.
+    """
+    progress = Progress(service.image_name)
+    for event in service.pull(silent=True, stream=True) or []:
+        if progress.update(event) and callback:
+            callback(progress)
+    return progress
+
+
+def warm(app, callback=None, jobs=fleet.JOBS):
+    """ Pull images of app and its dependencies concurrently. """
+    return list(fleet.imap(lambda x: pull(x, callback), services(app), jobs))
+
+
+def logpath(name, home):
+    """ Get path to log of background warm-ups of app. """
+    return os.path.join(home, 'state', '{}.warm.log'.format(name))
+
+
+def background(name, home):
+    """ Start `dip warm NAME` in a detached process. """
+    filepath = logpath(name, home)
+    try:
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        log = open(filepath, 'w')
+    except (OSError, IOError):
+        log = subprocess.DEVNULL
+    cmd = [sys.executable, '-m', 'dip.main', 'warm', name]
+    try:
+        return subprocess.Popen(cmd,
+                                stdin=subprocess.DEVNULL,
+                                stdout=log,
+                                stderr=subprocess.STDOUT,
+                                start_new_session=True)
+    finally:
+        if log is not subprocess.DEVNULL:
+            log.close()
@@ -21,12 +21,14 @@ setup(
         'Topic :: Utilities',
     ],
     description='Install CLIs using docker-compose',
-    entry_points={'console_scripts': ['dip=dip.main:dip']},
+    entry_points={'console_scripts': ['dip=dip.main:dip',
+                                    'dip-client=dip.client:main']},
     install_requires=[
         'click >= 6.7',
         'colored >= 1.3',
         'docker-compose >= 1.23',
         'python-dotenv >= 0.10',
+        'pyyaml >= 3.10',
         'gitpython >= 2.1',
     ],
     long_description=long_description,
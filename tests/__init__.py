@@ -1,3 +1,6 @@
+import os
+import subprocess
+
 from dip import settings
 
 
@@ -23,3 +26,41 @@ class MockSettings(settings.Settings):
     def __init__(self):
         super(MockSettings, self).__init__(**SETTINGS)
         self.filepath = '/path/to/settings.json'
+
+
+def gitinit(tmpdir):
+    """ Create a bare remote and a clone with a compose file on master. """
+    bare = str(tmpdir.join('remote.git'))
+    git(tmpdir, 'init', '--bare', '--initial-branch', 'master', bare)
+    clone = gitclone(tmpdir, 'local')
+    gitcommit(clone, 'services:\n  fizz:\n    image: fizz\n')
+    return bare, clone
+
+
+def git(cwd, *args):
+    """ Run git quietly in cwd. """
+    env = dict(os.environ,
+               GIT_AUTHOR_NAME='dip', GIT_AUTHOR_EMAIL='dip@example.com',
+               GIT_COMMITTER_NAME='dip', GIT_COMMITTER_EMAIL='dip@example.com')
+    subprocess.check_call(['git'] + list(args),
+                          cwd=str(cwd),
+                          env=env,
+                          stdout=subprocess.DEVNULL,
+                          stderr=subprocess.DEVNULL)
+
+
+def gitclone(tmpdir, name):
+    """ Clone the bare remote into tmpdir/name. """
+    path = str(tmpdir.join(name))
+    git(tmpdir, 'clone', str(tmpdir.join('remote.git')), path)
+    git(path, 'checkout', '-B', 'master')
+    return path
+
+
+def gitcommit(path, definition):
+    """ Commit and push a compose file. """
+    with open(os.path.join(path, 'docker-compose.yml'), 'w') as compose:
+        compose.write(definition)
+    git(path, 'add', 'docker-compose.yml')
+    git(path, 'commit', '-m', 'update')
+    git(path, 'push', 'origin', 'master')
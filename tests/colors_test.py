@@ -1,5 +1,7 @@
 from unittest import mock
 
+import colored
+
 from dip import colors
 
 
@@ -7,25 +9,25 @@ from dip import colors
 def test_amber(mock_style):
     """ Shortcut for colored.stylize(). """
     colors.amber('TEST')
-    mock_style.assert_called_once_with('TEST', colors.AMBER)
+    mock_style.assert_called_once_with('TEST', colored.fg(colors.AMBER))
 
 
 @mock.patch('colored.stylize')
 def test_blue(mock_style):
     """ Shortcut for colored.stylize(). """
     colors.blue('TEST')
-    mock_style.assert_called_once_with('TEST', colors.BLUE)
+    mock_style.assert_called_once_with('TEST', colored.fg(colors.BLUE))
 
 
 @mock.patch('colored.stylize')
 def test_red(mock_style):
     """ Shortcut for colored.stylize(). """
     colors.red('TEST')
-    mock_style.assert_called_once_with('TEST', colors.RED)
+    mock_style.assert_called_once_with('TEST', colored.fg(colors.RED))
 
 
 @mock.patch('colored.stylize')
 def test_teal(mock_style):
     """ Shortcut for colored.stylize(). """
     colors.teal('TEST')
-    mock_style.assert_called_once_with('TEST', colors.TEAL)
+    mock_style.assert_called_once_with('TEST', colored.fg(colors.TEAL))
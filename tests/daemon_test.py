@@ -0,0 +1,229 @@
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import textwrap
+import time
+from unittest import mock
+
+import pytest
+from dip import client
+from dip import daemon
+from dip import errors
+from dip import settings
+from . import MockSettings
+
+SERVER_SCRIPT = textwrap.dedent('''
+    import sys
+    from unittest import mock
+    from dip import daemon
+    mock.patch('dip.settings.Dip.validate').start()
+    try:
+        daemon.serve(sys.argv[1])
+    except KeyboardInterrupt:
+        pass
+''')
+
+
+@pytest.fixture
+def server(tmpdir):
+    """ Yield function running app through a live daemon with dip-client. """
+    home = tmpdir.mkdir('home')
+    home.join('docker-compose.yml').write('services:\n  dipex:\n'
+                                          '    image: alpine\n')
+    bindir = tmpdir.mkdir('bin')
+    bindir.join('docker-compose').write(
+        '#!/bin/bash\nsleep ${SLEEP:-0}\n'
+        'echo "$@" "FIZZ=$FIZZ" "$PWD"\nexit ${EXIT:-0}\n')
+    bindir.join('docker-compose').chmod(0o755)
+    dip_home = tmpdir.mkdir('diphome')
+    dip_home.join('settings.json').write(json.dumps({
+        'dipex': {'name': 'dipex', 'home': str(home), 'path': str(bindir)},
+    }))
+    env = dict(os.environ,
+               DIP_HOME=str(dip_home),
+               PYTHONPATH=os.path.dirname(os.path.dirname(daemon.__file__)),
+               PATH=':'.join([str(bindir), os.environ['PATH']]))
+    sock = daemon.address(str(dip_home))
+    proc = subprocess.Popen([sys.executable, '-c', SERVER_SCRIPT,
+                             str(dip_home)], env=env)
+    for _ in range(100):
+        if os.path.exists(sock):
+            break
+        time.sleep(0.1)
+
+    def start(*args, **kwargs):
+        cmd = [sys.executable, '-c', 'from dip import client; client.main()',
+               sock, 'dipex'] + list(args)
+        return subprocess.Popen(cmd,
+                                env=dict(env, **kwargs),
+                                cwd=str(tmpdir),
+                                stdin=subprocess.DEVNULL,
+                                stdout=subprocess.PIPE)
+
+    def run(*args, **kwargs):
+        client = start(*args, **kwargs)
+        out, _ = client.communicate()
+        return subprocess.CompletedProcess(client.args, client.returncode,
+                                           out)
+
+    run.start = start
+    run.pid = proc.pid
+    run.sock = sock
+    run.home = str(home)
+    yield run
+    proc.send_signal(signal.SIGINT)
+    proc.wait(10)
+
+
+def test_address():
+    assert daemon.address('/path/to/home') == '/path/to/home/dip.sock'
+
+
+def test_send_recv():
+    left, right = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+    rfd, wfd = os.pipe()
+    with left, right:
+        daemon.send(left, {'fizz': 'buzz'}, [wfd])
+        ret, fds = daemon.recv(right, 3)
+        assert ret == {'fizz': 'buzz'}
+        assert len(fds) == 1
+        os.write(fds[0], b'jazz')
+        assert os.read(rfd, 4) == b'jazz'
+        for fd in fds + [rfd, wfd]:
+            os.close(fd)
+
+
+def test_send_recv_no_fds():
+    left, right = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+    with left, right:
+        daemon.send(left, {'code': 2})
+        assert daemon.recv(right) == ({'code': 2}, [])
+
+
+def test_recv_closed():
+    left, right = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+    with right:
+        left.close()
+        with pytest.raises(ConnectionError):
+            daemon.recv(right)
+
+
+@pytest.mark.parametrize('status, expected', [
+    (0, 0),
+    (3 << 8, 3),
+    (signal.SIGTERM, -signal.SIGTERM),
+])
+def test_exitcode(status, expected):
+    assert daemon.exitcode(status) == expected
+
+
+@mock.patch('os.execvp')
+def test_client_fallback(mock_exec, tmpdir):
+    mock_exec.side_effect = SystemExit
+    with pytest.raises(SystemExit):
+        client.main([str(tmpdir.join('dip.sock')), 'dipex', '--fizz'])
+    mock_exec.assert_called_once_with(
+        'dip', ['dip', 'run', 'dipex', '--', '--fizz'])
+
+
+@mock.patch('os.isatty')
+@mock.patch('socket.socket')
+def test_client_connect_tty(mock_socket, mock_isatty):
+    mock_isatty.return_value = True
+    assert client.connect('/path/to/dip.sock') is None
+    mock_socket.assert_not_called()
+
+
+def test_server(server):
+    proc = server('--fizz', FIZZ='buzz')
+    ret = proc.stdout.decode('utf8').split()
+    assert proc.returncode == 0
+    assert ret[:5] == ['run', '--rm', '-T', 'dipex', '--fizz']
+    assert ret[5] == 'FIZZ=buzz'
+    assert ret[6] == server.home
+
+
+def test_server_exit_code(server):
+    assert server(EXIT='3').returncode == 3
+
+
+def test_server_cwd(server):
+    # Apps run from their home regardless of where they are called from
+    ret = server().stdout.decode('utf8').split()
+    assert ret[-1] == server.home
+
+
+def children(pid):
+    """ Get command names of the child processes of pid. """
+    ret = []
+    for entry in os.listdir('/proc'):
+        try:
+            with open('/proc/{}/stat'.format(entry)) as stream:
+                stat = stream.read()
+        except (OSError, IOError):
+            continue
+        comm, fields = stat[stat.index('(') + 1:].rsplit(') ', 1)
+        if int(fields.split()[1]) == pid:
+            ret.append(comm)
+    return ret
+
+
+@pytest.mark.skipif(not os.path.isdir('/proc'), reason='needs /proc')
+def test_server_concurrent(server):
+    # Runs are not held up by each other, and no Python process is left
+    # waiting on each of them
+    start = time.monotonic()
+    clients = [server.start(SLEEP='2', EXIT=str(x)) for x in range(6)]
+    time.sleep(1)
+    names = children(server.pid)
+    assert len(names) == 6
+    assert not any(x.startswith('python') for x in names)
+    assert [x.wait(10) for x in clients] == list(range(6))
+    assert time.monotonic() - start < 6
+    assert children(server.pid) == []
+
+
+@mock.patch('dip.settings.Dip.config', new_callable=mock.PropertyMock)
+@mock.patch('dip.settings.load')
+def test_prime(mock_load, mock_config):
+    mock_load.return_value.__enter__.return_value = MockSettings()
+    mock_config.side_effect = ['config', 'config', ValueError]
+    with mock.patch('dip.settings.Repo.repo',
+                    new_callable=mock.PropertyMock) as mock_repo:
+        daemon.prime()
+    assert mock_config.call_count == 3
+    tracked = [x for x in MockSettings().values() if x.repo][:2]
+    assert mock_repo.call_count == len(tracked)
+
+
+@mock.patch('dip.settings.load')
+def test_prime_dotenv(mock_load, tmpdir):
+    tmpdir.join('.env').write('FIZZ=buzz\n')
+    mock_load.return_value.__enter__.return_value = {
+        'fizz': settings.Dip('fizz', str(tmpdir), dotenv='.env')}
+    with mock.patch('dip.settings.Dip.config'):
+        daemon.prime()
+    assert settings.DOTENVS[str(tmpdir.join('.env'))][1] == {'FIZZ': 'buzz'}
+
+
+@mock.patch('dip.settings.load')
+def test_prime_err(mock_load):
+    mock_load.side_effect = errors.SettingsError('/path/to/settings.json')
+    daemon.prime()
+
+
+@mock.patch('dip.daemon.prime')
+def test_server_service_actions(mock_prime, tmpdir):
+    server = daemon.Server(str(tmpdir.join('dip.sock')), daemon.Handler)
+    try:
+        server.service_actions()
+        server.service_actions()
+        mock_prime.assert_called_once_with()
+        server.primed -= daemon.PRIME
+        server.service_actions()
+        assert mock_prime.call_count == 2
+    finally:
+        server.server_close()
@@ -0,0 +1,103 @@
+import threading
+import time
+from unittest import mock
+
+import pytest
+from dip import fleet
+
+
+def test_imap():
+    assert list(fleet.imap(lambda x: x * 2, [3, 1, 2])) == [6, 2, 4]
+
+
+def test_imap_empty():
+    assert list(fleet.imap(lambda x: x, [])) == []
+
+
+def test_imap_order():
+    # Later items finishing first are still yielded in order
+    ret = fleet.imap(lambda x: time.sleep(x) or x, [0.05, 0.01, 0])
+    assert list(ret) == [0.05, 0.01, 0]
+
+
+def test_imap_bounded():
+    lock = threading.Lock()
+    running = []
+    peak = []
+
+    def work(item):
+        with lock:
+            running.append(item)
+            peak.append(len(running))
+        time.sleep(0.01)
+        with lock:
+            running.remove(item)
+
+    list(fleet.imap(work, range(12), jobs=3))
+    assert max(peak) <= 3
+
+
+def test_imap_err():
+    def work(item):
+        if item == 2:
+            raise ValueError(item)
+        return item
+
+    ret = fleet.imap(work, [1, 2, 3])
+    assert next(ret) == 1
+    with pytest.raises(ValueError):
+        next(ret)
+
+
+def test_each():
+    def work(item):
+        if item == 2:
+            raise ValueError('fizz')
+        return item * 2
+
+    ret = list(fleet.each(work, [1, 2, 3]))
+    assert [x.item for x in ret] == [1, 2, 3]
+    assert [x.result for x in ret] == [2, None, 6]
+    assert [str(x.error) for x in ret] == ['None', 'fizz', 'None']
+    assert all(x.elapsed >= 0 for x in ret)
+
+
+def test_once():
+    calls = []
+
+    def work(key):
+        calls.append(key)
+        time.sleep(0.05)
+        return key * 2
+
+    once = fleet.Once()
+    ret = fleet.imap(lambda x: once(x, lambda: work(x)), ['a', 'a', 'a', 'b'])
+    assert list(ret) == ['aa', 'aa', 'aa', 'bb']
+    assert sorted(calls) == ['a', 'b']
+
+
+def test_once_err():
+    once = fleet.Once()
+    err = KeyError('fizz')
+    with pytest.raises(KeyError):
+        once('a', mock.Mock(side_effect=err))
+    with pytest.raises(KeyError):
+        once('a', mock.Mock(return_value=1))
+
+
+def test_once_group():
+    lock = threading.Lock()
+    running = []
+    peak = []
+
+    def work():
+        with lock:
+            running.append(1)
+            peak.append(len(running))
+        time.sleep(0.02)
+        with lock:
+            running.pop()
+
+    once = fleet.Once()
+    list(fleet.imap(lambda x: once(x, work, 'group'), ['a', 'b', 'c']))
+    assert max(peak) == 1
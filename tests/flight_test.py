@@ -0,0 +1,105 @@
+import json
+import threading
+import time
+from unittest import mock
+
+import pytest
+from dip import flight
+
+
+def test_call(tmpdir):
+    lockpath = str(tmpdir.join('fetch.lock'))
+    func = mock.MagicMock()
+    ret = flight.call(lockpath, func)
+    func.assert_called_once_with()
+    assert ret['error'] is None
+    with open(lockpath) as lock:
+        assert json.loads(lock.read()) == ret
+
+
+def test_call_sequential(tmpdir):
+    lockpath = str(tmpdir.join('fetch.lock'))
+    func = mock.MagicMock()
+    flight.call(lockpath, func)
+    flight.call(lockpath, func)
+    assert func.call_count == 2
+
+
+def test_call_err(tmpdir):
+    lockpath = str(tmpdir.join('fetch.lock'))
+    func = mock.MagicMock()
+    func.side_effect = ValueError('fizz')
+    with pytest.raises(ValueError):
+        flight.call(lockpath, func)
+    with open(lockpath) as lock:
+        assert json.loads(lock.read())['error'] == 'fizz'
+
+
+def test_call_corrupt(tmpdir):
+    lockpath = tmpdir.join('fetch.lock')
+    lockpath.write('{')
+    func = mock.MagicMock()
+    flight.call(str(lockpath), func)
+    func.assert_called_once_with()
+
+
+def test_call_unlockable(tmpdir):
+    lockpath = str(tmpdir.join('missing', 'fetch.lock'))
+    func = mock.MagicMock()
+    ret = flight.call(lockpath, func)
+    func.assert_called_once_with()
+    assert ret['error'] is None
+
+
+def test_call_coalesced(tmpdir):
+    lockpath = str(tmpdir.join('fetch.lock'))
+    calls = []
+    started = threading.Barrier(8)
+
+    def fetch():
+        calls.append(None)
+        time.sleep(0.5)
+
+    def worker(results):
+        started.wait()
+        results.append(flight.call(lockpath, fetch))
+
+    results = []
+    threads = [threading.Thread(target=worker, args=(results,))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert len(results) == 8
+    assert len({x['time'] for x in results}) == 1
+    shared = sorted(bool(x.get('shared')) for x in results)
+    assert shared == [False] + [True] * 7
+
+
+def test_call_coalesced_err(tmpdir):
+    lockpath = str(tmpdir.join('fetch.lock'))
+    started = threading.Barrier(2)
+    errors = []
+
+    def fetch():
+        time.sleep(0.5)
+        raise ValueError('fizz')
+
+    def worker(results):
+        started.wait()
+        try:
+            results.append(flight.call(lockpath, fetch))
+        except ValueError as err:
+            errors.append(err)
+
+    results = []
+    threads = [threading.Thread(target=worker, args=(results,))
+               for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(errors) == 1
+    assert results[0]['error'] == 'fizz'
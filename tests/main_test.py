@@ -1,5 +1,9 @@
 import contextlib
 import json
+import os
+import subprocess
+import sys
+import time
 
 import click.testing
 import docker
@@ -11,7 +15,30 @@ import dip
 from dip import colors
 from dip import errors
 from dip import main
+from dip import settings
+from dip import state
+from dip import warm
 from . import MockSettings
+from . import gitinit
+
+# Modules that must not be loaded just to dispatch a dip subcommand
+HEAVY_MODULES = ['compose', 'docker', 'dotenv', 'git', 'pkg_resources']
+
+# Generous ceiling (in seconds) on the cost of importing dip.main
+STARTUP_BUDGET = 0.5
+
+STARTUP_SCRIPT = '''
+import json, sys, time
+start = time.perf_counter()
+from dip import main
+elapsed = time.perf_counter() - start
+try:
+    main.dip(sys.argv[1:], prog_name='dip')
+except SystemExit:
+    pass
+heavy = [x for x in {heavy!r} if x in sys.modules]
+sys.stderr.write(json.dumps({{'elapsed': elapsed, 'heavy': heavy}}))
+'''.format(heavy=HEAVY_MODULES)
 
 
 @contextlib.contextmanager
@@ -39,6 +66,84 @@ def test_version():
             "dip, version {vsn}\n".format(vsn=dip.__version__)
 
 
+@mock.patch('dip.trace.TARGET', None)
+def test_trace():
+    with invoke(main.dip, ['--trace', 'config', '--help']) as result:
+        assert result.exit_code == 0
+        assert '"span": "import"' in result.output
+
+
+@mock.patch('subprocess.call')
+@mock.patch('dip.settings.Dip.validate')
+@mock.patch('dip.settings.load')
+def test_bench(mock_load, mock_validate, mock_call):
+    def call(cmd, env, **kwargs):
+        with open(env['DIP_TRACE'], 'a') as stream:
+            stream.write(json.dumps({'span': 'container', 'ms': 250}) + '\n')
+        return 0
+    mock_load.return_value.__enter__.return_value = MockSettings()
+    mock_call.side_effect = call
+    with invoke(main.dip_bench, ['fizz', '-n', '3', '-R', 'compose',
+                                 '-R', 'docker', '--', '--help']) as result:
+        assert result.exit_code == 0
+        rows = [x.split() for x in result.output.splitlines() if x]
+        assert rows[0] == ['RUNNER', 'MODE', 'COLD', 'P50', 'P95', 'P99',
+                           'OVERHEAD', 'CONTAINER', 'ERRORS']
+        assert [x[:2] for x in rows[1:]] == [['compose', 'quick'],
+                                             ['docker', 'quick'],
+                                             ['compose', 'full'],
+                                             ['docker', 'full']]
+        assert all(x[7] == '250.0ms' and x[8] == '0' for x in rows[1:])
+        assert mock_call.call_count == 12
+        cmds = [x[0][0][1:] for x in mock_call.call_args_list]
+        assert cmds[0] == ['-m', 'dip.main', 'run', '--no-exec', '--quick',
+                           '--runner', 'compose', 'fizz', '--', '--help']
+        assert cmds[-1] == ['-m', 'dip.main', 'run', '--no-exec',
+                            '--runner', 'docker', 'fizz', '--', '--help']
+
+
+@mock.patch('dip.settings.Dip.compile')
+@mock.patch('dip.settings.Dip.run', autospec=True)
+@mock.patch('dip.settings.Dip.validate')
+@mock.patch('dip.settings.load')
+def test_run_runner(mock_load, mock_validate, mock_run, mock_compile):
+    mock_load.return_value.__enter__.return_value = MockSettings()
+    mock_run.return_value = 0
+    with invoke(main.dip_run, ['--quick', '--runner', 'docker', 'fizz',
+                               '--', '--help']) as result:
+        assert result.exit_code == 0
+    mock_compile.assert_not_called()
+    app, arg = mock_run.call_args[0]
+    assert app.backend.name == 'docker'
+    assert arg == '--help'
+    assert mock_run.call_args[1] == {'replace': True}
+
+
+@mock.patch('os.path.exists')
+@mock.patch('subprocess.call')
+@mock.patch('dip.settings.Dip.validate')
+@mock.patch('dip.settings.load')
+def test_bench_exe(mock_load, mock_validate, mock_call, mock_exists):
+    mock_load.return_value.__enter__.return_value = MockSettings()
+    mock_call.side_effect = [0, 1]
+    with invoke(main.dip_bench, ['fizz', '-n', '2', '-m', 'exe',
+                                 'ls']) as result:
+        assert result.exit_code == 0
+        rows = [x.split() for x in result.output.splitlines() if x]
+        assert rows[1][:2] == ['compose', 'exe']
+        assert rows[1][6:] == ['-', '-', '1']
+        assert mock_call.call_args[0][0] == ['/path/to/bin/fizz', 'ls']
+
+
+@mock.patch('dip.settings.Dip.validate')
+@mock.patch('dip.settings.load')
+def test_bench_exe_missing(mock_load, mock_validate):
+    mock_load.return_value.__enter__.return_value = MockSettings()
+    with invoke(main.dip_bench, ['fizz', '-m', 'exe']) as result:
+        assert result.exit_code == 2
+        assert 'No executable at /path/to/bin/fizz' in result.output
+
+
 @mock.patch('subprocess.Popen.communicate')
 def test_completion(mock_comm):
     mock_comm.return_value = (b'Hello, world!', None)
@@ -98,7 +203,7 @@ def test_config_err(mock_load):
 @mock.patch('dip.settings.getapp')
 @mock.patch('dip.settings.Dip.diff')
 def test_diff(mock_diff, mock_getapp):
-    mock_app = mock.MagicMock()
+    mock_app = mock.MagicMock(stale=None)
     mock_getapp.return_value.__enter__.return_value = mock_app
     with invoke(main.dip_diff, ['fizz', '--quiet']) as result:
         mock_app.diff.assert_called_once_with(True)
@@ -106,6 +211,99 @@ def test_diff(mock_diff, mock_getapp):
         assert result.output == ''
 
 
+@mock.patch('dip.settings.load')
+def test_diff_all(mock_load):
+    mock_load.return_value.__enter__.return_value = MockSettings()
+    with mock.patch('dip.main.diffone', side_effect=lambda app: {
+            'buzz': 'diverged',
+            'fizz': 'up to date',
+            'jazz': 'not tracked'}[app.name]):
+        with invoke(main.dip_diff, ['--all']) as result:
+            assert result.exit_code == 1
+            rows = [x.rsplit(' ', 1)[0] for x in result.output.splitlines()]
+            assert rows[:3] == ['buzz [diverged]',
+                                'fizz [up to date]',
+                                'jazz [not tracked]']
+            assert result.output.splitlines()[-1].startswith('3 apps in ')
+            assert result.output.splitlines()[-1].endswith(
+                's: 1 diverged, 1 not tracked, 1 up to date')
+
+
+@mock.patch('dip.settings.load')
+@mock.patch('dip.settings.Dip.validate')
+@mock.patch('dip.settings.Dip.diff')
+def test_diff_names(mock_diff, mock_validate, mock_load):
+    mock_diff.return_value = False
+    mock_load.return_value.__enter__.return_value = MockSettings()
+    with invoke(main.dip_diff, ['fizz', 'buzz', '--jobs', '2']) as result:
+        assert result.exit_code == 0
+        rows = [x.rsplit(' ', 1)[0] for x in result.output.splitlines()]
+        assert rows[:2] == ['fizz [up to date]', 'buzz [up to date]']
+        mock_diff.assert_called_with(quiet=True)
+        assert mock_validate.call_count == 2
+
+
+@mock.patch('dip.settings.load')
+def test_diff_not_installed(mock_load):
+    mock_load.return_value.__enter__.return_value = MockSettings()
+    with invoke(main.dip_diff, ['fizz', 'fuzz']) as result:
+        assert result.exit_code == 1
+        assert "'fuzz' command is not installed" in result.output
+
+
+@pytest.mark.parametrize('diff, expected', [
+    (True, 'diverged'),
+    (False, 'up to date'),
+    (None, 'not tracked'),
+])
+def test_diffone(diff, expected):
+    mock_app = mock.MagicMock(stale=None)
+    mock_app.diff.return_value = diff
+    assert main.diffone(mock_app) == expected
+    mock_app.validate.assert_called_once_with()
+
+
+def test_diff_no_names():
+    with invoke(main.dip_diff) as result:
+        assert result.exit_code == 2
+
+
+@mock.patch('dip.runners.Pool.pooled')
+@mock.patch('dip.runners.Pool.containers')
+@mock.patch('dip.runners.Managed.remove')
+@mock.patch('dip.runners.Service.expired')
+@mock.patch('dip.runners.Service.stop')
+@mock.patch('dip.runners.Service.containers')
+@mock.patch('dip.settings.load')
+def test_gc(mock_load, mock_ctrs, mock_stop, mock_expired, mock_rm,
+            mock_pool_ctrs, mock_pooled):
+    cfg = MockSettings()
+    cfg['fizz'] = settings.Dip('fizz', '/path/to/fizz', runner='service')
+    cfg['buzz'] = settings.Dip('buzz', '/path/to/buzz', runner='service')
+    cfg['pool'] = settings.Dip('pool', '/path/to/pool', runner='pool')
+    mock_load.return_value.__enter__.return_value = cfg
+    mock_ctrs.return_value = [('dip-fizz', 'fizz'),
+                              ('dip-buzz', 'buzz'),
+                              ('dip-jazz', 'jazz'),
+                              ('dip-fuzz', 'fuzz')]
+    mock_expired.side_effect = [False, True]
+    mock_pool_ctrs.return_value = [('dip-pool-abcd', 'pool'),
+                                   ('dip-pool-efgh', 'pool'),
+                                   ('dip-fizz-abcd', 'fizz')]
+    mock_pooled.side_effect = [True, False]
+    with invoke(main.dip_gc) as result:
+        assert result.exit_code == 0
+        assert result.output == \
+            'Removed dip-buzz\nRemoved dip-jazz\nRemoved dip-fuzz\n' \
+            'Removed dip-pool-efgh\nRemoved dip-fizz-abcd\n'
+        mock_stop.assert_called_once_with()
+        mock_pool_ctrs.assert_called_once_with('status=created')
+        assert mock_rm.call_args_list == [mock.call('dip-jazz'),
+                                          mock.call('dip-fuzz'),
+                                          mock.call('dip-pool-efgh'),
+                                          mock.call('dip-fizz-abcd')]
+
+
 @mock.patch('dip.settings.saveonexit')
 @mock.patch('dip.settings.Settings.install')
 def test_install_sleep(mock_ins, mock_load):
@@ -121,7 +319,10 @@ def test_install_sleep(mock_ins, mock_load):
             {'remote': 'origin',
              'branch': 'master',
              'sleep': 5,
-             'auto_upgrade': False}, None)
+             'auto_upgrade': False,
+             'check': None,
+             'check_interval': None,
+             'fetch_timeout': None}, None, None, {})
 
 
 @mock.patch('dip.settings.saveonexit')
@@ -139,7 +340,72 @@ def test_install_autoup(mock_ins, mock_load):
             {'remote': 'origin',
              'branch': 'master',
              'sleep': None,
-             'auto_upgrade': True}, None)
+             'auto_upgrade': True,
+             'check': None,
+             'check_interval': None,
+             'fetch_timeout': None}, None, None, {})
+
+
+@mock.patch('dip.settings.saveonexit')
+@mock.patch('dip.settings.Settings.install')
+def test_install_check_interval(mock_ins, mock_load):
+    mock_load.return_value.__enter__.return_value = MockSettings()
+    with invoke(main.dip_install, ['fizz', '/test/path',
+                                   '--path', '/path/to/bin',
+                                   '--remote', 'origin/master',
+                                   '--check-interval', '300']):
+        mock_ins.assert_called_once_with(
+            'fizz', '/test/path', '/path/to/bin', {},
+            {'remote': 'origin',
+             'branch': 'master',
+             'sleep': None,
+             'auto_upgrade': False,
+             'check': None,
+             'check_interval': 300,
+             'fetch_timeout': None}, None, None, {})
+
+
+@mock.patch('dip.settings.saveonexit')
+@mock.patch('dip.settings.Settings.install')
+def test_install_runner(mock_ins, mock_load):
+    mock_load.return_value.__enter__.return_value = MockSettings()
+    with invoke(main.dip_install, ['fizz', '/test/path',
+                                   '--path', '/path/to/bin',
+                                   '--runner', 'docker']):
+        mock_ins.assert_called_once_with(
+            'fizz', '/test/path', '/path/to/bin', {},
+            {'remote': None,
+             'branch': None,
+             'sleep': None,
+             'auto_upgrade': False,
+             'check': None,
+             'check_interval': None,
+             'fetch_timeout': None}, None, 'docker', {})
+
+
+@mock.patch('dip.settings.saveonexit')
+@mock.patch('dip.settings.Settings.install')
+def test_install_opts(mock_ins, mock_load):
+    mock_load.return_value.__enter__.return_value = MockSettings()
+    with invoke(main.dip_install, ['fizz', '/test/path',
+                                   '--path', '/path/to/bin',
+                                   '--runner', 'service',
+                                   '--opt', 'idle=600']):
+        mock_ins.assert_called_once_with(
+            'fizz', '/test/path', '/path/to/bin', {},
+            {'remote': None,
+             'branch': None,
+             'sleep': None,
+             'auto_upgrade': False,
+             'check': None,
+             'check_interval': None,
+             'fetch_timeout': None}, None, 'service', {'idle': 600})
+
+
+def test_install_opts_err():
+    with invoke(main.dip_install, ['fizz', '/test/path',
+                                   '--opt', 'IDLE']) as result:
+        assert result.exit_code == 2
 
 
 @mock.patch('dip.settings.saveonexit')
@@ -155,6 +421,71 @@ def test_install_no_exe(mock_ins, mock_load):
         mock_ins.assert_not_called()
 
 
+@mock.patch('dip.warm.background')
+@mock.patch('dip.settings.saveonexit')
+@mock.patch('dip.settings.Settings.install')
+def test_install_warm(mock_ins, mock_load, mock_bg):
+    mock_load.return_value.__enter__.return_value = MockSettings()
+    with invoke(main.dip_install, ['fizz', '/test/path', '--warm']) as result:
+        assert result.exit_code == 0
+        mock_bg.assert_called_once_with('fizz', main.settings.HOME)
+
+
+@mock.patch('dip.settings.Dip.compile')
+@mock.patch('dip.settings.Dip.install')
+@mock.patch('dip.settings.Dip.validate')
+@mock.patch('dip.settings.saveonexit')
+def test_install_from(mock_load, mock_val, mock_ins, mock_comp, tmpdir):
+    cfg = MockSettings()
+    mock_load.return_value.__enter__.return_value = cfg
+    source = tmpdir.join('apps.yml')
+    source.write('fizz: {home: fizz}\nbang: {home: bang, remote: up/dev}\n')
+    with invoke(main.dip_install, ['--from', str(source),
+                                   '--path', '/bin']) as result:
+        assert result.exit_code == 0
+        assert 'bang [installed]' in result.output
+        assert 'fizz [installed]' in result.output
+        assert mock_val.call_count == mock_ins.call_count == 2
+        assert mock_comp.call_count == 2
+        mock_load.assert_called_once_with()
+        assert cfg['bang'].home == str(tmpdir.join('bang'))
+        assert cfg['bang'].path == '/bin'
+        assert cfg['bang'].tracking == 'up/dev'
+
+
+@mock.patch('dip.warm.background')
+@mock.patch('dip.settings.Dip.compile')
+@mock.patch('dip.settings.Dip.install')
+@mock.patch('dip.settings.Dip.validate')
+@mock.patch('dip.settings.saveonexit')
+def test_install_from_fail(mock_load, mock_val, mock_ins, mock_comp, mock_bg,
+                           tmpdir):
+    cfg = MockSettings()
+    mock_load.return_value.__enter__.return_value = cfg
+    mock_val.side_effect = [None, errors.NoSuchRunnerError('nope')]
+    source = tmpdir.join('apps.yml')
+    source.write('bang: {home: bang}\nboom: {home: boom}\n')
+    with invoke(main.dip_install, ['--from', str(source), '--no-exe',
+                                   '--warm', '--jobs', '1']) as result:
+        assert result.exit_code == 1
+        assert 'boom [error]' in result.output
+        assert 'bang' in cfg
+        assert 'boom' not in cfg
+        mock_ins.assert_not_called()
+        mock_comp.assert_called_once_with()
+        mock_bg.assert_called_once_with('bang', main.settings.HOME)
+
+
+@pytest.mark.parametrize('args', [
+    ['fizz', '/test/path', '--from', __file__],
+    ['fizz'],
+    [],
+])
+def test_install_from_usage(args):
+    with invoke(main.dip_install, args) as result:
+        assert result.exit_code == 2
+
+
 @mock.patch('dip.settings.load')
 @mock.patch('git.Repo')
 def test_list(mock_repo, mock_load):
@@ -185,6 +516,69 @@ jazz /path/to/jazz
 '''
 
 
+@mock.patch('dip.settings.load')
+@mock.patch('git.Repo')
+def test_list_shared_home(mock_repo, mock_load):
+    cfg = MockSettings()
+    cfg['fuzz'] = dict(cfg['buzz'], name='fuzz')
+    mock_repo.return_value.active_branch.name = 'edge'
+    mock_load.return_value.__enter__.return_value = cfg
+    with invoke(main.dip_list) as result:
+        assert result.exit_code == 0
+        assert result.output == '''
+buzz /path/to/buzz origin/edge
+fizz /path/to/fizz origin/master
+fuzz /path/to/buzz origin/edge
+jazz /path/to/jazz
+
+'''
+        mock_repo.assert_called_once_with('/path/to/buzz',
+                                          search_parent_directories=True)
+
+
+@mock.patch('dip.settings.load')
+def test_list_empty(mock_load):
+    mock_load.return_value.__enter__.return_value = settings.Settings()
+    with invoke(main.dip_list) as result:
+        assert result.exit_code == 0
+        assert result.output == ''
+
+
+@mock.patch('time.time')
+@mock.patch('dip.settings.load')
+@mock.patch('git.Repo')
+def test_list_status(mock_repo, mock_load, mock_time, tmpdir):
+    cfg = MockSettings()
+    cfg['fizz'] = dict(cfg['fizz'], git=dict(cfg['fizz'].git,
+                                             check_interval=60))
+    mock_time.return_value = 1000
+    mock_repo.return_value.active_branch.name = 'edge'
+    mock_load.return_value.__enter__.return_value = cfg
+    with state.saveonexit('fizz', str(tmpdir)) as app_state:
+        app_state.setcheck('origin/master', 'abc', False, now=970)
+    with state.saveonexit('buzz', str(tmpdir)) as app_state:
+        app_state.setcheck('origin', 'abc', True, now=100)
+    with mock.patch('dip.settings.HOME', str(tmpdir)):
+        with invoke(main.dip_list, ['--status']) as result:
+            assert result.exit_code == 0
+            assert result.output == '''
+buzz /path/to/buzz origin/edge [diverged] 15m ago
+fizz /path/to/fizz origin/master [up to date] 30s ago
+jazz /path/to/jazz
+
+'''
+
+
+@pytest.mark.parametrize('check, expected', [
+    (None, '[unchecked]'),
+    ({'time': 'fizz'}, '[unchecked]'),
+])
+def test_checkstatus_unchecked(check, expected, tmpdir):
+    app = MockSettings()['fizz']
+    with mock.patch('dip.state.State.lastcheck', return_value=check):
+        assert main.checkstatus(app) == expected
+
+
 @mock.patch('dip.settings.getapp')
 def test_pull(mock_load):
     with invoke(main.dip_pull, ['fizz']) as result:
@@ -226,6 +620,30 @@ def test_pull_docker_err(mock_diff, mock_svc, mock_app):
         assert result.exit_code != 0
 
 
+@mock.patch('dip.settings.load')
+@mock.patch('dip.settings.Dip.validate')
+@mock.patch('dip.settings.Dip.service')
+def test_pull_all(mock_svc, mock_validate, mock_load):
+    mock_load.return_value.__enter__.return_value = MockSettings()
+    with invoke(main.dip_pull, ['--all']) as result:
+        assert result.exit_code == 0
+        assert mock_svc.pull.call_count == 3
+        mock_svc.pull.assert_called_with(silent=True)
+        assert result.output.splitlines()[-1].endswith('s: 3 pulled')
+
+
+@mock.patch('dip.settings.load')
+@mock.patch('dip.settings.Dip.validate')
+@mock.patch('dip.settings.Dip.service')
+def test_pull_all_err(mock_svc, mock_validate, mock_load):
+    mock_load.return_value.__enter__.return_value = MockSettings()
+    mock_svc.pull.side_effect = docker.errors.APIError('test')
+    with invoke(main.dip_pull, ['fizz', 'buzz']) as result:
+        assert result.exit_code == 1
+        assert result.output.splitlines()[0].startswith('fizz [error] test')
+        assert result.output.splitlines()[-1].endswith('s: 2 error')
+
+
 @mock.patch('dip.settings.reset')
 def test_reset(mock_reset):
     with invoke(main.dip_reset, ['--force']) as result:
@@ -251,7 +669,8 @@ def test_run_ask(mock_diffapp, mock_ask):
                                '--opt1', 'val1',
                                '--flag']) as result:
         mock_ask.assert_called_once_with(mock_app)
-        mock_app.run.assert_called_once_with('--opt1', 'val1', '--flag')
+        mock_app.run.assert_called_once_with('--opt1', 'val1', '--flag',
+                                             replace=True)
         assert result.exit_code == 0
 
 
@@ -265,7 +684,8 @@ def test_run_sleep(mock_diffapp, mock_sleep):
                                '--opt1', 'val1',
                                '--flag']) as result:
         mock_sleep.assert_called_once_with(mock_app)
-        mock_app.run.assert_called_once_with('--opt1', 'val1', '--flag')
+        mock_app.run.assert_called_once_with('--opt1', 'val1', '--flag',
+                                             replace=True)
         assert result.exit_code == 0
 
 
@@ -280,7 +700,8 @@ def test_run_autoupgrade(mock_diffapp, mock_autoup):
                                '--opt1', 'val1',
                                '--flag']) as result:
         mock_autoup.assert_called_once_with(mock_app)
-        mock_app.run.assert_called_once_with('--opt1', 'val1', '--flag')
+        mock_app.run.assert_called_once_with('--opt1', 'val1', '--flag',
+                                             replace=True)
         assert result.exit_code == 0
 
 
@@ -292,12 +713,25 @@ def test_run_quick(mock_getapp):
                                '--opt1', 'val1',
                                '--flag']) as result:
         mock_app.diff.assert_not_called()
-        mock_app.run.assert_called_once_with('--opt1', 'val1', '--flag')
+        mock_app.run.assert_called_once_with('--opt1', 'val1', '--flag',
+                                             replace=True)
         assert result.exit_code == 0
 
 
+@mock.patch('dip.settings.getapp')
+def test_run_no_exec(mock_getapp):
+    mock_app = mock.MagicMock()
+    mock_app.run.return_value = 3
+    mock_getapp.return_value.__enter__.return_value = mock_app
+    with invoke(main.dip_run, ['fizz', '--quick', '--no-exec', '--',
+                               '--flag']) as result:
+        mock_app.run.assert_called_once_with('--flag', replace=False)
+        assert result.exit_code == 3
+
+
 @mock.patch('dip.settings.getapp')
 def test_show(mock_app):
+    mock_app.return_value.__enter__.return_value.stale = None
     mock_app.return_value.__enter__.return_value.diff.return_value = False
     mock_app.return_value.__enter__.return_value.definitions = iter(['TEST'])
     with invoke(main.dip_show, ['fizz']) as result:
@@ -308,7 +742,7 @@ def test_show(mock_app):
 @mock.patch('dip.main.warnask')
 @mock.patch('dip.settings.diffapp')
 def test_show_ask(mock_diffapp, mock_ask):
-    mock_app = mock.MagicMock()
+    mock_app = mock.MagicMock(stale=None)
     mock_app.git = {}
     mock_app.definitions = iter(['TEST'])
     mock_diffapp.return_value.__enter__.return_value = (mock_app, 'DIFF')
@@ -320,6 +754,7 @@ def test_show_ask(mock_diffapp, mock_ask):
 
 @mock.patch('dip.settings.getapp')
 def test_show_sleep(mock_app):
+    mock_app.return_value.__enter__.return_value.stale = None
     mock_app.return_value.__enter__.return_value.name = 'myapp'
     mock_app.return_value.__enter__.return_value.repo.sleeptime = 10
     mock_app.return_value.__enter__.return_value.diff.return_value = True
@@ -334,13 +769,106 @@ def test_show_sleep(mock_app):
             'TEST\n\n'
 
 
-@mock.patch('dip.settings.Settings.uninstall')
+@mock.patch('dip.sync.once')
+def test_sync(mock_once):
+    mock_once.return_value = [(False, None)]
+    with invoke(main.dip_sync, ['fizz']) as result:
+        assert result.exit_code == 0
+        mock_once.assert_called_once_with(('fizz',), main.echosync)
+
+
+@mock.patch('dip.sync.once')
+def test_sync_err(mock_once):
+    mock_once.return_value = [(None, errors.GitFetchError('origin'))]
+    with invoke(main.dip_sync) as result:
+        assert result.exit_code == 1
+
+
+@mock.patch('dip.sync.forever')
+def test_sync_daemon(mock_forever):
+    mock_forever.side_effect = KeyboardInterrupt
+    with invoke(main.dip_sync, ['--daemon', '--interval', '60']) as result:
+        assert result.exit_code == 0
+        mock_forever.assert_called_once_with((), 60, main.echosync)
+
+
+@pytest.mark.parametrize('diff, err, expected', [
+    (False, None, 'fizz origin/master [up to date]\n'),
+    (True, None, 'fizz origin/master [diverged]\n'),
+    (None, errors.GitFetchError('origin'),
+     "fizz origin/master [error] Error fetching remote 'origin'\n"),
+])
+def test_echosync(diff, err, expected):
+    runner = click.testing.CliRunner()
+    with runner.isolation() as (out, _):
+        main.echosync(MockSettings()['fizz'], diff, err)
+        assert out.getvalue().decode('utf8') == expected
+
+
+def test_echosync_stale():
+    app = MockSettings()['fizz']
+    app.stale = 'timed out'
+    runner = click.testing.CliRunner()
+    with runner.isolation() as (out, _):
+        main.echosync(app, False, None)
+        assert out.getvalue().decode('utf8') == \
+            'fizz origin/master [up to date] [stale]\n'
+
+
+def test_diffone_stale():
+    mock_app = mock.MagicMock(stale='timed out')
+    mock_app.diff.return_value = False
+    assert main.diffone(mock_app) == 'up to date (stale)'
+
+
+@mock.patch('dip.settings.diffapp')
+def test_run_stale(mock_diffapp):
+    mock_app = mock.MagicMock(stale="Timed out fetching remote 'origin'")
+    mock_app.run.return_value = 0
+    mock_diffapp.return_value.__enter__.return_value = (mock_app, False)
+    with invoke(main.dip_run, ['fizz']) as result:
+        assert result.exit_code == 0
+        assert result.output == "\nTimed out fetching remote 'origin'\n"\
+            "Continuing with the remote as last fetched.\n"
+
+
+@mock.patch('dip.settings.Dip.uninstall')
 @mock.patch('dip.settings.saveonexit')
 def test_uninstall(mock_load, mock_un):
-    mock_load.return_value.__enter__.return_value = MockSettings()
-    with invoke(main.dip_uninstall, ['fizz']) as result:
+    cfg = MockSettings()
+    mock_load.return_value.__enter__.return_value = cfg
+    with invoke(main.dip_uninstall, ['fizz', 'fizz']) as result:
+        assert result.exit_code == 0
+        assert result.output == 'Uninstalled fizz\n'
+        mock_un.assert_called_once_with()
+        assert 'fizz' not in cfg
+
+
+@mock.patch('dip.settings.Dip.uninstall')
+@mock.patch('dip.settings.saveonexit')
+def test_uninstall_fail(mock_load, mock_un):
+    cfg = MockSettings()
+    mock_load.return_value.__enter__.return_value = cfg
+    mock_un.side_effect = [None, OSError('busy')]
+    with invoke(main.dip_uninstall, ['buzz', 'fizz', '--jobs', '1']) as result:
+        assert result.exit_code == 1
+        assert 'buzz' not in cfg
+        assert 'fizz' in cfg
+        assert "Unable to uninstall fizz: busy" in result.output
+
+
+@mock.patch('dip.settings.Dip.uninstall')
+@mock.patch('dip.settings.saveonexit')
+def test_uninstall_from(mock_load, mock_un, tmpdir):
+    cfg = MockSettings()
+    mock_load.return_value.__enter__.return_value = cfg
+    source = tmpdir.join('apps.yml')
+    source.write('fizz: {home: fizz}\nbuzz: {home: buzz}\nfuzz: {home: x}\n')
+    with invoke(main.dip_uninstall, ['--from', str(source)]) as result:
         assert result.exit_code == 0
-        mock_un.assert_called_once_with('fizz')
+        assert mock_un.call_count == 2
+        assert sorted(cfg) == ['jazz']
+        mock_load.assert_called_once_with()
 
 
 @mock.patch('dip.settings.Dip.uninstall')
@@ -361,6 +889,138 @@ def test_upgrade(mock_get):
         mock_app.repo.pull.assert_called_once_with()
 
 
+@mock.patch('dip.settings.load')
+@mock.patch('dip.settings.Dip.validate')
+@mock.patch('dip.settings.Dip.compile')
+@mock.patch('dip.settings.Repo.pull')
+def test_upgrade_all(mock_pull, mock_compile, mock_validate, mock_load):
+    mock_load.return_value.__enter__.return_value = MockSettings()
+    mock_pull.return_value = 0
+    with invoke(main.dip_upgrade, ['--all', '-j', '1']) as result:
+        assert result.exit_code == 0
+        rows = [x.rsplit(' ', 1)[0] for x in result.output.splitlines()]
+        assert rows[:3] == ['buzz [upgraded]',
+                            'fizz [upgraded]',
+                            'jazz [not tracked]']
+        mock_pull.assert_called_with(quiet=True)
+        assert mock_compile.call_count == 3
+
+
+@mock.patch('dip.settings.load')
+@mock.patch('dip.settings.Dip.validate')
+@mock.patch('dip.settings.Dip.compile')
+@mock.patch('dip.settings.Repo.pull')
+def test_upgrade_shared_repo(mock_pull, mock_compile, mock_validate,
+                             mock_load, tmpdir):
+    _, clone = gitinit(tmpdir)
+    track = {'remote': 'origin', 'branch': 'master'}
+    mock_load.return_value.__enter__.return_value = settings.Settings(
+        fizz={'name': 'fizz', 'home': clone, 'git': track},
+        buzz={'name': 'buzz', 'home': clone, 'git': track})
+    mock_pull.side_effect = lambda **kwargs: time.sleep(0.05) or 1
+    with invoke(main.dip_upgrade, ['--all']) as result:
+        assert result.exit_code == 1
+        assert "buzz [error] Error pulling remote 'origin'" in result.output
+        assert "fizz [error] Error pulling remote 'origin'" in result.output
+    mock_pull.assert_called_once_with(quiet=True)
+
+
+@mock.patch('dip.settings.load')
+@mock.patch('dip.settings.Dip.validate')
+@mock.patch('dip.settings.Dip.compile')
+@mock.patch('dip.settings.Repo.pull')
+def test_upgrade_all_err(mock_pull, mock_compile, mock_validate, mock_load):
+    mock_load.return_value.__enter__.return_value = MockSettings()
+    mock_pull.return_value = 1
+    with invoke(main.dip_upgrade, ['fizz', 'jazz']) as result:
+        assert result.exit_code == 1
+        assert "fizz [error] Error pulling remote 'origin'" in result.output
+        assert result.output.splitlines()[-1].endswith(
+            's: 1 error, 1 not tracked')
+
+
+@mock.patch('dip.warm.background')
+@mock.patch('dip.settings.getapp')
+def test_upgrade_warm(mock_get, mock_bg):
+    mock_get.return_value.__enter__.return_value.name = 'fizz'
+    with invoke(main.dip_upgrade, ['fizz', '--warm']) as result:
+        assert result.exit_code == 0
+        mock_bg.assert_called_once_with('fizz', main.settings.HOME)
+
+
+@mock.patch('dip.warm.background')
+@mock.patch('dip.settings.load')
+@mock.patch('dip.settings.Dip.validate')
+@mock.patch('dip.settings.Dip.compile')
+@mock.patch('dip.settings.Repo.pull')
+def test_upgrade_all_warm(mock_pull, mock_compile, mock_validate, mock_load,
+                          mock_bg):
+    mock_load.return_value.__enter__.return_value = MockSettings()
+    mock_pull.side_effect = [0, 1]
+    with invoke(main.dip_upgrade, ['fizz', 'buzz', 'jazz', '-w', '-j', '1']) \
+            as result:
+        assert result.exit_code == 1
+        mock_bg.assert_has_calls([mock.call('fizz', main.settings.HOME),
+                                  mock.call('jazz', main.settings.HOME)])
+        assert mock_bg.call_count == 2
+
+
+@mock.patch('dip.runners.Pool.fill')
+@mock.patch('dip.settings.Dip.validate')
+@mock.patch('dip.settings.load')
+def test_pool(mock_load, mock_validate, mock_fill):
+    cfg = MockSettings()
+    cfg['pool'] = settings.Dip('pool', '/path/to/pool', runner='pool')
+    mock_load.return_value.__enter__.return_value = cfg
+    mock_fill.return_value = 2
+    with invoke(main.dip_pool, ['pool', 'fizz', '-j', '1']) as result:
+        assert result.exit_code == 0
+        rows = [x.rsplit(' ', 1)[0] for x in result.output.splitlines()]
+        assert rows[:2] == ['pool [2 created]', 'fizz [no pool]']
+
+
+@mock.patch('dip.settings.load')
+@mock.patch('dip.runners.Runner.stop')
+def test_stop(mock_stop, mock_load):
+    mock_load.return_value.__enter__.return_value = MockSettings()
+    mock_stop.side_effect = [True, False]
+    with invoke(main.dip_stop, ['fizz', 'buzz', '-j', '1']) as result:
+        assert result.exit_code == 0
+        rows = [x.rsplit(' ', 1)[0] for x in result.output.splitlines()]
+        assert rows[:2] == ['fizz [stopped]', 'buzz [not running]']
+
+
+@mock.patch('dip.warm.warm')
+@mock.patch('dip.settings.load')
+@mock.patch('dip.settings.Dip.validate')
+def test_warm(mock_validate, mock_load, mock_warm):
+    def pull(app, callback, jobs):
+        progress = warm.Progress('alpine')
+        progress.layers = {'abc': 'Pull complete', 'def': 'Downloading'}
+        callback(progress)
+
+    mock_warm.side_effect = pull
+    mock_load.return_value.__enter__.return_value = MockSettings()
+    with invoke(main.dip_warm, ['fizz', '--jobs', '3']) as result:
+        assert result.exit_code == 0
+        lines = result.output.splitlines()
+        assert lines[0] == 'fizz alpine 1/2 layers'
+        assert lines[1].startswith('fizz [warm] ')
+        assert lines[-1].endswith('s: 1 warm')
+        mock_warm.assert_called_once_with(mock.ANY, mock.ANY, 3)
+
+
+@mock.patch('dip.warm.warm')
+@mock.patch('dip.settings.load')
+@mock.patch('dip.settings.Dip.validate')
+def test_warm_err(mock_validate, mock_load, mock_warm):
+    mock_warm.side_effect = docker.errors.APIError('test')
+    mock_load.return_value.__enter__.return_value = MockSettings()
+    with invoke(main.dip_warm, ['--all']) as result:
+        assert result.exit_code == 1
+        assert result.output.splitlines()[-1].endswith('s: 3 error')
+
+
 @mock.patch('dip.settings.getapp')
 def test_upgrade_err(mock_get):
     mock_app = mock.MagicMock()
@@ -396,3 +1056,36 @@ def test_warnupgrade():
     mock_app = mock.MagicMock()
     main.warnupgrade(mock_app)
     mock_app.repo.pull.assert_called_once_with()
+
+
+@pytest.mark.parametrize('args', [
+    ['--help'],
+    ['--version'],
+    ['bench', '--help'],
+    ['completion', '--help'],
+    ['config'],
+    ['warm', '--help'],
+    ['daemon', '--help'],
+    ['diff', '--help'],
+    ['gc', '--help'],
+    ['install', '--help'],
+    ['list'],
+    ['pool', '--help'],
+    ['pull', '--help'],
+    ['reset', '--help'],
+    ['run', '--help'],
+    ['show', '--help'],
+    ['stop', '--help'],
+    ['sync', '--help'],
+    ['uninstall', '--help'],
+    ['upgrade', '--help'],
+])
+def test_startup_budget(args, tmpdir):
+    env = dict(os.environ, DIP_HOME=str(tmpdir))
+    proc = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT] + args,
+                          env=env,
+                          stdout=subprocess.PIPE,
+                          stderr=subprocess.PIPE)
+    ret = json.loads(proc.stderr.decode('utf8').splitlines()[-1])
+    assert ret['heavy'] == []
+    assert ret['elapsed'] < STARTUP_BUDGET
@@ -0,0 +1,83 @@
+import os
+
+import pytest
+
+from dip import errors
+from dip import manifest
+
+
+@pytest.fixture
+def source(tmpdir):
+    def write(text):
+        path = tmpdir.join('apps.yml')
+        path.write(text)
+        return str(path)
+    return write
+
+
+def test_names(source):
+    assert manifest.names(source('fizz: {}\nbuzz: {}\n')) == ['buzz', 'fizz']
+
+
+def test_names_empty(source):
+    assert manifest.names(source('')) == []
+
+
+@pytest.mark.parametrize('text,reason', [
+    ('fizz: [', 'invalid YAML'),
+    ('- fizz\n', 'expected a mapping of names'),
+    ('fizz: buzz\n', "expected a mapping for 'fizz'"),
+])
+def test_read_err(source, text, reason):
+    with pytest.raises(errors.ManifestError) as err:
+        manifest.read(source(text))
+    assert reason in str(err.value)
+
+
+def test_read_missing(tmpdir):
+    with pytest.raises(errors.ManifestError):
+        manifest.read(str(tmpdir.join('nope.yml')))
+
+
+def test_apps(source, tmpdir):
+    app, = manifest.apps(source('''
+fizz:
+  home: src/fizz
+  remote: origin/master
+  check_interval: 300
+  env:
+    FIZZ: 1
+  runner: service
+  opts:
+    idle: 600
+'''), '/path/to/bin')
+    assert app.name == 'fizz'
+    assert app.home == str(tmpdir.join('src', 'fizz'))
+    assert app.path == '/path/to/bin'
+    assert app.env == {'FIZZ': '1'}
+    assert app.tracking == 'origin/master'
+    assert app.check_interval == 300
+    assert app.runner == 'service'
+    assert app.opts == {'idle': 600}
+
+
+def test_apps_defaults(source):
+    app, = manifest.apps(source('fizz: {home: /fizz, path: ~/bin}\n'))
+    assert app.home == '/fizz'
+    assert app.path == os.path.expanduser('~/bin')
+    assert app.git == {}
+    assert app.env == {}
+
+
+@pytest.mark.parametrize('text,reason', [
+    ('fizz: {}\n', "missing home for 'fizz'"),
+    ('fizz: {home: ., hme: .}\n', "unknown key 'hme' for 'fizz'"),
+    ('fizz: {home: ., check_interval: 60}\n',
+     "'check_interval' for 'fizz' requires a remote"),
+    ('fizz: {home: ., sleep: 5, fetch_timeout: 3}\n',
+     "'fetch_timeout' for 'fizz' requires a remote"),
+])
+def test_apps_err(source, text, reason):
+    with pytest.raises(errors.ManifestError) as err:
+        manifest.apps(source(text))
+    assert reason in str(err.value)
@@ -0,0 +1,201 @@
+import os
+import subprocess
+import textwrap
+from unittest import mock
+
+import pytest
+from dip import errors
+from dip import plans
+from dip import settings
+
+COMPOSE = textwrap.dedent('''
+    version: '3'
+    services:
+      dipex:
+        image: alpine
+''')
+
+
+@pytest.fixture
+def shim(tmpdir):
+    """ Yield function that installs an app and runs its executable. """
+    home = tmpdir.mkdir('home')
+    home.join('docker-compose.yml').write(COMPOSE)
+    home.join('.env.dip').write('FIZZ=buzz\nJAZZ="razz jazz"\n')
+    bindir = tmpdir.mkdir('bin')
+    for exe in ['dip', 'docker-compose']:
+        bindir.join(exe).write(
+            '#!/bin/bash\necho {} "$@" "FIZZ=$FIZZ" "JAZZ=$JAZZ"\n'
+            .format(exe))
+        bindir.join(exe).chmod(0o755)
+    dip_home = str(tmpdir.mkdir('dip'))
+    env = dict(os.environ, PATH=':'.join([str(bindir), os.environ['PATH']]))
+    env.pop('FIZZ', None)
+
+    def run(*args, **kwargs):
+        with mock.patch('dip.settings.HOME', dip_home):
+            app = settings.Dip('dipex', str(home), str(bindir),
+                               env={'ENV': 'VAL'},
+                               dotenv='.env.dip',
+                               **kwargs)
+            app.install()
+            app.compile()
+        cmd = [str(bindir.join('dipex'))] + list(args)
+        with open(os.devnull) as null:
+            proc = subprocess.run(cmd, env=env, stdin=null,
+                                  stdout=subprocess.PIPE)
+        return proc.stdout.decode('utf8').strip()
+
+    run.env = env
+    run.home = home
+    run.dip_home = dip_home
+    return run
+
+
+def test_fastpath(shim):
+    ret = shim('--fizz', 'buzz jazz')
+    assert ret == 'docker-compose run --rm -T -e ENV=VAL dipex '\
+                  '--fizz buzz jazz FIZZ=buzz JAZZ=razz jazz'
+
+
+def test_fastpath_no_args(shim):
+    ret = shim()
+    assert ret == 'docker-compose run --rm -T -e ENV=VAL dipex '\
+                  'FIZZ=buzz JAZZ=razz jazz'
+
+
+def test_fallback_compose_changed(shim):
+    shim()
+    shim.home.join('docker-compose.yml').write(COMPOSE + '\n')
+    with mock.patch('dip.settings.Dip.compile'):
+        ret = shim('--help')
+    assert ret == 'dip run dipex -- --help FIZZ= JAZZ='
+
+
+def test_fallback_override_added(shim):
+    shim()
+    with mock.patch('dip.settings.Dip.compile'):
+        shim.home.join('docker-compose.override.yml').write(COMPOSE)
+        ret = shim('--help')
+    assert ret == 'dip run dipex -- --help FIZZ= JAZZ='
+
+
+def test_fallback_remote_stale(shim):
+    ret = shim('--help', git={'remote': 'origin', 'check_interval': 60})
+    assert ret == 'dip run dipex -- --help FIZZ= JAZZ='
+
+
+def test_fallback_trace(shim):
+    shim.env['DIP_TRACE'] = '1'
+    ret = shim('--help')
+    assert ret == 'dip run dipex -- --help FIZZ= JAZZ='
+
+
+def test_fallback_env_changed(shim):
+    shim.home.join('docker-compose.yml').write(
+        COMPOSE.replace('alpine', 'alpine:${TAG}'))
+    shim.env.pop('TAG', None)
+    shim.env.pop('COMPOSE_PROJECT_NAME', None)
+    with mock.patch.dict(os.environ, clear=True, **shim.env):
+        assert shim().startswith('docker-compose run')
+        with mock.patch('dip.settings.Dip.compile'):
+            shim.env['TAG'] = 'edge'
+            assert shim().startswith('dip run')
+            del shim.env['TAG']
+            shim.env['COMPOSE_PROJECT_NAME'] = 'fizz'
+            assert shim().startswith('dip run')
+            del shim.env['COMPOSE_PROJECT_NAME']
+            assert shim().startswith('docker-compose run')
+
+
+def test_fastpath_remote_fresh(shim):
+    plans.refresh('dipex', shim.dip_home, False, 60)
+    ret = shim('--help', git={'remote': 'origin', 'check_interval': 60})
+    assert ret.startswith('docker-compose run')
+
+
+def test_write_unchanged(tmpdir):
+    tmpdir.join('docker-compose.yml').write(
+        COMPOSE.replace('alpine', 'alpine:${TAG}'))
+    app = settings.Dip('dipex', str(tmpdir))
+    with mock.patch.dict(os.environ, {'TAG': 'latest'}):
+        plan = plans.write(app, str(tmpdir))
+        with mock.patch('dip.plans.render') as mock_render:
+            assert plans.write(app, str(tmpdir)) == plan
+            mock_render.assert_not_called()
+    with mock.patch.dict(os.environ, {'TAG': 'edge'}):
+        plans.write(app, str(tmpdir))
+    with open(plan) as stream:
+        assert "[ \"$TAG\" = edge ]" in stream.read()
+
+
+def test_write_atomic(tmpdir):
+    tmpdir.join('docker-compose.yml').write(COMPOSE)
+    app = settings.Dip('dipex', str(tmpdir))
+    plan = plans.write(app, str(tmpdir))
+    with open(plan) as stream:
+        old = stream.read()
+
+    # Readers of the old plan keep reading it whole while it is replaced
+    with open(plan) as reader:
+        app.env['FIZZ'] = 'buzz'
+        assert plans.write(app, str(tmpdir)) == plan
+        assert reader.read() == old
+    with open(plan) as stream:
+        assert stream.read() != old
+    assert os.listdir(os.path.dirname(plan)) == ['dipex.sh']
+
+
+def test_write_remote_without_interval(tmpdir):
+    app = settings.Dip('dipex', str(tmpdir), git={'remote': 'origin'})
+    assert plans.write(app, str(tmpdir)) is None
+    assert not os.path.exists(plans.path('dipex', str(tmpdir)))
+
+
+def test_write_not_compiled(tmpdir):
+    app = settings.Dip('dipex', str(tmpdir), runner='service')
+    assert plans.write(app, str(tmpdir)) is None
+    assert not os.path.exists(plans.path('dipex', str(tmpdir)))
+
+
+@mock.patch('dip.plans.render')
+def test_write_err(mock_render, tmpdir):
+    mock_render.side_effect = errors.NoSuchService('dipex')
+    app = settings.Dip('dipex', str(tmpdir))
+    assert plans.write(app, str(tmpdir)) is None
+    assert not os.path.exists(plans.path('dipex', str(tmpdir)))
+
+
+def test_refresh(tmpdir):
+    plans.refresh('dipex', str(tmpdir), False, 60, now=100)
+    with open(plans.stamp('dipex', str(tmpdir))) as stamp:
+        assert stamp.read() == '160\n'
+    plans.refresh('dipex', str(tmpdir), True, 60)
+    assert not os.path.exists(plans.stamp('dipex', str(tmpdir)))
+
+
+@mock.patch('os.makedirs')
+def test_refresh_err(mock_mkdir, tmpdir):
+    mock_mkdir.side_effect = OSError
+    plans.refresh('dipex', str(tmpdir), False, 60)
+    assert not os.path.exists(plans.stamp('dipex', str(tmpdir)))
+
+
+def test_files(tmpdir):
+    tmpdir.join('docker-compose.yml').write(COMPOSE)
+    app = settings.Dip('dipex', str(tmpdir), dotenv='.env.dip')
+    ret = plans.files(app)
+    assert str(tmpdir.join('docker-compose.yml')) in ret
+    assert str(tmpdir.join('docker-compose.override.yml')) in ret
+    assert str(tmpdir.join('.env')) in ret
+    assert str(tmpdir.join('.env.dip')) in ret
+
+
+def test_render_exports(tmpdir):
+    tmpdir.join('docker-compose.yml').write(COMPOSE)
+    tmpdir.join('.env.dip').write('FIZZ=buzz\nENV=dotenv\n')
+    app = settings.Dip('dipex', str(tmpdir), env={'ENV': 'VAL'},
+                       dotenv='.env.dip')
+    ret = plans.render(app, str(tmpdir))
+    assert '[ -n "${ENV+x}" ] || export ENV=VAL\n' in ret
+    assert '[ -n "${FIZZ+x}" ] || export FIZZ=buzz\n' in ret
@@ -0,0 +1,495 @@
+import os
+import shlex
+import subprocess
+import textwrap
+import threading
+import time
+from unittest import mock
+
+import py
+import pytest
+from dip import errors
+from dip import runners
+from dip import settings
+
+COMPOSE = textwrap.dedent('''
+    version: '3'
+    services:
+      dipex:
+        image: alpine
+        entrypoint: ["sh", "-c"]
+        command: echo hi
+        working_dir: /tmp
+        user: nobody
+        environment:
+          FIZZ: buzz
+          JAZZ:
+        volumes:
+          - /src:/src:ro
+          - data:/data
+          - ext:/ext
+          - named:/named
+      built:
+        build: .
+        entrypoint: /bin/entry --verbose
+        network_mode: host
+    volumes:
+      data:
+      ext:
+        external: true
+      named:
+        name: custom
+''')
+
+
+@pytest.fixture
+def home(tmpdir):
+    tmpdir.join('docker-compose.yml').write(COMPOSE)
+    return str(tmpdir)
+
+
+def test_get():
+    app = settings.Dip('dipex', '/path/to/docker/compose/dir')
+    ret = runners.get('compose-v2', app)
+    assert isinstance(ret, runners.ComposeV2)
+    assert str(ret) == 'compose-v2'
+    assert repr(ret) == 'ComposeV2(compose-v2)'
+
+
+def test_get_err():
+    app = settings.Dip('dipex', '/path/to/docker/compose/dir')
+    with pytest.raises(errors.NoSuchRunnerError):
+        runners.get('fizz', app)
+
+
+def test_runner_command():
+    app = settings.Dip('dipex', '/path/to/docker/compose/dir')
+    with pytest.raises(NotImplementedError):
+        runners.Runner(app).command()
+
+
+@mock.patch('dip.utils.notty')
+def test_compose(mock_tty):
+    mock_tty.return_value = False
+    app = settings.Dip('dipex', '/path/to/docker/compose/dir',
+                       env={'FIZZ': 'BUZZ'})
+    ret = runners.Compose(app).command('--help')
+    assert ret == ['docker-compose', 'run', '--rm', '-e', 'FIZZ=BUZZ',
+                   'dipex', '--help']
+
+
+def test_compose_notty():
+    app = settings.Dip('dipex', '/path/to/docker/compose/dir')
+    ret = runners.Compose(app).command(notty=True)
+    assert ret == ['docker-compose', 'run', '--rm', '-T', 'dipex']
+
+
+@mock.patch('dip.utils.notty')
+def test_compose_v2(mock_tty):
+    mock_tty.return_value = True
+    app = settings.Dip('dipex', '/path/to/docker/compose/dir')
+    ret = runners.ComposeV2(app).command('--help')
+    assert ret == ['docker', 'compose', 'run', '--rm', '-T',
+                   'dipex', '--help']
+
+
+def test_resolve(home):
+    project, config = runners.resolve(home)
+    assert project == runners.resolve(home)[0]
+    assert sorted(x['name'] for x in config.services) == ['built', 'dipex']
+
+
+@mock.patch('dip.utils.notty')
+def test_docker(mock_tty, home):
+    mock_tty.return_value = True
+    app = settings.Dip('dipex', home, env={'FIZZ': 'BAZZ'})
+    project, _ = runners.resolve(home)
+    ret = runners.Docker(app).command()
+    assert ret == ['docker', 'run', '--rm', '-i',
+                   '-e', 'FIZZ=buzz',
+                   '-e', 'JAZZ',
+                   '-e', 'FIZZ=BAZZ',
+                   '-v', '/src:/src:ro',
+                   '-v', '{}_data:/data:rw'.format(project),
+                   '-v', 'ext:/ext:rw',
+                   '-v', 'custom:/named:rw',
+                   '--network', '{}_default'.format(project),
+                   '--user', 'nobody',
+                   '--workdir', '/tmp',
+                   '--entrypoint', 'sh',
+                   'alpine', '-c', 'echo', 'hi']
+
+
+@mock.patch('dip.utils.notty')
+def test_docker_args(mock_tty, home):
+    mock_tty.return_value = False
+    app = settings.Dip('built', home)
+    project, _ = runners.resolve(home)
+    ret = runners.Docker(app).command('--help')
+    assert ret == ['docker', 'run', '--rm', '-i', '-t',
+                   '--network', 'host',
+                   '--entrypoint', '/bin/entry',
+                   '{}_built'.format(project), '--verbose', '--help']
+
+
+@mock.patch('dip.utils.notty')
+def test_docker_options(mock_tty, tmpdir):
+    mock_tty.return_value = True
+    tmpdir.join('docker-compose.yml').write(textwrap.dedent('''
+        version: '3.4'
+        services:
+          dipex:
+            image: alpine
+            cap_add: [SYS_ADMIN]
+            devices: ["/dev/fuse:/dev/fuse"]
+            extra_hosts: ["fizz:10.0.0.1"]
+            init: true
+            labels: {fizz: buzz}
+            privileged: false
+            tmpfs: /run
+            ports: ["80:80"]
+            networks:
+              front:
+                aliases: [fizz]
+              back:
+        networks:
+          front:
+            external: true
+          back:
+    '''))
+    app = settings.Dip('dipex', str(tmpdir))
+    project, _ = runners.resolve(str(tmpdir))
+    ret = runners.Docker(app).command()
+    assert ret == ['docker', 'run', '--rm', '-i',
+                   '--network', '{}_back'.format(project),
+                   '--network', 'front',
+                   '--cap-add', 'SYS_ADMIN',
+                   '--device', '/dev/fuse:/dev/fuse',
+                   '--add-host', 'fizz:10.0.0.1',
+                   '--init',
+                   '--label', 'fizz=buzz',
+                   '--tmpfs', '/run',
+                   'alpine']
+
+
+def test_docker_v1(tmpdir):
+    tmpdir.join('docker-compose.yml').write('dipex:\n  image: alpine\n')
+    app = settings.Dip('dipex', str(tmpdir))
+    assert runners.Docker(app).command(notty=True) == \
+        ['docker', 'run', '--rm', '-i', 'alpine']
+
+
+@pytest.mark.parametrize('definition, keys', [
+    ('    pid: host\n    sysctls: {net.core.somaxconn: 1024}\n',
+     "'pid', 'sysctls'"),
+    ('    networks:\n      default:\n        ipv4_address: 10.0.0.1\n',
+     "'networks.default.ipv4_address'"),
+])
+def test_docker_unsupported(tmpdir, definition, keys):
+    tmpdir.join('docker-compose.yml').write(
+        "version: '3'\nservices:\n  dipex:\n    image: alpine\n"
+        + definition)
+    app = settings.Dip('dipex', str(tmpdir))
+    with pytest.raises(errors.UnsupportedServiceError) as err:
+        runners.Docker(app).command()
+    assert str(err.value) == "Runner 'docker' does not support {} of "\
+        "service 'dipex'".format(keys)
+
+
+def test_docker_no_such_service(home):
+    app = settings.Dip('fizz', home)
+    with pytest.raises(errors.NoSuchService):
+        runners.Docker(app).command()
+
+
+def completed(returncode=0, stdout=''):
+    return subprocess.CompletedProcess([], returncode, stdout.encode('utf8'))
+
+
+@pytest.fixture
+def service(home):
+    with mock.patch('dip.settings.HOME', home):
+        with mock.patch('dip.plans.fingerprint', return_value='cksum'):
+            app = settings.Dip('dipex', home, env={'FIZZ': 'BAZZ'},
+                               runner='service', opts={'idle': 60})
+            yield app.backend
+
+
+def test_service(service):
+    assert isinstance(service, runners.Service)
+    assert service.container == 'dip-dipex'
+    assert service.idle == 60
+    assert not service.compiled
+    fingerprint = service.fingerprint()
+    assert fingerprint == service.fingerprint()
+
+
+def test_managed_fingerprint_env(service):
+    fingerprint = service.fingerprint()
+    with mock.patch.dict(os.environ, {'COMPOSE_PROJECT_NAME': 'fizz'}):
+        assert service.fingerprint() != fingerprint
+    service.app.env['FIZZ'] = 'JAZZ'
+    assert service.fingerprint() != fingerprint
+
+
+@mock.patch('subprocess.run')
+@mock.patch('dip.utils.notty')
+def test_service_prepare(mock_tty, mock_run, service):
+    mock_tty.return_value = False
+    mock_run.side_effect = [completed(1), completed()]
+    service.prepare()
+    fingerprint = service.fingerprint()
+    assert [x[0][0] for x in mock_run.call_args_list] == [
+        ['docker', 'rm', '-f', 'dip-dipex'],
+        ['docker-compose', 'run', '-d', '--name', 'dip-dipex',
+         '-l', 'dip.service=dipex', '-l', 'dip.fingerprint=' + fingerprint,
+         '--entrypoint', 'tail', 'dipex', '-f', '/dev/null']]
+    assert mock_run.call_args[1]['cwd'] == service.app.home
+    assert service.command() == ['docker', 'exec', '-i', '-t',
+                                 '-e', 'FIZZ=BAZZ', 'dip-dipex',
+                                 'sh', '-c', 'echo', 'hi']
+    assert service.command('ls', notty=True) == [
+        'docker', 'exec', '-i', '-e', 'FIZZ=BAZZ', 'dip-dipex',
+        'sh', '-c', 'ls']
+
+    # Running and fresh container is reused
+    mock_run.reset_mock()
+    mock_run.side_effect = None
+    mock_run.return_value = completed(stdout='true ' + fingerprint)
+    service.prepare()
+    mock_run.assert_called_once()
+    assert not service.expired()
+
+
+@mock.patch('subprocess.run')
+def test_service_prepare_image(mock_run, home):
+    home = py.path.local(home)
+    home.join('docker-compose.yml').write(textwrap.dedent('''
+        version: '3'
+        services:
+          web:
+            image: nginx
+    '''))
+    mock_run.side_effect = [
+        completed(1),
+        completed(),
+        completed(stdout='sha256:abc'),
+        completed(stdout='["/docker-entrypoint.sh"]\n["nginx"]')]
+    with mock.patch('dip.settings.HOME', str(home)):
+        with mock.patch('dip.plans.fingerprint', return_value='cksum'):
+            backend = settings.Dip('web', str(home), runner='service').backend
+            backend.prepare()
+            assert mock_run.call_args[0][0] == [
+                'docker', 'inspect', '--format',
+                '{{json .Config.Entrypoint}}\n{{json .Config.Cmd}}',
+                'sha256:abc']
+            assert backend.command(notty=True) == [
+                'docker', 'exec', '-i', 'dip-web',
+                '/docker-entrypoint.sh', 'nginx']
+
+
+@mock.patch('subprocess.run')
+def test_service_prepare_err(mock_run, service):
+    mock_run.side_effect = [completed(1), completed(1)]
+    with pytest.raises(errors.ContainerError):
+        service.prepare()
+
+
+@mock.patch('subprocess.run')
+@mock.patch('time.time')
+def test_service_expired(mock_time, mock_run, service):
+    mock_run.return_value = completed(stdout='true ' + service.fingerprint())
+    service.save({'used': 1000})
+    mock_time.return_value = 1059
+    assert not service.expired()
+    mock_time.return_value = 1060
+    assert service.expired()
+
+    # Restarted after being idle
+    mock_run.reset_mock()
+    mock_run.side_effect = [completed(), completed()]
+    service.prepare()
+    assert mock_run.call_args_list[0][0][0] == \
+        ['docker', 'rm', '-f', 'dip-dipex']
+    assert service.load()['used'] == 1060
+
+
+def test_service_prepare_lock(service):
+    started = []
+
+    def start(fingerprint):
+        started.append(fingerprint)
+        time.sleep(0.1)
+        return {'fingerprint': fingerprint}
+
+    def running():
+        return started[-1] if started else None
+
+    with mock.patch.object(runners.Service, 'remove'), \
+            mock.patch.object(service, 'start', side_effect=start), \
+            mock.patch.object(service, 'running', side_effect=running):
+        threads = [threading.Thread(target=service.prepare)
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    assert started == [service.fingerprint()]
+
+
+@mock.patch('subprocess.run')
+def test_service_stop(mock_run, service):
+    service.save({'used': 1000})
+    mock_run.return_value = completed()
+    assert service.stop()
+    assert service.load() == {}
+    mock_run.return_value = completed(1)
+    assert not service.stop()
+
+
+@mock.patch('subprocess.run')
+def test_service_containers(mock_run):
+    mock_run.return_value = completed(stdout='dip-fizz fizz\ndip-buzz buzz\n')
+    assert list(runners.Service.containers()) == \
+        [('dip-fizz', 'fizz'), ('dip-buzz', 'buzz')]
+    assert mock_run.call_args[0][0] == [
+        'docker', 'ps', '-a', '--filter', 'label=dip.service',
+        '--format', '{{.Names}} {{.Label "dip.service"}}']
+
+
+@pytest.fixture
+def pool(home):
+    with mock.patch('dip.settings.HOME', home):
+        with mock.patch('dip.plans.fingerprint', return_value='cksum'):
+            app = settings.Dip('dipex', home, runner='pool', opts={'size': 1})
+            yield app.backend
+
+
+def test_pool(pool):
+    assert isinstance(pool, runners.Pool)
+    assert pool.size == 1
+    assert pool.ttl == 3600
+    assert not pool.compiled
+    assert pool.container('abcd') == 'dip-dipex-abcd'
+
+
+def test_pool_wrapper(tmpdir):
+    argv = ['printf', '%s|', 'fizz buzz', "it's", '$HOME']
+    tmpdir.join('argv').write(' '.join(shlex.quote(x) for x in argv))
+    wrapper = runners.Pool.WRAPPER.replace(runners.Pool.MOUNT, str(tmpdir))
+    proc = subprocess.run(['/bin/sh', '-c', wrapper], stdout=subprocess.PIPE)
+    assert proc.stdout == b"fizz buzz|it's|$HOME|"
+
+
+@mock.patch('subprocess.Popen')
+@mock.patch('dip.utils.notty')
+def test_pool_empty(mock_tty, mock_popen, pool):
+    mock_tty.return_value = True
+    pool.prepare()
+    assert pool.claimed is None
+    assert pool.command('ls')[:3] == ['docker', 'run', '--rm']
+    mock_popen.assert_called_once()
+    assert mock_popen.call_args[0][0][-2:] == ['pool', 'dipex']
+
+
+@mock.patch('subprocess.Popen')
+@mock.patch('subprocess.run')
+@mock.patch('dip.utils.notty')
+def test_pool_fill_claim(mock_tty, mock_run, mock_popen, pool, home):
+    mock_tty.return_value = True
+    mock_run.side_effect = [completed(stdout='sha256:img'), completed()]
+    assert pool.fill() == 1
+    name = pool.load()['containers'][0]['name']
+    slot = os.path.join(home, 'pool', name)
+    assert mock_run.call_args[0][0] == [
+        'docker', 'create', '--rm', '-i',
+        '--name', name,
+        '-l', 'dip.pool=dipex',
+        '-v', '{}:/.dip:ro'.format(slot),
+        '-e', 'FIZZ=buzz', '-e', 'JAZZ',
+        '-v', '/src:/src:ro',
+        '-v', '{}_data:/data:rw'.format(runners.resolve(home)[0]),
+        '-v', 'ext:/ext:rw',
+        '-v', 'custom:/named:rw',
+        '--network', '{}_default'.format(runners.resolve(home)[0]),
+        '--user', 'nobody',
+        '--workdir', '/tmp',
+        '--entrypoint', '/bin/sh', 'alpine', '-c', runners.Pool.WRAPPER]
+
+    # Full pool is not refilled
+    mock_run.reset_mock()
+    mock_run.side_effect = [completed(stdout='sha256:img')]
+    assert pool.fill() == 0
+
+    # Containers of a different image are not claimed
+    mock_run.side_effect = [completed(stdout='sha256:new')]
+    pool.prepare()
+    assert pool.claimed is None
+    assert mock_run.call_args[0][0] == \
+        ['docker', 'inspect', '--format', '{{.Id}}', 'alpine']
+
+    mock_run.side_effect = [completed(stdout='sha256:img')]
+    pool.prepare()
+    assert pool.claimed == name
+    assert pool.load()['containers'] == []
+    assert pool.command('ls', '-l') == ['docker', 'start', '-a', '-i', name]
+    with open(os.path.join(slot, 'argv')) as argv:
+        assert argv.read() == 'sh -c ls -l'
+    assert mock_popen.call_count == 2
+
+
+@mock.patch('subprocess.run')
+@mock.patch('time.time')
+def test_pool_fill_stale(mock_time, mock_run, pool):
+    mock_time.return_value = 5000
+    pool.save({'fingerprint': pool.fingerprint(),
+               'image': 'sha256:old',
+               'tty': False,
+               'containers': [{'name': 'dip-dipex-old',
+                               'created': 4000,
+                               'tty': False}]})
+    mock_run.side_effect = [completed(stdout='sha256:new'),
+                            completed(),
+                            completed()]
+    assert pool.fill() == 1
+    assert mock_run.call_args_list[1][0][0] == \
+        ['docker', 'rm', '-f', 'dip-dipex-old']
+    assert [x['name'] for x in pool.load()['containers']] != \
+        ['dip-dipex-old']
+
+
+@mock.patch('time.time')
+def test_pool_pooled(mock_time, pool):
+    mock_time.return_value = 5000
+    pool.save({'fingerprint': pool.fingerprint(),
+               'containers': [{'name': 'dip-dipex-new',
+                               'created': 4000,
+                               'tty': False},
+                              {'name': 'dip-dipex-old',
+                               'created': 1000,
+                               'tty': False}]})
+    assert pool.pooled('dip-dipex-new')
+    assert not pool.pooled('dip-dipex-old')
+    assert not pool.pooled('dip-dipex-fizz')
+
+
+@mock.patch('subprocess.run')
+def test_pool_create_err(mock_run, pool, home):
+    mock_run.return_value = completed(1)
+    with pytest.raises(errors.ContainerError):
+        pool.create(False, 'alpine')
+    assert os.listdir(os.path.join(home, 'pool')) == []
+
+
+@mock.patch('subprocess.run')
+def test_pool_stop(mock_run, pool):
+    pool.save({'containers': [{'name': 'dip-dipex-abcd',
+                               'created': 0,
+                               'tty': False}]})
+    mock_run.return_value = completed()
+    assert pool.stop()
+    mock_run.assert_called_once_with(['docker', 'rm', '-f', 'dip-dipex-abcd'],
+                                     stdout=subprocess.DEVNULL,
+                                     stderr=subprocess.DEVNULL)
+    assert pool.load() == {}
+    assert not pool.stop()
@@ -1,15 +1,25 @@
 import json
 import os
+import subprocess
 import sys
 import tempfile
+import threading
+import time
 from unittest import mock
 
 import compose.project
 import git
 import pytest
+from dip import daemon
 from dip import errors
+from dip import plans
+from dip import runners
 from dip import settings
+from dip import state
 from . import MockSettings
+from . import gitclone
+from . import gitcommit
+from . import gitinit
 
 settings.HOME = os.path.expanduser('~/.dip')
 
@@ -18,29 +28,47 @@ settings.HOME = os.path.expanduser('~/.dip')
 @mock.patch('dip.settings.Settings.save')
 def test_load(mock_save, mock_load):
     with settings.load('/path/to/settings.json'):
-        mock_load.assert_called_once_with('/path/to/settings.json')
+        mock_load.assert_called_once_with('/path/to/settings.json', None)
         mock_save.assert_not_called()
 
 
-@mock.patch('os.chdir')
-@mock.patch('os.path.abspath')
-def test_indir(mock_abs, mock_chdir):
-    path = os.path.split(__file__)[0]
-    mock_abs.return_value = path
-    with settings.indir('/tmp/dir'):
-        mock_chdir.assert_called_once_with('/tmp/dir')
-    mock_chdir.assert_called_with(path)
-
-
-@mock.patch('dip.settings.load')
+@mock.patch('dip.settings.Settings.load')
 @mock.patch('dip.settings.Settings.save')
-def test_saveonexit(mock_save, mock_load):
-    mock_load.return_value.__enter__.return_value = MockSettings()
-    with settings.saveonexit():
+def test_saveonexit(mock_save, mock_load, tmpdir):
+    with settings.saveonexit(str(tmpdir.join('settings.json'))):
+        mock_load.assert_called_once_with()
         mock_save.assert_not_called()
     mock_save.assert_called_once_with()
 
 
+def test_saveonexit_concurrent(tmpdir):
+    # Installs saved while another install holds settings are kept
+    filepath = str(tmpdir.join('settings.json'))
+    with settings.saveonexit(filepath) as cfg:
+        cfg['fizz'] = settings.Dip('fizz', '/path/to/fizz')
+    with settings.load(filepath) as cfg:
+        with settings.saveonexit(filepath) as other:
+            other['buzz'] = settings.Dip('buzz', '/path/to/buzz')
+        cfg['jazz'] = settings.Dip('jazz', '/path/to/jazz')
+        del cfg['fizz']
+        cfg.save()
+    with settings.load(filepath) as cfg:
+        assert sorted(cfg) == ['buzz', 'jazz']
+
+
+@mock.patch('dip.settings.Dip.validate')
+def test_getapp_single(mock_validate, tmpdir):
+    filepath = str(tmpdir.join('settings.db'))
+    with settings.saveonexit(filepath) as cfg:
+        cfg['fizz'] = settings.Dip('fizz', '/path/to/fizz')
+        cfg['buzz'] = settings.Dip('buzz', '/path/to/buzz')
+    with settings.getapp('fizz', filepath) as app:
+        assert app.home == '/path/to/fizz'
+    with pytest.raises(errors.NotInstalledError):
+        with settings.getapp('jazz', filepath):
+            pass
+
+
 @mock.patch('dip.settings.load')
 def test_getapp(mock_load):
     with mock.patch('dip.settings.Dip.validate'):
@@ -95,7 +123,9 @@ def test_repo_repr():
                                               'branch': 'branch'}),
      (('/tmp/fizzbuzz', 'remote', 'branch', 5), {'remote': 'remote',
                                                  'branch': 'branch',
-                                                 'sleep': 5})])
+                                                 'sleep': 5}),
+     (('/tmp/fizzbuzz', 'remote', 'branch', None, 'ls-remote'),
+      {'remote': 'remote', 'branch': 'branch', 'check': 'ls-remote'})])
 def test_repo_iter(args, expected):
     with mock.patch('git.Repo'):
         repo = settings.Repo(*args)
@@ -142,63 +172,276 @@ def test_repo_sleep(mock_sleep):
     mock_sleep.assert_called_once_with(5)
 
 
+@mock.patch('dip.settings.Repo.output')
+@mock.patch('dip.settings.Repo.repo')
+@mock.patch('compose.config.config.get_default_config_files')
+@mock.patch('subprocess.call')
+@mock.patch('dip.settings.blobid')
+def test_repo_diffs(mock_blob, mock_call, mock_compose, mock_repo, mock_out,
+                    tmpdir):
+    mock_repo.working_dir = '/path'
+    mock_repo.git_dir = str(tmpdir)
+    mock_repo.commit.return_value.tree.__truediv__.return_value\
+        .hexsha = 'abc'
+    mock_blob.return_value = 'def'
+    mock_compose.return_value = ['/path/to/docker-compose.yml']
+    repo = settings.Repo('.', 'origin', 'master')
+    ret = any(repo.diffs())
+    mock_out.assert_called_once_with('fetch', '--quiet',
+                                     mock_repo.remote.return_value.name,
+                                     timeout=None)
+    mock_repo.commit.assert_called_once_with('origin/master')
+    mock_call.assert_called_once_with([
+        'git', 'diff',
+        'origin/master:to/docker-compose.yml',
+        '/path/to/docker-compose.yml'], cwd=os.path.abspath('.'))
+    assert ret is True
+
+
+@mock.patch('dip.settings.Repo.output')
+@mock.patch('dip.settings.Repo.repo')
+@mock.patch('compose.config.config.get_default_config_files')
+@mock.patch('subprocess.call')
+@mock.patch('dip.settings.blobid')
+def test_repo_diffs_trace(mock_blob, mock_call, mock_compose, mock_repo,
+                          mock_out, tmpdir):
+    mock_repo.working_dir = '/path'
+    mock_repo.git_dir = str(tmpdir)
+    mock_blob.return_value = 'def'
+    mock_compose.return_value = ['/path/to/docker-compose.yml']
+    filepath = str(tmpdir.join('trace.jsonl'))
+    with mock.patch('dip.trace.TARGET', filepath):
+        assert list(settings.Repo('.', 'origin', 'master').diffs()) == [1]
+    with open(filepath) as stream:
+        spans = [json.loads(x) for x in stream]
+    assert [(x['span'], x.get('remote'), x.get('file')) for x in spans] == \
+        [('fetch', 'origin', None), ('diff', None, 'to/docker-compose.yml')]
+
+
+@mock.patch('dip.settings.Repo.output')
+@mock.patch('dip.settings.Repo.repo')
+@mock.patch('compose.config.config.get_default_config_files')
+@mock.patch('subprocess.call')
+@mock.patch('dip.settings.blobid')
+def test_repo_diffs_quiet(mock_blob, mock_call, mock_compose, mock_repo,
+                          mock_out, tmpdir):
+    mock_repo.working_dir = '/path'
+    mock_repo.git_dir = str(tmpdir)
+    mock_repo.commit.return_value.tree.__truediv__.return_value\
+        .hexsha = 'abc'
+    mock_blob.return_value = 'def'
+    mock_compose.return_value = ['/path/to/docker-compose.yml']
+    repo = settings.Repo('.', 'origin', 'master')
+    ret = any(repo.diffs(quiet=True))
+    mock_call.assert_not_called()
+    assert ret is True
+
+
+@mock.patch('dip.settings.Repo.output')
 @mock.patch('dip.settings.Repo.repo')
 @mock.patch('compose.config.config.get_default_config_files')
 @mock.patch('subprocess.call')
-def test_repo_diffs(mock_call, mock_compose, mock_repo):
-    with mock.patch('dip.settings.indir'):
-        mock_repo.remote.return_value.name = 'origin'
-        mock_compose.return_value = ['/path/to/docker-compose.yml']
-        mock_call.return_value = 1
-        repo = settings.Repo('.', 'origin', 'master')
-        ret = any(repo.diffs())
-        mock_repo.remote.return_value.fetch.assert_called_once_with()
-        mock_call.assert_called_once_with([
-            'git', 'diff', '--exit-code',
-            'origin/master:path/to/docker-compose.yml',
-            '/path/to/docker-compose.yml'])
-        assert ret is True
+@mock.patch('dip.settings.blobid')
+def test_repo_diffs_same(mock_blob, mock_call, mock_compose, mock_repo,
+                         mock_out, tmpdir):
+    mock_repo.working_dir = '/path'
+    mock_repo.git_dir = str(tmpdir)
+    mock_repo.commit.return_value.tree.__truediv__.return_value\
+        .hexsha = 'abc'
+    mock_blob.return_value = 'abc'
+    mock_compose.return_value = ['/path/to/docker-compose.yml']
+    repo = settings.Repo('.', 'origin', 'master')
+    ret = any(repo.diffs())
+    mock_call.assert_not_called()
+    assert ret is False
 
 
+@mock.patch('dip.settings.Repo.output')
 @mock.patch('dip.settings.Repo.repo')
 @mock.patch('compose.config.config.get_default_config_files')
-@mock.patch('subprocess.call')
-@mock.patch('dip.settings.devnull')
-def test_repo_diffs_quiet(mock_null, mock_call, mock_compose, mock_repo):
-    with mock.patch('dip.settings.indir'):
-        mock_repo.remote.return_value.name = 'origin'
-        mock_compose.return_value = ['/path/to/docker-compose.yml']
-        mock_call.return_value = 1
-        repo = settings.Repo('.', 'origin', 'master')
-        ret = any(repo.diffs(quiet=True))
-        mock_repo.remote.return_value.fetch.assert_called_once_with()
-        mock_call.assert_called_once_with([
-            'git', 'diff', '--exit-code',
-            'origin/master:path/to/docker-compose.yml',
-            '/path/to/docker-compose.yml'],
-            stdout=mock_null.return_value.__enter__.return_value,
-            stderr=mock_null.return_value.__enter__.return_value)
-        assert ret is True
+@mock.patch('dip.settings.blobid')
+def test_repo_diffs_bad_ref(mock_blob, mock_compose, mock_repo, mock_out,
+                            tmpdir):
+    mock_repo.working_dir = '/path'
+    mock_repo.git_dir = str(tmpdir)
+    mock_repo.commit.side_effect = git.exc.BadName
+    mock_compose.return_value = ['/path/to/docker-compose.yml']
+    repo = settings.Repo('.', 'origin', 'master')
+    ret = list(repo.diffs(quiet=True))
+    assert ret == [1]
+
+
+def test_repo_diffs_git(tmpdir):
+    _, clone = gitinit(tmpdir)
+    repo = settings.Repo(clone, 'origin', 'master')
+    assert list(repo.diffs(quiet=True)) == [0]
+
+    # Diverge remote
+    other = gitclone(tmpdir, 'other')
+    gitcommit(other, 'services:\n  fizz:\n    image: buzz\n')
+    assert list(repo.diffs(quiet=True)) == [1]
+
+    # Catch up local
+    repo.pull()
+    assert list(repo.diffs(quiet=True)) == [0]
+
+
+def test_repo_diffs_threads(tmpdir):
+    _, clone = gitinit(tmpdir)
+    other = gitclone(tmpdir, 'other')
+    gitcommit(other, 'services:\n  fizz:\n    image: buzz\n')
+    curdir = os.getcwd()
+    results = {}
+
+    def diff(path):
+        repo = settings.Repo(path, 'origin', 'master')
+        results[path] = list(repo.diffs(quiet=True))
+
+    threads = [threading.Thread(target=diff, args=(x,))
+               for x in [clone, other, clone, other]]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == {clone: [1], other: [0]}
+    assert os.getcwd() == curdir
+
+
+def test_blobid(tmpdir):
+    path = tmpdir.join('docker-compose.yml')
+    path.write('fizz\n')
+    ret = subprocess.check_output(['git', 'hash-object', str(path)])
+    assert settings.blobid(str(path)) == ret.decode('utf8').strip()
 
 
 @mock.patch('dip.settings.Repo.repo')
 def test_repo_diffs_err(mock_repo):
     with mock.patch('compose.config.config.get_default_config_files'):
         with mock.patch('subprocess.call'):
-            with mock.patch('dip.settings.indir'):
-                mock_repo.remote.side_effect = \
-                    git.exc.GitCommandError('test', 'test')
-                repo = settings.Repo('.', 'origin', 'master')
-                with pytest.raises(errors.GitFetchError):
-                    assert any(repo.diffs())
+            mock_repo.remote.side_effect = \
+                git.exc.GitCommandError('test', 'test')
+            repo = settings.Repo('.', 'origin', 'master')
+            with pytest.raises(errors.GitFetchError):
+                assert any(repo.diffs())
+
+
+@mock.patch('dip.settings.Repo.output')
+@mock.patch('dip.settings.Repo.repo')
+def test_repo_fetch(mock_repo, mock_out, tmpdir):
+    mock_repo.git_dir = str(tmpdir)
+    mock_repo.remote.return_value.name = 'origin'
+    repo = settings.Repo('.', 'origin', 'master')
+    repo.fetch()
+    mock_out.assert_called_once_with('fetch', '--quiet', 'origin',
+                                     timeout=None)
+    assert tmpdir.join('dip-fetch-origin.lock').check()
+
+
+@mock.patch('dip.settings.Repo.output')
+@mock.patch('dip.settings.Repo.repo')
+def test_repo_fetch_err(mock_repo, mock_out, tmpdir):
+    mock_repo.git_dir = str(tmpdir)
+    mock_repo.remote.return_value.name = 'origin'
+    mock_out.side_effect = subprocess.CalledProcessError(1, 'git')
+    repo = settings.Repo('.', 'origin', 'master')
+    with pytest.raises(errors.GitFetchError):
+        repo.fetch()
+
+
+@mock.patch('dip.flight.call')
+@mock.patch('dip.settings.Repo.repo')
+def test_repo_fetch_coalesced_err(mock_repo, mock_call, tmpdir):
+    mock_repo.git_dir = str(tmpdir)
+    mock_repo.remote.return_value.name = 'origin'
+    mock_call.return_value = {'time': 0, 'error': 'test'}
+    repo = settings.Repo('.', 'origin', 'master')
+    with pytest.raises(errors.GitFetchError):
+        repo.fetch()
+
+
+@pytest.mark.parametrize('check, expected', [
+    (None, 'fetch'),
+    ('ls-remote', 'ls-remote'),
+])
+def test_repo_check(check, expected):
+    repo = settings.Repo('.', 'origin', 'master', check=check)
+    assert repo.check == expected
+
+
+def test_repo_moved_git(tmpdir):
+    _, clone = gitinit(tmpdir)
+    repo = settings.Repo(clone, 'origin', 'master', check='ls-remote')
+    assert repo.moved() is False
+
+    # Move remote
+    other = gitclone(tmpdir, 'other')
+    gitcommit(other, 'services:\n  fizz:\n    image: buzz\n')
+    assert repo.moved() is True
+
+    # Fetch remote
+    repo.fetch()
+    assert repo.moved() is False
+
+
+def test_repo_repo_cache(tmpdir):
+    _, clone = gitinit(tmpdir)
+    repo = settings.Repo(clone, 'origin', 'master')
+    assert repo.repo is settings.Repo(clone).repo
+    head = repo.repo
+
+    # A moved HEAD opens the repo again
+    gitcommit(clone, 'services:\n  fizz:\n    image: buzz\n')
+    gitcommit(clone, 'services:\n  fizz:\n    image: jazz\n')
+    tmpdir.join('local', '.git', 'HEAD').write('ref: refs/heads/other\n')
+    assert repo.repo is not head
+
+
+def test_repo_moved_err(tmpdir):
+    _, clone = gitinit(tmpdir)
+    repo = settings.Repo(clone, 'nope', 'master', check='ls-remote')
+    assert repo.moved() is True
+
+
+@mock.patch('dip.settings.Repo.moved')
+@mock.patch('dip.settings.Repo.repo')
+def test_repo_fetch_unmoved(mock_repo, mock_moved):
+    mock_moved.return_value = False
+    repo = settings.Repo('.', 'origin', 'master', check='ls-remote')
+    with mock.patch('dip.settings.Repo.output') as mock_out:
+        repo.fetch()
+    mock_out.assert_not_called()
+
+
+@mock.patch('dip.settings.Repo.output')
+@mock.patch('dip.settings.Repo.moved')
+@mock.patch('dip.settings.Repo.repo')
+def test_repo_fetch_moved(mock_repo, mock_moved, mock_out, tmpdir):
+    mock_repo.git_dir = str(tmpdir)
+    mock_repo.remote.return_value.name = 'origin'
+    mock_moved.return_value = True
+    repo = settings.Repo('.', 'origin', 'master', check='ls-remote')
+    repo.fetch()
+    mock_out.assert_called_once_with('fetch', '--quiet', 'origin',
+                                     timeout=None)
 
 
 @mock.patch('subprocess.call')
 def test_repo_pull(mock_call):
-    with mock.patch('dip.settings.indir'):
-        repo = settings.Repo('.', 'origin', 'master')
-        repo.pull()
-        mock_call.assert_called_once_with(['git', 'pull', 'origin', 'master'])
+    repo = settings.Repo('.', 'origin', 'master')
+    repo.pull()
+    mock_call.assert_called_once_with(['git', 'pull', 'origin', 'master'],
+                                      cwd=os.path.abspath('.'))
+
+
+@mock.patch('subprocess.call')
+def test_repo_pull_quiet(mock_call):
+    mock_call.return_value = 1
+    repo = settings.Repo('.', 'origin', 'master')
+    assert repo.pull(quiet=True) == 1
+    mock_call.assert_called_once_with(['git', 'pull', 'origin', 'master'],
+                                      cwd=os.path.abspath('.'),
+                                      stdout=subprocess.DEVNULL,
+                                      stderr=subprocess.DEVNULL)
 
 
 def test_dip_init():
@@ -264,18 +507,24 @@ def test_dip_len():
     assert len(MockSettings()['fizz']) == 5
     assert len(MockSettings()['buzz']) == 4
     assert len(MockSettings()['jazz']) == 4
+    assert len(settings.Dip('dipex', '/path', dotenv='.env',
+                            runner='docker')) == 5
+    assert len(settings.Dip('dipex', '/path', runner='service',
+                            opts={'idle': 60, 'fizz': None})) == 5
 
 
 def test_dip_iter():
     with mock.patch('git.Repo'):
         ret = settings.Dip('dipex', '/path/to/docker/compose/dir', '/bin',
-                           {'ENV': 'VAL'}, {'remote': 'origin'}, '.env')
+                           {'ENV': 'VAL'}, {'remote': 'origin'}, '.env',
+                           'docker')
         assert dict(ret) == {'name': 'dipex',
                              'home': '/path/to/docker/compose/dir',
                              'path': '/bin',
                              'env': {'ENV': 'VAL'},
                              'git': {'remote': 'origin'},
-                             'dotenv': '.env'}
+                             'dotenv': '.env',
+                             'runner': 'docker'}
 
 
 @mock.patch('dip.settings.Repo')
@@ -286,7 +535,8 @@ def test_dip_repo(mock_repo):
                             'sleep': 5})
     assert app.repo
     mock_repo.assert_called_once_with('/path/to/docker/compose/dir',
-                                      'origin', 'master', 5)
+                                      'origin', 'master', 5, None,
+                                      settings.FETCH_TIMEOUT)
 
 
 @mock.patch('compose.cli.command.get_project')
@@ -316,8 +566,9 @@ def test_dip_definitions(mock_cfg):
         assert ret == ['fizzbuzz']
 
 
+@mock.patch('dip.settings.Repo.fetch')
 @mock.patch('dip.settings.Repo.diffs')
-def test_dip_diff(mock_diffs):
+def test_dip_diff(mock_diffs, mock_fetch):
     mock_diffs.return_value = iter([False])
     app = settings.Dip('dipex', '/path/to/docker/compose/dir', '/bin',
                        git={'remote': 'origin',
@@ -327,6 +578,288 @@ def test_dip_diff(mock_diffs):
     assert ret is False
 
 
+@mock.patch('dip.settings.Repo.fetch')
+@mock.patch('dip.settings.Repo.head', 'abc')
+@mock.patch('dip.settings.Repo.diffs')
+def test_dip_diff_cached(mock_diffs, mock_fetch, tmpdir):
+    with mock.patch('dip.settings.HOME', str(tmpdir)):
+        mock_diffs.return_value = iter([True])
+        app = settings.Dip('dipex', '/path/to/docker/compose/dir', '/bin',
+                           git={'remote': 'origin',
+                                'branch': 'master',
+                                'check_interval': 300})
+        assert app.diff() is True
+        assert app.diff() is True
+        assert mock_diffs.call_args_list == [mock.call(False, fetch=False)] * 2
+        mock_fetch.assert_called_once_with()
+
+
+@mock.patch('dip.settings.Repo.fetch')
+@mock.patch('dip.settings.Repo.head', 'abc')
+@mock.patch('dip.settings.Repo.diffs')
+def test_dip_diff_cached_quiet(mock_diffs, mock_fetch, tmpdir):
+    with mock.patch('dip.settings.HOME', str(tmpdir)):
+        mock_diffs.side_effect = lambda *args, **kwargs: iter([True])
+        app = settings.Dip('dipex', '/path/to/docker/compose/dir', '/bin',
+                           git={'remote': 'origin',
+                                'branch': 'master',
+                                'check_interval': 300})
+        assert app.diff(quiet=True) is True
+        assert app.diff(quiet=True) is True
+        mock_diffs.assert_called_once_with(True, fetch=False)
+
+
+@mock.patch('dip.settings.Repo.fetch')
+@mock.patch('dip.settings.Repo.diffs')
+def test_dip_diff_cache_moved(mock_diffs, mock_fetch, tmpdir):
+    with mock.patch('dip.settings.HOME', str(tmpdir)):
+        mock_diffs.side_effect = [iter([True]), iter([False])]
+        app = settings.Dip('dipex', '/path/to/docker/compose/dir', '/bin',
+                           git={'remote': 'origin',
+                                'branch': 'master',
+                                'check_interval': 300})
+        with mock.patch('dip.settings.Repo.head', 'abc'):
+            assert app.diff() is True
+        with mock.patch('dip.settings.Repo.head', 'def'):
+            assert app.diff() is False
+        assert mock_diffs.call_count == 2
+
+
+@mock.patch('dip.settings.Repo.fetch')
+@mock.patch('dip.settings.Repo.head', 'abc')
+@mock.patch('dip.settings.Repo.diffs')
+def test_dip_sync(mock_diffs, mock_fetch, tmpdir):
+    with mock.patch('dip.settings.HOME', str(tmpdir)):
+        mock_diffs.return_value = iter([False, True])
+        app = settings.Dip('dipex', '/path/to/docker/compose/dir', '/bin',
+                           git={'remote': 'origin', 'branch': 'master'})
+        assert app.sync() is True
+        mock_diffs.assert_called_once_with(True, fetch=False)
+        with state.load('dipex', str(tmpdir)) as app_state:
+            assert app_state.getcheck('origin/master', 'abc', 300) is True
+
+
+@mock.patch('dip.settings.Repo.fetch')
+@mock.patch('dip.settings.Repo.head', 'abc')
+@mock.patch('dip.settings.Repo.diffs')
+def test_dip_diff_synced(mock_diffs, mock_fetch, tmpdir):
+    with mock.patch('dip.settings.HOME', str(tmpdir)):
+        mock_diffs.side_effect = lambda *args, **kwargs: iter([True])
+        app = settings.Dip('dipex', '/path/to/docker/compose/dir', '/bin',
+                           git={'remote': 'origin', 'branch': 'master'})
+
+        # Checks without ttl are not reused
+        app.sync()
+        assert app.diff() is True
+        assert mock_fetch.call_count == 2
+
+        # Checks kept fresh by `dip sync --daemon` are
+        app.sync(ttl=300)
+        assert app.diff() is True
+        assert mock_fetch.call_count == 3
+
+
+@mock.patch('dip.settings.Repo.diffs')
+@mock.patch('dip.settings.Repo.fetch')
+def test_dip_diff_timeout(mock_fetch, mock_diffs, tmpdir):
+    mock_fetch.side_effect = errors.GitFetchTimeout('origin', 3)
+    mock_diffs.side_effect = lambda *args, **kwargs: iter([True])
+    app = settings.Dip('dipex', '/path/to/docker/compose/dir', '/bin',
+                       git={'remote': 'origin', 'branch': 'master'})
+    with mock.patch('dip.settings.HOME', str(tmpdir)):
+        assert app.diff() is True
+        assert app.stale == "Timed out fetching remote 'origin' after 3s"
+        mock_diffs.assert_called_once_with(False, fetch=False)
+
+        # Repeated failures skip the fetch
+        for _ in range(settings.FAILURES - 1):
+            assert app.diff() is True
+        assert mock_fetch.call_count == settings.FAILURES
+        assert app.diff() is True
+        assert mock_fetch.call_count == settings.FAILURES
+        assert app.stale == "Skipped fetching remote 'origin' for 5m "\
+            "after repeated failures"
+
+
+@mock.patch('dip.settings.Repo.diffs')
+@mock.patch('dip.settings.Repo.fetch')
+def test_dip_diff_fetch_err(mock_fetch, mock_diffs, tmpdir):
+    mock_fetch.side_effect = [errors.GitFetchError('origin'), True]
+    mock_diffs.return_value = iter([False])
+    app = settings.Dip('dipex', '/path/to/docker/compose/dir', '/bin',
+                       git={'remote': 'origin', 'branch': 'master'})
+    with mock.patch('dip.settings.HOME', str(tmpdir)):
+        with pytest.raises(errors.GitFetchError):
+            app.diff()
+        with state.load('dipex', str(tmpdir)) as app_state:
+            assert app_state['breakers']['origin/master']['failures'] == 1
+
+        # Success resets the breaker
+        assert app.diff() is False
+        assert app.stale is None
+        with state.load('dipex', str(tmpdir)) as app_state:
+            assert app_state['breakers'] == {}
+
+
+@mock.patch('dip.settings.Repo.diffs')
+@mock.patch('dip.settings.Repo.fetch')
+def test_dip_diff_fetch_shared(mock_fetch, mock_diffs, tmpdir):
+    shared = errors.GitFetchTimeout('origin', 3)
+    shared.shared = True
+    mock_diffs.side_effect = lambda *args, **kwargs: iter([False])
+    app = settings.Dip('dipex', '/path/to/docker/compose/dir', '/bin',
+                       git={'remote': 'origin', 'branch': 'master'})
+    with mock.patch('dip.settings.HOME', str(tmpdir)):
+        # Failures reused from a concurrent fetch are not counted again
+        mock_fetch.side_effect = [errors.GitFetchTimeout('origin', 3), shared]
+        app.diff()
+        app.diff()
+        with state.load('dipex', str(tmpdir)) as app_state:
+            assert app_state['breakers']['origin/master']['failures'] == 1
+
+        # ... and neither are successes
+        mock_fetch.side_effect = [False]
+        app.diff()
+        with state.load('dipex', str(tmpdir)) as app_state:
+            assert app_state['breakers']['origin/master']['failures'] == 1
+
+
+@mock.patch('dip.settings.Repo.head', 'abc')
+@mock.patch('dip.settings.Repo.diffs')
+@mock.patch('dip.settings.Repo.fetch')
+def test_dip_sync_stale(mock_fetch, mock_diffs, tmpdir):
+    mock_fetch.side_effect = errors.GitFetchTimeout('origin', 3)
+    mock_diffs.return_value = iter([False])
+    with mock.patch('dip.settings.HOME', str(tmpdir)):
+        app = settings.Dip('dipex', '/path/to/docker/compose/dir', '/bin',
+                           git={'remote': 'origin', 'branch': 'master'})
+        assert app.sync() is False
+        with state.load('dipex', str(tmpdir)) as app_state:
+            assert app_state.lastcheck('origin/master') is None
+
+
+def test_dip_fetch_timeout():
+    app = settings.Dip('dipex', '/path', git={'remote': 'origin'})
+    assert app.fetch_timeout == settings.FETCH_TIMEOUT
+    assert app.repo.timeout == settings.FETCH_TIMEOUT
+    app.git['fetch_timeout'] = 2.5
+    assert app.repo.timeout == 2.5
+
+
+def test_repo_output(tmpdir):
+    _, clone = gitinit(tmpdir)
+    repo = settings.Repo(clone, 'origin', 'master')
+    assert repo.output('rev-parse', '--abbrev-ref', 'HEAD') == 'master\n'
+    with pytest.raises(subprocess.CalledProcessError):
+        repo.output('rev-parse', 'nope')
+
+
+def test_repo_output_timeout(tmpdir):
+    repo = settings.Repo(str(tmpdir))
+    start = time.monotonic()
+    with pytest.raises(subprocess.TimeoutExpired):
+        repo.output('-c', 'alias.slow=!sleep 10', 'slow', timeout=0.2)
+    assert time.monotonic() - start < 5
+    with pytest.raises(subprocess.TimeoutExpired):
+        repo.output('status', timeout=0)
+
+
+def test_repo_output_timeout_term(tmpdir):
+    repo = settings.Repo(str(tmpdir))
+    marker = tmpdir.join('cleaned')
+
+    # git is asked to stop first, and killed when it does not
+    slow = '!trap "touch {}; exit 1" TERM; sleep 10 & wait'.format(marker)
+    with pytest.raises(subprocess.TimeoutExpired):
+        repo.output('-c', 'alias.slow=' + slow, 'slow', timeout=0.2)
+    assert marker.check()
+    stubborn = '!trap "" TERM; sleep 10'
+    start = time.monotonic()
+    with mock.patch('dip.settings.KILL_GRACE', 0.2):
+        with pytest.raises(subprocess.TimeoutExpired):
+            repo.output('-c', 'alias.slow=' + stubborn, 'slow', timeout=0.2)
+    assert time.monotonic() - start < 5
+
+
+@mock.patch('dip.settings.Repo.output')
+@mock.patch('dip.settings.Repo.repo')
+def test_repo_fetch_timeout(mock_repo, mock_out, tmpdir):
+    mock_repo.git_dir = str(tmpdir)
+    mock_repo.remote.return_value.name = 'origin'
+    mock_out.side_effect = subprocess.TimeoutExpired('git', 3)
+    repo = settings.Repo('.', 'origin', 'master', timeout=3)
+    with pytest.raises(errors.GitFetchTimeout):
+        repo.fetch()
+    assert 0 < mock_out.call_args[1]['timeout'] <= 3
+
+
+@mock.patch('dip.flight.call')
+@mock.patch('dip.settings.Repo.repo')
+def test_repo_fetch_coalesced_timeout(mock_repo, mock_call, tmpdir):
+    mock_repo.git_dir = str(tmpdir)
+    mock_repo.remote.return_value.name = 'origin'
+    mock_call.return_value = {'time': 0, 'error': 'test',
+                              'kind': 'GitFetchTimeout'}
+    repo = settings.Repo('.', 'origin', 'master', timeout=3)
+    with pytest.raises(errors.GitFetchTimeout) as err:
+        repo.fetch()
+    assert not err.value.shared
+    mock_call.return_value = dict(mock_call.return_value, shared=True)
+    with pytest.raises(errors.GitFetchTimeout) as err:
+        repo.fetch()
+    assert err.value.shared
+    mock_call.return_value = {'time': 0, 'error': None, 'shared': True}
+    assert repo.fetch() is False
+
+
+def test_dip_sync_no_repo():
+    app = settings.Dip('dipex', '/path/to/docker/compose/dir')
+    assert app.sync() is None
+
+
+@pytest.mark.parametrize('git, expected', [
+    ({'remote': 'origin', 'branch': 'master'}, 'origin/master'),
+    ({'remote': 'origin'}, 'origin'),
+])
+def test_dip_tracking(git, expected):
+    app = settings.Dip('dipex', '/path/to/docker/compose/dir', git=git)
+    assert app.tracking == expected
+
+
+def test_dip_check_interval():
+    app = settings.Dip('dipex', '/path/to/docker/compose/dir',
+                       git={'remote': 'origin', 'check_interval': 300})
+    assert app.check_interval == 300
+
+
+@mock.patch('dip.settings.Repo.repo')
+def test_repo_head(mock_repo, tmpdir):
+    mock_repo.head.commit.hexsha = 'abc'
+    repo = settings.Repo(str(tmpdir), 'origin', 'master')
+    assert repo.head == 'abc'
+
+
+def test_githead(tmpdir):
+    sha = 'a' * 40
+    gitdir = tmpdir.mkdir('.git')
+    gitdir.join('HEAD').write('ref: refs/heads/master\n')
+    assert settings.githead(str(tmpdir)) is None
+    gitdir.join('packed-refs').write(
+        '# pack-refs with: peeled\n{} refs/heads/master\n'.format(sha))
+    assert settings.githead(str(tmpdir)) == sha
+    gitdir.mkdir('refs').mkdir('heads').join('master').write('b' * 40 + '\n')
+    assert settings.githead(str(tmpdir)) == 'b' * 40
+    gitdir.join('HEAD').write(sha + '\n')
+    assert settings.githead(str(tmpdir)) == sha
+
+
+def test_repo_head_git(tmpdir):
+    _, clone = gitinit(tmpdir)
+    repo = settings.Repo(clone, 'origin', 'master')
+    with mock.patch.dict(sys.modules, {'git': None}):
+        assert repo.head == git.Repo(clone).head.commit.hexsha
+
+
 def test_dip_install():
     with tempfile.NamedTemporaryFile() as tmp:
         path, name = os.path.split(tmp.name)
@@ -334,69 +867,371 @@ def test_dip_install():
         app.install()
         tmp.flush()
         ret = tmp.read().decode('utf8')
-        exp = "#!/bin/bash\ndip run {name} -- $@\n".format(name=name)
+        exp = "#!/bin/bash\n"\
+            "plan={plan}\n"\
+            "[ -r \"$plan\" ] && . \"$plan\" && dip_plan \"$@\"\n"\
+            "sock={sock}\n"\
+            "[ -S \"$sock\" ] && command -v dip-client >/dev/null && "\
+            "exec dip-client \"$sock\" {name} \"$@\"\n"\
+            "exec dip run {name} -- \"$@\"\n"\
+            .format(name=name,
+                    plan=plans.path(name, settings.HOME),
+                    sock=daemon.address(settings.HOME))
         assert ret == exp
 
 
+@mock.patch('dip.plans.write')
+def test_dip_compile(mock_write, tmpdir):
+    tmpdir.join('dipex').write('')
+    app = settings.Dip('dipex', '/path/to/docker/compose/dir', str(tmpdir))
+    assert app.compile() == mock_write.return_value
+    mock_write.assert_called_once_with(app, settings.HOME)
+
+
+@mock.patch('dip.plans.write')
+def test_dip_compile_no_exe(mock_write, tmpdir):
+    app = settings.Dip('dipex', '/path/to/docker/compose/dir', str(tmpdir))
+    assert app.compile() is None
+    mock_write.assert_not_called()
+
+
 @mock.patch('dip.utils.notty')
-@mock.patch('dip.settings.indir')
 @mock.patch('subprocess.call')
-def test_dip_run(mock_call, mock_dir, mock_tty):
+def test_dip_run(mock_call, mock_tty):
     mock_tty.return_value = True
     app = settings.Dip('dipex', '/path/to/docker/compose/dir')
     app.run('--help')
-    mock_dir.assert_called_once_with('/path/to/docker/compose/dir')
     mock_call.assert_called_once_with(
         ['docker-compose', 'run', '--rm', '-T', 'dipex', '--help'],
+        cwd='/path/to/docker/compose/dir',
+        env=dict(os.environ),
         stdin=sys.stdin,
         stdout=sys.stdout,
         stderr=sys.stderr)
 
 
 @mock.patch('dip.utils.notty')
-@mock.patch('dip.settings.indir')
 @mock.patch('subprocess.call')
-@mock.patch('dotenv.load_dotenv')
-def test_dip_run_dotenv(mock_dotenv, mock_call, mock_dir, mock_tty):
+@mock.patch('dotenv.dotenv_values')
+def test_dip_run_dotenv(mock_dotenv, mock_call, mock_tty):
     mock_tty.return_value = True
+    mock_dotenv.return_value = {'DIP_TEST_FIZZ': 'buzz', 'DIP_TEST_JAZZ': None}
     app = settings.Dip('dipex', '/path/to/docker/compose/dir', dotenv='.env')
     app.run('--help')
-    mock_dir.assert_called_once_with('/path/to/docker/compose/dir')
-    mock_dotenv.assert_called_once_with('.env')
+    mock_dotenv.assert_called_once_with('/path/to/docker/compose/dir/.env')
     mock_call.assert_called_once_with(
         ['docker-compose', 'run', '--rm', '-T', 'dipex', '--help'],
+        cwd='/path/to/docker/compose/dir',
+        env=dict(os.environ, DIP_TEST_FIZZ='buzz'),
         stdin=sys.stdin,
         stdout=sys.stdout,
         stderr=sys.stderr)
+    assert 'DIP_TEST_FIZZ' not in os.environ
+
+
+@mock.patch('dotenv.dotenv_values')
+def test_dip_environ_no_override(mock_dotenv):
+    mock_dotenv.return_value = {'DIP_TEST_FIZZ': 'buzz'}
+    app = settings.Dip('dipex', '/path/to/docker/compose/dir', dotenv='.env')
+    with mock.patch.dict(os.environ, {'DIP_TEST_FIZZ': 'jazz'}):
+        assert app.environ()['DIP_TEST_FIZZ'] == 'jazz'
+
+
+def test_dip_defaults(tmpdir):
+    tmpdir.join('.env').write('FIZZ=buzz\nJAZZ=fuzz\n')
+    app = settings.Dip('dipex', str(tmpdir), env={'JAZZ': 'jazz'},
+                       dotenv='.env')
+    assert app.defaults() == {'FIZZ': 'buzz', 'JAZZ': 'jazz'}
+    with mock.patch.dict(os.environ, {'FIZZ': 'env'}):
+        env = app.environ()
+    assert env['FIZZ'] == 'env'
+    assert env['JAZZ'] == 'jazz'
+    assert 'JAZZ' not in os.environ
+
+
+def test_readenv_cache(tmpdir):
+    dotenv = tmpdir.join('.env')
+    dotenv.write('FIZZ=buzz\n')
+    with mock.patch('dotenv.dotenv_values',
+                    return_value={'FIZZ': 'buzz'}) as mock_dotenv:
+        assert settings.readenv(str(dotenv)) == {'FIZZ': 'buzz'}
+        settings.readenv(str(dotenv))['FIZZ'] = 'jazz'
+        assert settings.readenv(str(dotenv)) == {'FIZZ': 'buzz'}
+        mock_dotenv.assert_called_once_with(str(dotenv))
+
+        # Changes are picked up
+        dotenv.write('FIZZ=jazz!\n')
+        mock_dotenv.return_value = {'FIZZ': 'jazz!'}
+        assert settings.readenv(str(dotenv)) == {'FIZZ': 'jazz!'}
+        assert mock_dotenv.call_count == 2
+
+
+def test_readenv_missing(tmpdir):
+    filepath = str(tmpdir.join('.env'))
+    assert settings.readenv(filepath) == {}
+    assert filepath not in settings.DOTENVS
 
 
 @mock.patch('dip.utils.notty')
-@mock.patch('dip.settings.indir')
 @mock.patch('subprocess.call')
-def test_dip_run_tty(mock_call, mock_dir, mock_tty):
+def test_dip_run_tty(mock_call, mock_tty):
     mock_tty.return_value = False
     app = settings.Dip('dipex', '/path/to/docker/compose/dir')
     app.run('--help')
-    mock_dir.assert_called_once_with('/path/to/docker/compose/dir')
     mock_call.assert_called_once_with(
         ['docker-compose', 'run', '--rm', 'dipex', '--help'],
+        cwd='/path/to/docker/compose/dir',
+        env=dict(os.environ),
+        stdin=sys.stdin,
+        stdout=sys.stdout,
+        stderr=sys.stderr)
+
+
+@mock.patch('dip.utils.notty')
+@mock.patch('subprocess.call')
+def test_dip_run_runner(mock_call, mock_tty):
+    mock_tty.return_value = False
+    app = settings.Dip('dipex', '/path/to/docker/compose/dir',
+                       runner='compose-v2')
+    app.run('--help')
+    mock_call.assert_called_once_with(
+        ['docker', 'compose', 'run', '--rm', 'dipex', '--help'],
+        cwd='/path/to/docker/compose/dir',
+        env=dict(os.environ),
         stdin=sys.stdin,
         stdout=sys.stdout,
         stderr=sys.stderr)
 
 
+@mock.patch('dip.utils.notty')
+@mock.patch('os.chdir')
+@mock.patch('os.execvpe')
+def test_dip_run_replace(mock_exec, mock_chdir, mock_tty):
+    mock_tty.return_value = True
+    app = settings.Dip('dipex', '/path/to/docker/compose/dir')
+    app.run('--help', replace=True)
+    mock_chdir.assert_called_once_with('/path/to/docker/compose/dir')
+    mock_exec.assert_called_once_with(
+        'docker-compose',
+        ['docker-compose', 'run', '--rm', '-T', 'dipex', '--help'],
+        dict(os.environ))
+
+
+def test_dip_run_threads(tmpdir):
+    # Runs in different homes do not interfere with each other
+    bindir = tmpdir.mkdir('bin')
+    bindir.join('docker-compose').write('#!/bin/bash\npwd > pwd.out\n')
+    bindir.join('docker-compose').chmod(0o755)
+    homes = [tmpdir.mkdir('app%d' % i) for i in range(8)]
+    apps = [settings.Dip('dipex', str(x)) for x in homes]
+    path = ':'.join([str(bindir), os.environ['PATH']])
+    with open(os.devnull, 'r+') as null, \
+            mock.patch.multiple('sys', stdin=null, stdout=null, stderr=null), \
+            mock.patch.dict(os.environ, {'PATH': path}), \
+            mock.patch('dip.utils.notty', return_value=True):
+        threads = [threading.Thread(target=x.run) for x in apps]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    for home in homes:
+        assert home.join('pwd.out').read().strip() == str(home)
+
+
+def test_dip_backend():
+    app = settings.Dip('dipex', '/path/to/docker/compose/dir')
+    with mock.patch('dip.settings.RUNNER', 'docker'):
+        assert app.backend.name == 'docker'
+    app.runner = 'compose-v2'
+    assert app.backend.name == 'compose-v2'
+
+
+@mock.patch('dip.plans.remove')
 @mock.patch('os.remove')
 @mock.patch('compose.cli.command.get_project')
-def test_dip_uninstall(mock_proj, mock_rm):
+def test_dip_uninstall(mock_proj, mock_rm, mock_plan):
     app = settings.Dip('dipex', '/path/to/docker/compose/dir', '/bin')
     app.uninstall()
     mock_rm.assert_called_once_with('/bin/dipex')
+    mock_plan.assert_called_once_with('dipex', settings.HOME)
     mock_proj.return_value.networks.remove.assert_called_once_with()
 
 
+@mock.patch('dip.runners.Service.command')
+@mock.patch('dip.runners.Service.prepare')
+@mock.patch('subprocess.call')
+def test_dip_run_prepare(mock_call, mock_prepare, mock_cmd):
+    mock_cmd.return_value = ['docker', 'exec', 'dip-dipex']
+    app = settings.Dip('dipex', '/path/to/docker/compose/dir',
+                       runner='service')
+    app.run('--help')
+    mock_prepare.assert_called_once_with()
+    mock_cmd.assert_called_once_with('--help')
+    assert mock_call.call_args[0][0] == ['docker', 'exec', 'dip-dipex']
+
+
+@mock.patch('dip.runners.Service.stop')
+@mock.patch('dip.plans.remove')
 @mock.patch('os.remove')
 @mock.patch('compose.cli.command.get_project')
-def test_dip_uninstall_os_err(mock_proj, mock_rm):
+def test_dip_uninstall_service(mock_proj, mock_rm, mock_plan, mock_stop):
+    app = settings.Dip('dipex', '/path/to/docker/compose/dir', '/bin',
+                       runner='service')
+    app.uninstall()
+    mock_stop.assert_called_once_with()
+
+
+@mock.patch('dip.runners.Compose.command')
+@mock.patch('os.execvpe')
+@mock.patch('subprocess.call')
+def test_dip_run_trace(mock_call, mock_exec, mock_cmd, tmpdir):
+    mock_call.return_value = 3
+    mock_cmd.return_value = ['docker-compose', 'run', '--rm', 'dipex']
+    filepath = str(tmpdir.join('trace.jsonl'))
+    app = settings.Dip('dipex', '/path/to/docker/compose/dir')
+    with mock.patch('dip.trace.TARGET', filepath):
+        assert app.run(replace=True) == 3
+    mock_exec.assert_not_called()
+    with open(filepath) as stream:
+        spans = [json.loads(x) for x in stream]
+    assert [x['span'] for x in spans] == ['prepare', 'command', 'container']
+    assert spans[-1]['runner'] == 'compose'
+
+
+@mock.patch('dip.runners.resolve')
+def test_dip_validate_trace(mock_resolve, tmpdir):
+    config = mock.Mock(services=[{'name': 'dipex'}])
+    mock_resolve.return_value = ('dir', config)
+    filepath = str(tmpdir.join('trace.jsonl'))
+    app = settings.Dip('dipex', '/path/to/docker/compose/dir')
+    with mock.patch('dip.trace.TARGET', filepath):
+        app.validate()
+    with open(filepath) as stream:
+        assert [json.loads(x)['span'] for x in stream] == ['validate.compose']
+
+
+SERVICE = """
+version: '3'
+services:
+  dipex:
+    image: alpine:{tag}
+"""
+
+
+@mock.patch('compose.cli.command.get_project')
+def test_dip_validate_cache(mock_proj, tmpdir):
+    home = tmpdir.mkdir('home')
+    home.join('docker-compose.yml').write(SERVICE.format(tag='3'))
+    app = settings.Dip('dipex', str(home))
+    with mock.patch('dip.settings.HOME', str(tmpdir)), \
+            mock.patch('dip.runners.resolve',
+                       wraps=runners.resolve) as mock_resolve:
+        app.validate()
+        app.validate()
+        settings.CONFIGS.clear()
+        app.validate()
+        mock_resolve.assert_called_once_with(str(home))
+
+        # Changed compose files are validated again
+        home.join('docker-compose.yml').write(SERVICE.format(tag='4'))
+        app.validate()
+        assert mock_resolve.call_count == 2
+
+        # ... and so is a changed ENV they use
+        home.join('docker-compose.yml').write(SERVICE.format(tag='${TAG}'))
+        with mock.patch.dict(os.environ, {'TAG': '5'}):
+            app.validate()
+        with mock.patch.dict(os.environ, {'TAG': '6'}):
+            app.validate()
+        assert mock_resolve.call_count == 4
+
+    # The daemon is never contacted
+    mock_proj.assert_not_called()
+
+
+VALIDATE_SCRIPT = """
+import sys
+from dip import settings
+app = settings.Dip('fizz', sys.argv[1], git={'remote': 'origin',
+                                             'branch': 'master'})
+app.validate()
+print(' '.join(sorted({'compose', 'git'} & set(sys.modules))))
+"""
+
+
+def test_dip_validate_cache_imports(tmpdir):
+    _, clone = gitinit(tmpdir)
+    env = dict(os.environ, DIP_HOME=str(tmpdir.mkdir('dip')))
+    cmd = [sys.executable, '-c', VALIDATE_SCRIPT, clone]
+    ret = [subprocess.check_output(cmd, env=env).decode('utf8').strip()
+           for _ in range(2)]
+    assert ret == ['compose git', '']
+
+
+def test_dip_validate_cache_err(tmpdir):
+    home = tmpdir.mkdir('home')
+    home.join('docker-compose.yml').write(SERVICE.format(tag='3'))
+    app = settings.Dip('fizz', str(home))
+    with mock.patch('dip.settings.HOME', str(tmpdir)):
+        for _ in range(2):
+            with pytest.raises(errors.NoSuchService):
+                app.validate()
+    assert not tmpdir.join('state', 'fizz.json').check()
+
+
+def test_dip_config_shared(tmpdir):
+    tmpdir.join('docker-compose.yml').write(SERVICE.format(tag='3'))
+    fizz = settings.Dip('fizz', str(tmpdir))
+    buzz = settings.Dip('buzz', str(tmpdir))
+    with mock.patch('dip.runners.resolve',
+                    wraps=runners.resolve) as mock_resolve:
+        assert fizz.config is buzz.config
+    mock_resolve.assert_called_once_with(str(tmpdir))
+
+
+@mock.patch('compose.cli.command.get_project')
+def test_dip_project_shared(mock_proj, tmpdir):
+    tmpdir.join('docker-compose.yml').write('services: {fizz: {}}\n')
+    fizz = settings.Dip('fizz', str(tmpdir))
+    buzz = settings.Dip('buzz', str(tmpdir))
+    assert fizz.project is buzz.project
+    mock_proj.assert_called_once_with(str(tmpdir))
+
+
+def test_gitkey(tmpdir):
+    home = tmpdir.mkdir('home')
+    assert settings.gitkey(str(home)) is None
+    assert settings.gitkey(str(tmpdir.join('missing'))) is None
+    tmpdir.mkdir('.git').join('HEAD').write('ref: refs/heads/master\n')
+    tmpdir.join('.git', 'config').write('')
+    key = settings.gitkey(str(home))
+    assert key == settings.gitkey(str(tmpdir))
+    tmpdir.join('.git', 'config').write('[remote "origin"]\n')
+    assert settings.gitkey(str(home)) != key
+
+
+def test_projectkey(tmpdir):
+    assert settings.projectkey(str(tmpdir)) is None
+    tmpdir.join('docker-compose.yml').write('services: {}\n')
+    key = settings.projectkey(str(tmpdir))
+    assert key
+    tmpdir.join('.env').write('FIZZ=buzz\n')
+    assert settings.projectkey(str(tmpdir)) != key
+    with mock.patch.dict(os.environ, {'COMPOSE_FILE': 'other.yml'}):
+        assert settings.projectkey(str(tmpdir)) is None
+
+
+def test_dip_validate_opts_err():
+    app = settings.Dip('dipex', '/path/to/docker/compose/dir',
+                       opts={'idle': 60})
+    with pytest.raises(errors.NoSuchRunnerOptionError):
+        app.validate()
+
+
+@mock.patch('dip.plans.remove')
+@mock.patch('os.remove')
+@mock.patch('compose.cli.command.get_project')
+def test_dip_uninstall_os_err(mock_proj, mock_rm, mock_plan):
     mock_rm.side_effect = OSError
     app = settings.Dip('dipex', '/path/to/docker/compose/dir', '/bin')
     app.uninstall()
@@ -404,30 +1239,30 @@ def test_dip_uninstall_os_err(mock_proj, mock_rm):
     mock_proj.return_value.networks.remove.assert_called_once_with()
 
 
+@mock.patch('dip.plans.remove')
 @mock.patch('os.remove')
 @mock.patch('compose.cli.command.get_project')
-def test_dip_uninstall_compose_err(mock_proj, mock_rm):
+def test_dip_uninstall_compose_err(mock_proj, mock_rm, mock_plan):
     mock_proj.side_effect = compose.config.errors.ConfigurationError('')
     app = settings.Dip('dipex', '/path/to/docker/compose/dir', '/bin')
     app.uninstall()
     mock_rm.assert_called_once_with('/bin/dipex')
 
 
-@mock.patch('compose.cli.command.get_project')
-def test_dip_val_nss(mock_proj):
+@mock.patch('dip.runners.resolve')
+def test_dip_val_nss(mock_resolve):
     with mock.patch('git.Repo'):
-        mock_proj.return_value.get_service.side_effect = \
-            compose.project.NoSuchService('test')
+        mock_resolve.return_value = ('dir', mock.Mock(services=[]))
         app = settings.Dip('dipex', '/path/to/docker/compose/dir',
                            git={'remote': 'origin'})
         with pytest.raises(errors.NoSuchService):
             app.validate()
 
 
-@mock.patch('compose.cli.command.get_project')
-def test_dip_val_cfnf(mock_proj):
+@mock.patch('dip.runners.resolve')
+def test_dip_val_cfnf(mock_resolve):
     with mock.patch('git.Repo'):
-        mock_proj.side_effect = \
+        mock_resolve.side_effect = \
             compose.config.errors.ComposeFileNotFound('test')
         app = settings.Dip('dipex', '/path/to/docker/compose/dir',
                            git={'remote': 'origin'})
@@ -515,23 +1350,21 @@ def test_settings_load_err(mock_json):
             assert cfg.load(tmp.name)
 
 
-@mock.patch('json.loads')
-@mock.patch('dip.settings.Settings.save')
-def test_settings_load_oserr(mock_save, mock_json):
-    mock_json.side_effect = OSError
-    with tempfile.NamedTemporaryFile() as tmp:
-        cfg = MockSettings()
-        cfg.load(tmp.name)
-        mock_save.assert_called_once_with(tmp.name)
+def test_settings_load_missing(tmpdir):
+    filepath = str(tmpdir.join('settings.json'))
+    cfg = MockSettings()
+    cfg.load(filepath)
+    assert cfg.data == {}
+    assert not os.path.exists(filepath)
 
 
 def test_settings_save():
     with tempfile.NamedTemporaryFile() as tmp:
         cfg = MockSettings()
         cfg.save(tmp.name)
-        tmp.flush()
-        assert tmp.read().decode('utf8') == \
-            json.dumps(cfg.data, indent=4, sort_keys=True)
+        with open(tmp.name) as stream:
+            assert stream.read() == \
+                json.dumps(cfg.data, indent=4, sort_keys=True)
 
 
 @mock.patch('json.dumps')
@@ -0,0 +1,138 @@
+import json
+import os
+import stat
+from unittest import mock
+
+from dip import state
+
+
+def test_state_str(tmpdir):
+    app_state = state.State('fizz', str(tmpdir))
+    assert str(app_state) == os.path.join(str(tmpdir), 'state', 'fizz.json')
+
+
+def test_state_repr(tmpdir):
+    app_state = state.State('fizz', str(tmpdir))
+    assert repr(app_state) == "State({})".format(app_state.filepath)
+
+
+def test_state_mapping(tmpdir):
+    app_state = state.State('fizz', str(tmpdir))
+    app_state['fizz'] = 'buzz'
+    assert dict(app_state) == {'fizz': 'buzz'}
+    assert len(app_state) == 1
+    del app_state['fizz']
+    assert dict(app_state) == {}
+
+
+def test_load_missing(tmpdir):
+    with state.load('fizz', str(tmpdir)) as app_state:
+        assert dict(app_state) == {}
+
+
+def test_load_corrupt(tmpdir):
+    tmpdir.mkdir('state').join('fizz.json').write('{')
+    with state.load('fizz', str(tmpdir)) as app_state:
+        assert dict(app_state) == {}
+
+
+def test_saveonexit(tmpdir):
+    with state.saveonexit('fizz', str(tmpdir)) as app_state:
+        app_state['fizz'] = 'buzz'
+    with open(app_state.filepath) as stream:
+        assert json.loads(stream.read()) == {'fizz': 'buzz'}
+
+
+def test_save_mode(tmpdir):
+    app_state = state.State('fizz', str(tmpdir))
+    app_state.save()
+    os.chmod(app_state.filepath, 0o644)
+    app_state['fizz'] = 'buzz'
+    app_state.save()
+    assert stat.S_IMODE(os.stat(app_state.filepath).st_mode) == 0o644
+
+
+@mock.patch('os.makedirs')
+def test_save_err(mock_mkdir, tmpdir):
+    mock_mkdir.side_effect = OSError
+    app_state = state.State('fizz', str(tmpdir))
+    app_state.save()
+    assert not os.path.exists(app_state.filepath)
+
+
+def test_getcheck(tmpdir):
+    app_state = state.State('fizz', str(tmpdir))
+    app_state.setcheck('origin/master', 'abc', True, now=100)
+    assert app_state.getcheck('origin/master', 'abc', 10, now=105) is True
+
+
+def test_getcheck_expired(tmpdir):
+    app_state = state.State('fizz', str(tmpdir))
+    app_state.setcheck('origin/master', 'abc', True, now=100)
+    assert app_state.getcheck('origin/master', 'abc', 10, now=110) is None
+
+
+def test_getcheck_moved(tmpdir):
+    app_state = state.State('fizz', str(tmpdir))
+    app_state.setcheck('origin/master', 'abc', False, now=100)
+    assert app_state.getcheck('origin/master', 'def', 10, now=105) is None
+
+
+def test_getcheck_ttl(tmpdir):
+    app_state = state.State('fizz', str(tmpdir))
+    app_state.setcheck('origin/master', 'abc', True, now=100)
+    assert app_state.getcheck('origin/master', 'abc', None, now=105) is None
+    app_state.setcheck('origin/master', 'abc', True, ttl=10, now=100)
+    assert app_state.getcheck('origin/master', 'abc', None, now=105) is True
+    assert app_state.getcheck('origin/master', 'abc', None, now=110) is None
+
+
+def test_lastcheck(tmpdir):
+    app_state = state.State('fizz', str(tmpdir))
+    assert app_state.lastcheck('origin/master') is None
+    app_state.setcheck('origin/master', 'abc', True, now=100)
+    assert app_state.lastcheck('origin/master') == \
+        {'diff': True, 'head': 'abc', 'time': 100}
+
+
+def test_getcheck_other_remote(tmpdir):
+    app_state = state.State('fizz', str(tmpdir))
+    app_state.setcheck('origin/master', 'abc', False, now=100)
+    assert app_state.getcheck('origin/main', 'abc', 10, now=105) is None
+
+
+def test_getvalid(tmpdir):
+    app_state = state.State('fizz', str(tmpdir))
+    assert not app_state.getvalid('compose', 'abc')
+    app_state.setvalid('compose', 'abc')
+    assert app_state.getvalid('compose', 'abc')
+    assert not app_state.getvalid('compose', 'def')
+    assert not app_state.getvalid('git', 'abc')
+    assert not app_state.getvalid('compose', None)
+
+
+def test_breaker(tmpdir):
+    app_state = state.State('fizz', str(tmpdir))
+    assert app_state.backoff('origin/master') is None
+    for now in [100, 101]:
+        app_state.setfailure('origin/master', 3, 60, 200, now=now)
+        assert app_state.backoff('origin/master', now=now) is None
+
+    # Trips on the third failure in a row, doubling up to the limit
+    app_state.setfailure('origin/master', 3, 60, 200, now=102)
+    assert app_state.backoff('origin/master', now=102) == 60
+    assert app_state.backoff('origin/master', now=162) is None
+    app_state.setfailure('origin/master', 3, 60, 200, now=200)
+    assert app_state.backoff('origin/master', now=200) == 120
+    app_state.setfailure('origin/master', 3, 60, 200, now=400)
+    assert app_state.backoff('origin/master', now=400) == 200
+    assert app_state.backoff('origin/main', now=400) is None
+
+
+def test_breaker_reset(tmpdir):
+    app_state = state.State('fizz', str(tmpdir))
+    assert app_state.setsuccess('origin/master') is False
+    for _ in range(3):
+        app_state.setfailure('origin/master', 3, 60, 200, now=100)
+    assert app_state.setsuccess('origin/master') is True
+    assert app_state.backoff('origin/master', now=100) is None
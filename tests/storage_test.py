@@ -0,0 +1,211 @@
+import json
+import os
+import stat
+import threading
+from unittest import mock
+
+import pytest
+from dip import errors
+from dip import storage
+
+APPS = {'fizz': {'name': 'fizz', 'home': '/path/to/fizz'},
+        'buzz': {'name': 'buzz', 'home': '/path/to/buzz'}}
+
+
+@pytest.fixture(params=['json', 'sqlite'])
+def backend(request, tmpdir):
+    return storage.get(storage.filepath(str(tmpdir), request.param))
+
+
+def test_filepath():
+    assert storage.filepath('/home', 'json') == '/home/settings.json'
+    assert storage.filepath('/home', 'sqlite') == '/home/settings.db'
+
+
+def test_filepath_err():
+    with pytest.raises(errors.NoSuchStorageError):
+        storage.filepath('/home', 'fizz')
+
+
+@pytest.mark.parametrize('path, cls', [
+    ('/path/to/settings.json', storage.Json),
+    ('/path/to/settings.db', storage.SQLite),
+    ('/path/to/settings', storage.Json),
+])
+def test_get(path, cls):
+    ret = storage.get(path)
+    assert isinstance(ret, cls)
+    assert repr(ret) == '{}({})'.format(cls.__name__, path)
+
+
+def test_changes():
+    data = {'fizz': {'name': 'fizz', 'home': '/new'},
+            'jazz': {'name': 'jazz'}}
+    assert storage.changes(data, APPS) == \
+        ({'fizz': {'name': 'fizz', 'home': '/new'}, 'jazz': {'name': 'jazz'}},
+         ['buzz'])
+
+
+def test_read_empty(backend):
+    assert backend.read() == {}
+    assert backend.readapp('fizz') is None
+
+
+def test_write_read(backend):
+    backend.write(APPS)
+    assert backend.read() == APPS
+    assert backend.readapp('fizz') == APPS['fizz']
+
+
+def test_write_changes(backend):
+    backend.write(APPS)
+    before = backend.read()
+
+    # Another process installs jazz in the meantime
+    storage.get(backend.filepath).write({'jazz': {'name': 'jazz'}}, {})
+
+    data = dict(before, fizz={'name': 'fizz', 'home': '/new'})
+    del data['buzz']
+    backend.write(data, before)
+    assert backend.read() == {'fizz': {'name': 'fizz', 'home': '/new'},
+                              'jazz': {'name': 'jazz'}}
+
+
+def test_lock(backend):
+    backend.write({})
+
+    def install(name):
+        other = storage.get(backend.filepath)
+        with other.lock():
+            before = other.read()
+            other.write(dict(before, **{name: {'name': name}}), before)
+
+    threads = [threading.Thread(target=install, args=('app%d' % i,))
+               for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(backend.read()) == ['app%d' % i for i in range(8)]
+
+
+def test_remove(backend):
+    backend.write(APPS)
+    backend.remove()
+    assert not os.path.exists(backend.filepath)
+    with pytest.raises(errors.SettingsError):
+        backend.remove()
+
+
+def test_json_read_err(tmpdir):
+    tmpdir.join('settings.json').write('{')
+    with pytest.raises(errors.SettingsError):
+        storage.Json(str(tmpdir.join('settings.json'))).read()
+
+
+def test_json_write_err(tmpdir):
+    with pytest.raises(errors.SettingsError):
+        storage.Json(str(tmpdir.join('fizz', 'settings.json'))).write({})
+
+
+@mock.patch('subprocess.call')
+def test_json_edit(mock_call):
+    storage.Json('/path/to/settings.json').edit('/bin/vim')
+    mock_call.assert_called_once_with(['/bin/vim', '/path/to/settings.json'])
+
+
+def test_sqlite_migrate(tmpdir):
+    tmpdir.join('settings.json').write(json.dumps(APPS))
+    backend = storage.SQLite(str(tmpdir.join('settings.db')))
+    assert backend.read() == APPS
+
+    # Only once
+    tmpdir.join('settings.json').write('{}')
+    assert storage.SQLite(backend.filepath).read() == APPS
+
+
+def test_sqlite_wal(tmpdir):
+    backend = storage.SQLite(str(tmpdir.join('settings.db')))
+    mode, = backend.connect().execute('PRAGMA journal_mode').fetchone()
+    assert mode == 'wal'
+
+
+def test_sqlite_rollback(tmpdir):
+    backend = storage.SQLite(str(tmpdir.join('settings.db')))
+    backend.write(APPS)
+    with pytest.raises(KeyError):
+        with backend.lock():
+            backend.write({}, APPS)
+            raise KeyError
+    assert backend.read() == APPS
+
+
+def test_sqlite_connect_err(tmpdir):
+    with pytest.raises(errors.SettingsError):
+        storage.SQLite(str(tmpdir.join('fizz', 'settings.db'))).read()
+
+
+def test_sqlite_edit(tmpdir):
+    backend = storage.SQLite(str(tmpdir.join('settings.db')))
+    backend.write(APPS)
+
+    def edit(cmd):
+        with open(cmd[1], 'w') as stream:
+            stream.write(json.dumps({'jazz': {'name': 'jazz'}}))
+
+    with mock.patch('subprocess.call', side_effect=edit):
+        backend.edit('/bin/vim')
+    assert backend.read() == {'jazz': {'name': 'jazz'}}
+
+
+def test_json_read_unreadable(tmpdir):
+    filepath = tmpdir.join('settings.json')
+    filepath.write(json.dumps(APPS))
+    with mock.patch('builtins.open', side_effect=PermissionError):
+        with pytest.raises(errors.SettingsError):
+            storage.Json(str(filepath)).read()
+    assert json.loads(filepath.read()) == APPS
+
+
+def test_json_write_unreadable(tmpdir):
+    filepath = tmpdir.join('settings.json')
+    filepath.write(json.dumps(APPS))
+    backend = storage.Json(str(filepath))
+    with mock.patch('builtins.open', side_effect=PermissionError):
+        with pytest.raises(errors.SettingsError):
+            backend.write({}, APPS)
+    assert json.loads(filepath.read()) == APPS
+
+
+@pytest.mark.parametrize('mode', [0o644, 0o664, 0o600])
+def test_json_write_mode(tmpdir, mode):
+    filepath = tmpdir.join('settings.json')
+    filepath.write('{}')
+    filepath.chmod(mode)
+    storage.Json(str(filepath)).write(APPS)
+    assert stat.S_IMODE(os.stat(str(filepath)).st_mode) == mode
+
+
+def test_json_write_mode_new(tmpdir):
+    filepath = str(tmpdir.join('settings.json'))
+    mask = os.umask(0o022)
+    try:
+        storage.Json(filepath).write(APPS)
+    finally:
+        os.umask(mask)
+    assert stat.S_IMODE(os.stat(filepath).st_mode) == 0o644
+
+
+def test_json_read_cache(tmpdir):
+    backend = storage.Json(str(tmpdir.join('settings.json')))
+    backend.write(APPS)
+    assert backend.read() == APPS
+    with mock.patch('builtins.open') as mock_open:
+        data = backend.read()
+        data['fizz']['home'] = '/changed'
+        assert backend.readapp('fizz') == APPS['fizz']
+        mock_open.assert_not_called()
+
+    # Replaced files are read again
+    backend.write({'jazz': {'name': 'jazz'}})
+    assert backend.read() == {'jazz': {'name': 'jazz'}}
@@ -0,0 +1,70 @@
+from unittest import mock
+
+import pytest
+from dip import errors
+from dip import sync
+from . import MockSettings
+
+
+@mock.patch('random.uniform')
+def test_jitter(mock_uniform):
+    mock_uniform.return_value = 0.5
+    assert sync.jitter(300) == 150
+    mock_uniform.assert_called_once_with(*sync.JITTER)
+
+
+def test_tracked():
+    ret = [x.name for x in sync.tracked(MockSettings())]
+    assert ret == ['buzz', 'fizz']
+
+
+def test_tracked_names():
+    ret = [x.name for x in sync.tracked(MockSettings(), ['fizz', 'jazz'])]
+    assert ret == ['fizz']
+
+
+def test_tracked_err():
+    with pytest.raises(errors.NotInstalledError):
+        list(sync.tracked(MockSettings(), ['fuzz']))
+
+
+def test_syncapp():
+    mock_app = mock.MagicMock()
+    mock_app.sync.return_value = True
+    callback = mock.MagicMock()
+    assert sync.syncapp(mock_app, callback, 300) == (True, None)
+    mock_app.sync.assert_called_once_with(ttl=300)
+    callback.assert_called_once_with(mock_app, True, None)
+
+
+def test_syncapp_err():
+    err = errors.GitFetchError('origin')
+    mock_app = mock.MagicMock()
+    mock_app.sync.side_effect = err
+    assert sync.syncapp(mock_app) == (None, err)
+
+
+@mock.patch('dip.settings.load')
+@mock.patch('dip.settings.Dip.sync')
+def test_once(mock_sync, mock_load):
+    mock_load.return_value.__enter__.return_value = MockSettings()
+    mock_sync.return_value = False
+    assert sync.once() == [(False, None), (False, None)]
+    assert mock_sync.call_count == 2
+
+
+@mock.patch('time.sleep')
+@mock.patch('time.time')
+@mock.patch('dip.sync.jitter')
+@mock.patch('dip.settings.load')
+@mock.patch('dip.settings.Dip.sync')
+def test_forever(mock_sync, mock_load, mock_jitter, mock_time, mock_sleep):
+    mock_load.return_value.__enter__.return_value = MockSettings()
+    mock_jitter.side_effect = lambda x: x / 2
+    mock_time.return_value = 1000
+    mock_sleep.side_effect = [None, KeyboardInterrupt]
+    with pytest.raises(KeyboardInterrupt):
+        sync.forever(['fizz'], 60)
+    mock_sync.assert_called_once_with(ttl=60)
+    mock_jitter.assert_called_once_with(60)
+    mock_sleep.assert_has_calls([mock.call(30), mock.call(30)])
@@ -0,0 +1,71 @@
+import json
+from unittest import mock
+
+import pytest
+from dip import trace
+
+
+@pytest.fixture
+def target(tmpdir):
+    filepath = str(tmpdir.join('trace.jsonl'))
+    with mock.patch('dip.trace.TARGET', filepath):
+        yield filepath
+
+
+def spans(filepath):
+    with open(filepath) as stream:
+        return [json.loads(x) for x in stream]
+
+
+def test_span(target):
+    with trace.span('fizz', app='buzz'):
+        pass
+    with trace.span('jazz'):
+        pass
+    ret = spans(target)
+    assert [x['span'] for x in ret] == ['fizz', 'jazz']
+    assert ret[0]['app'] == 'buzz'
+    assert sorted(ret[0]) == ['app', 'at', 'ms', 'pid', 'span']
+    assert ret[0]['ms'] >= 0
+
+
+def test_span_err(target):
+    with pytest.raises(KeyError):
+        with trace.span('fizz'):
+            raise KeyError
+    assert [x['span'] for x in spans(target)] == ['fizz']
+
+
+@mock.patch('dip.trace.TARGET', None)
+def test_span_disabled(tmpdir):
+    with trace.span('fizz'):
+        pass
+    trace.emit('buzz', 0)
+    assert not trace.enabled()
+    assert tmpdir.listdir() == []
+
+
+@mock.patch('dip.trace.TARGET', None)
+def test_emit_stderr(capsys):
+    trace.enable()
+    assert trace.enabled()
+    trace.emit('fizz', trace.START, trace.START + 0.5)
+    ret = json.loads(capsys.readouterr().err)
+    assert ret['span'] == 'fizz'
+    assert ret['ms'] == 500.0
+    assert ret['at'] == 0
+
+
+def test_emit_err(tmpdir):
+    with mock.patch('dip.trace.TARGET', str(tmpdir.join('fizz', 'trace'))):
+        trace.emit('fizz', 0)
+
+
+@mock.patch.dict('os.environ', {'DIP_TRACE': '/path/to/trace.jsonl'})
+def test_reset():
+    with mock.patch.multiple('dip.trace', TARGET=None, START=0, READY=0):
+        trace.reset()
+        assert trace.TARGET == '/path/to/trace.jsonl'
+        assert trace.START == trace.READY > 0
+        trace.ready()
+        assert trace.READY >= trace.START
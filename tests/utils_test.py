@@ -1,9 +1,9 @@
 import os
-import pkg_resources
 import sys
 import tempfile
 from unittest import mock
 
+import compose.config.config
 import pytest
 from dip import utils
 
@@ -42,12 +42,66 @@ def test_notty():
             assert utils.notty() is False
 
 
-@mock.patch('pkg_resources.resource_filename')
-def test_pkgpath(mock_filename):
-    assert utils.pkgpath() == mock_filename.return_value
+def test_pkgpath():
+    assert utils.pkgpath() == os.path.dirname(os.path.abspath(utils.__file__))
 
 
-@mock.patch('pkg_resources.resource_filename')
-def test_pkgpath_err(mock_filename):
-    mock_filename.side_effect = pkg_resources.DistributionNotFound
-    assert utils.pkgpath() == os.path.join(os.path.abspath('.'), 'dip')
+@pytest.mark.parametrize('seconds, expected', [
+    (-1, '0s'),
+    (42.5, '42s'),
+    (90, '1m'),
+    (7200, '2h'),
+    (86400 * 3 + 5, '3d'),
+])
+def test_since(seconds, expected):
+    assert utils.since(seconds) == expected
+
+
+@pytest.mark.parametrize('values, pct, expected', [
+    ([], 50, None),
+    ([3], 99, 3),
+    ([4, 1, 3, 2], 50, 2),
+    ([4, 1, 3, 2], 95, 4),
+    (list(range(1, 101)), 99, 99),
+])
+def test_percentile(values, pct, expected):
+    assert utils.percentile(values, pct) == expected
+
+
+def test_umask():
+    mask = os.umask(0o027)
+    try:
+        assert utils.umask() == 0o027
+    finally:
+        os.umask(mask)
+
+
+@mock.patch('builtins.open', side_effect=FileNotFoundError)
+def test_umask_fallback(mock_open):
+    assert utils.umask() == utils.UMASK
+
+
+@mock.patch('os.umask')
+def test_umask_unchanged(mock_umask):
+    utils.umask()
+    mock_umask.assert_not_called()
+
+
+@pytest.mark.parametrize('files, cwd', [
+    ([], 'app'),
+    (['docker-compose.yml'], 'app'),
+    (['docker-compose.yml', 'compose.yml',
+      'docker-compose.override.yml'], 'app'),
+    (['compose.yaml', 'compose.override.yaml'], 'app'),
+    (['docker-compose.yml', 'app/.env'], 'app'),
+    (['docker-compose.yml', 'app/docker-compose.override.yml'], 'app'),
+    (['app/compose.yml'], 'app/sub'),
+])
+def test_composefiles(tmpdir, files, cwd):
+    root = tmpdir.mkdir('root')
+    root.mkdir('app').mkdir('sub')
+    for name in files:
+        root.join(name).write('services: {}\n')
+    home = str(root.join(cwd))
+    expected = compose.config.config.get_default_config_files(home) or []
+    assert utils.composefiles(home) == [os.path.abspath(x) for x in expected]
@@ -0,0 +1,85 @@
+import subprocess
+import sys
+from unittest import mock
+
+from dip import warm
+
+EVENTS = [{'status': 'Pulling from library/alpine', 'id': 'latest'},
+          {'status': 'Pulling fs layer', 'id': 'abc'},
+          {'status': 'Already exists', 'id': 'def'},
+          {'status': 'Downloading', 'id': 'abc',
+           'progressDetail': {'current': 1, 'total': 2}},
+          {'status': 'Pull complete', 'id': 'abc'},
+          {'status': 'Digest: sha256:123'},
+          {'status': 'Status: Downloaded newer image for alpine:latest'}]
+
+
+def mock_service(name, image=None):
+    service = mock.MagicMock()
+    service.name = name
+    service.options = {'image': image} if image else {'build': '.'}
+    service.image_name = image
+    service.pull.return_value = iter(EVENTS)
+    return service
+
+
+def test_progress():
+    progress = warm.Progress('alpine:latest')
+    ret = [progress.update(x) for x in EVENTS]
+    assert ret == [False, False, True, False, True, False, False]
+    assert str(progress) == 'alpine:latest 2/2 layers'
+    assert repr(progress) == 'Progress(alpine:latest 2/2 layers)'
+
+
+def test_services():
+    app = mock.MagicMock()
+    app.name = 'fizz'
+    fizz = mock_service('fizz', 'alpine')
+    buzz = mock_service('buzz')
+    app.project.get_services.return_value = [fizz, buzz]
+    assert warm.services(app) == [fizz]
+    app.project.get_services.assert_called_once_with(['fizz'],
+                                                     include_deps=True)
+
+
+def test_pull():
+    service = mock_service('fizz', 'alpine:latest')
+    callback = mock.MagicMock()
+    progress = warm.pull(service, callback)
+    service.pull.assert_called_once_with(silent=True, stream=True)
+    assert callback.call_count == 2
+    assert (progress.done, progress.total) == (2, 2)
+
+
+def test_warm():
+    app = mock.MagicMock()
+    services = [mock_service('fizz', 'alpine'), mock_service('buzz', 'redis')]
+    app.project.get_services.return_value = services
+    ret = warm.warm(app, jobs=2)
+    assert [x.image for x in ret] == ['alpine', 'redis']
+    for service in services:
+        service.pull.assert_called_once_with(silent=True, stream=True)
+
+
+def test_logpath():
+    assert warm.logpath('fizz', '/home') == '/home/state/fizz.warm.log'
+
+
+@mock.patch('subprocess.Popen')
+def test_background(mock_popen, tmpdir):
+    warm.background('fizz', str(tmpdir))
+    mock_popen.assert_called_once_with(
+        [sys.executable, '-m', 'dip.main', 'warm', 'fizz'],
+        stdin=subprocess.DEVNULL,
+        stdout=mock.ANY,
+        stderr=subprocess.STDOUT,
+        start_new_session=True)
+    assert mock_popen.call_args[1]['stdout'].name == \
+        warm.logpath('fizz', str(tmpdir))
+
+
+@mock.patch('subprocess.Popen')
+def test_background_no_log(mock_popen, tmpdir):
+    tmpdir.join('state').write('')
+    warm.background('fizz', str(tmpdir))
+    assert mock_popen.call_args[1]['stdout'] == subprocess.DEVNULL